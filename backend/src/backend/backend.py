@@ -3,8 +3,10 @@ import re
 import time
 import httpx
 import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -16,18 +18,44 @@ from backend.router_patient.router_patient import router_patient
 from backend.router_doctor.router_doctor import router_doctor
 from backend.router_admin import router_admin
 from backend.router_LLM.router_LLM import router_LLM
+from backend.connection import get_pool_stats, track_request_connections
+from backend.router_LLM.ollama_client import start_ollama_client, close_ollama_client
+from backend.router_LLM.specialization_router import specialization_router
+from backend.router_LLM.status import model_status_monitor
+from backend.router_LLM.warmup import model_warmup
 
 load_dotenv()
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8001")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Gestisce le risorse condivise per tutta la vita dell'applicazione.
+
+    All'avvio apre il client HTTP verso Ollama (connessioni keep-alive
+    riutilizzate da tutte le richieste) e avvia in background il calcolo
+    degli embedding delle specializzazioni, il monitoraggio dello stato
+    del modello e il suo preriscaldamento; allo spegnimento li chiude.
+    """
+    await start_ollama_client()
+    specialization_router.start()
+    model_status_monitor.start()
+    model_warmup.start()
+    yield
+    await model_warmup.stop()
+    await model_status_monitor.stop()
+    await specialization_router.stop()
+    await close_ollama_client()
+
 app = FastAPI(
     title="MedFlow API",
     description="API per l'assistente sanitario AI",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS - DEVE ESSERE L'ULTIMO middleware per funzionare correttamente
@@ -50,6 +78,21 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         print(f"{request.method} {request.url.path} - {response.status_code} - {process_time:.3f}s")
         return response
 
+# Middleware per il rilevamento dei leak di connessione al database.
+# È un middleware ASGI puro (non BaseHTTPMiddleware) perché il controllo deve
+# avvenire dopo la chiusura delle dipendenze con yield, cioè quando la
+# richiesta è davvero terminata e non appena inviati gli header.
+class ConnectionLeakMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_request_connections(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
 # Middleware per headers di sicurezza
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -76,9 +119,10 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
         return response
 
-# Middleware di logging (solo in dev)
+# Middleware di logging e rilevamento leak (solo in dev)
 if ENVIRONMENT == "development":
     app.add_middleware(LoggingMiddleware)
+    app.add_middleware(ConnectionLeakMiddleware)
 
 # Middleware per redirect HTTPS e host trust solo in prod
 if ENVIRONMENT == "production":
@@ -97,9 +141,20 @@ async def health_check():
     return {
         "status": "healthy",
         "environment": ENVIRONMENT,
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "database_pool": get_pool_stats(),
+        "llm": model_warmup.stats()
     }
 
+# Readiness per il load balancer: 503 finché il modello AI non è caricato
+@app.get("/health/ready")
+async def readiness_check():
+    llm = model_warmup.stats()
+    return JSONResponse(
+        status_code=200 if llm["ready"] else 503,
+        content={"status": "ready" if llm["ready"] else "warming", "llm": llm}
+    )
+
 # Include i router
 app.include_router(router_profile, prefix="/profile", tags=["generic"])
 app.include_router(router_patient, prefix="/patient", tags=["patient"])
@@ -3,83 +3,519 @@ Modulo di gestione delle connessioni al database PostgreSQL.
 
 Questo modulo fornisce tutte le funzionalità necessarie per:
 - Stabilire connessioni al database PostgreSQL
+- Riutilizzare le connessioni tramite un pool condiviso dal processo
 - Eseguire query SQL con gestione automatica delle transazioni
-- Gestire la chiusura automatica delle connessioni
+- Gestire la restituzione automatica delle connessioni al pool
 - Supportare sia query di lettura che di scrittura
 - Gestire rollback automatico in caso di errori
+- Eseguire query da handler asincroni senza bloccare l'event loop
+- Fornire una sessione di database per richiesta come dipendenza FastAPI
+- Rilevare in sviluppo le connessioni non restituite a fine richiesta
 
 Il sistema è ottimizzato per l'uso con Docker Compose
 e gestisce automaticamente la pulizia delle risorse.
+Il pool evita di pagare l'handshake TCP e l'autenticazione
+di PostgreSQL a ogni singola query.
 """
 
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+import functools
+import traceback
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg2
 from psycopg2.extensions import cursor as PgCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+logger = logging.getLogger("backend.connection")
+
+# Parametri di connessione al database
+DB_CONFIG = {
+    "host": "database",       # Nome del servizio nel docker-compose
+    "port": 5432,             # Porta standard PostgreSQL
+    "user": "user",           # Deve combaciare con POSTGRES_USER
+    "password": "userpwd",    # Deve combaciare con POSTGRES_PASSWORD
+    "dbname": "HealthDB"      # Deve combaciare con POSTGRES_DB
+}
+
+# Configurazione del pool di connessioni tramite variabili d'ambiente
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))                   # Connessioni mantenute sempre aperte
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))                  # Connessioni massime contemporanee
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))       # Secondi prima di chiudere una connessione inattiva
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))      # Vita massima di una connessione in secondi
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))  # Attesa massima quando il pool è esaurito
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))           # Inattività oltre la quale si verifica la connessione
+
+
+class PoolExhaustedError(psycopg2.OperationalError):
+    """
+    Errore sollevato quando non è possibile ottenere una connessione
+    dal pool entro il tempo massimo di attesa.
+    """
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """
+    Connessione psycopg2 gestita dal pool.
+
+    Si comporta esattamente come una connessione standard, ma la
+    chiamata a close() la restituisce al pool invece di chiuderla,
+    rendendo il pool trasparente per il codice esistente.
+    """
+
+    def close(self):
+        """
+        Restituisce la connessione al pool (o la chiude se non appartiene a un pool).
+        """
+        pool = getattr(self, "_pool", None)
+        if pool is not None and not self.closed:
+            pool.putconn(self)
+        else:
+            super().close()
+
+    def close_physical(self):
+        """
+        Chiude realmente la connessione verso PostgreSQL.
+        """
+        self._pool = None
+        if not self.closed:
+            super().close()
+
+
+class ConnectionPool:
+    """
+    Pool di connessioni PostgreSQL thread-safe.
+
+    Gestisce un insieme di connessioni riutilizzabili con:
+    - Dimensione minima e massima configurabili
+    - Chiusura delle connessioni inattive oltre l'idle timeout
+    - Verifica dello stato della connessione al momento del prelievo
+    - Durata massima di ogni connessione (max lifetime)
+    - Statistiche di utilizzo consultabili tramite stats()
+    """
+
+    def __init__(self, min_size: int, max_size: int, idle_timeout: float,
+                 max_lifetime: float, checkout_timeout: float, ping_after: float, **conn_kwargs):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self._conn_kwargs = conn_kwargs
+
+        self._idle = deque()          # Connessioni libere (LIFO: le più recenti restano "calde")
+        self._in_use = 0              # Connessioni attualmente prelevate
+        self._lock = threading.Condition()
+
+        # Contatori per le statistiche
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "failed_health_checks": 0,
+            "leaked": 0,
+            "held_past_request": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    # -----------------------------------------
+    # Gestione interna delle connessioni fisiche
+    # -----------------------------------------
+
+    def _connect(self) -> PooledConnection:
+        """Apre una nuova connessione fisica associata al pool."""
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self._conn_kwargs)
+        conn._pool = self
+        conn._created_at = time.monotonic()
+        conn._last_used = conn._created_at
+        with self._lock:
+            self._counters["created"] += 1
+        return conn
+
+    def _discard(self, conn: PooledConnection):
+        """Chiude definitivamente una connessione scartata dal pool."""
+        try:
+            conn.close_physical()
+        except Exception:
+            pass
+        self._counters["discarded"] += 1
+
+    def _is_expired(self, conn: PooledConnection, now: float) -> bool:
+        """Verifica se la connessione ha superato la durata massima."""
+        return self.max_lifetime > 0 and now - conn._created_at > self.max_lifetime
+
+    def _is_healthy(self, conn: PooledConnection, now: float) -> bool:
+        """
+        Verifica che la connessione sia utilizzabile prima di consegnarla.
+
+        Il controllo locale (connessione aperta e senza transazioni pendenti)
+        è sempre eseguito; il ping verso il server solo se la connessione
+        è rimasta inattiva oltre ping_after secondi.
+        """
+        if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            return False
+        if now - conn._last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prune_idle(self, now: float):
+        """Chiude le connessioni inattive da troppo tempo mantenendo il minimo."""
+        while len(self._idle) + self._in_use > self.min_size and self._idle:
+            oldest = self._idle[0]
+            if now - oldest._last_used <= self.idle_timeout and not self._is_expired(oldest, now):
+                break
+            self._idle.popleft()
+            self._discard(oldest)
+
+    def _track(self, conn: PooledConnection):
+        """Registra la connessione come prelevata, rilevando eventuali leak."""
+        conn._finalizer = weakref.finalize(conn, self._on_leak)
+
+    def _on_leak(self):
+        """Libera lo slot di una connessione mai restituita e raccolta dal GC."""
+        with self._lock:
+            self._in_use -= 1
+            self._counters["leaked"] += 1
+            self._lock.notify()
+
+    # -----------------------------------------
+    # API pubblica del pool
+    # -----------------------------------------
+
+    def getconn(self, timeout: float = None) -> PooledConnection:
+        """
+        Preleva una connessione dal pool.
+
+        Args:
+            timeout: Attesa massima in secondi se il pool è esaurito
+                     (default: checkout_timeout del pool)
+
+        Returns:
+            PooledConnection: Connessione pronta all'uso
+
+        Raises:
+            PoolExhaustedError: Se nessuna connessione si libera entro il timeout
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune_idle(now)
+
+                candidate = None
+                if self._idle:
+                    candidate = self._idle.pop()
+                    self._in_use += 1
+                elif self._in_use < self.max_size:
+                    # Riserva lo slot: la connessione viene aperta fuori dal lock
+                    self._in_use += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolExhaustedError(
+                            f"Pool di connessioni esaurito ({self.max_size} connessioni in uso)"
+                        )
+                    self._counters["waits"] += 1
+                    self._lock.wait(remaining)
+                    continue
+
+            if candidate is not None:
+                # Verifica della connessione riutilizzata fuori dal lock
+                now = time.monotonic()
+                if not self._is_expired(candidate, now) and self._is_healthy(candidate, now):
+                    with self._lock:
+                        self._counters["reused"] += 1
+                    candidate._last_used = now
+                    self._track(candidate)
+                    return candidate
+
+                with self._lock:
+                    if candidate.closed == 0 and not self._is_expired(candidate, now):
+                        self._counters["failed_health_checks"] += 1
+                    self._discard(candidate)
+                    self._in_use -= 1
+                continue
+
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                    self._lock.notify()
+                raise
+            self._track(conn)
+            return conn
+
+    def putconn(self, conn: PooledConnection):
+        """
+        Restituisce una connessione al pool.
+
+        Eventuali transazioni lasciate aperte vengono annullate;
+        le connessioni chiuse, guaste o scadute vengono scartate.
+
+        Args:
+            conn: Connessione precedentemente ottenuta con getconn()
+        """
+        finalizer = getattr(conn, "_finalizer", None)
+        if finalizer is None or not finalizer.detach():
+            # Connessione già restituita: nulla da fare
+            return
+        conn._finalizer = None
+
+        reusable = not conn.closed
+        if reusable and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._lock:
+            self._in_use -= 1
+            now = time.monotonic()
+            if reusable and not self._is_expired(conn, now):
+                conn._last_used = now
+                self._idle.append(conn)
+            else:
+                self._discard(conn)
+            self._lock.notify()
+
+    def record(self, counter: str):
+        """Incrementa un contatore delle statistiche del pool."""
+        with self._lock:
+            self._counters[counter] += 1
+
+    def closeall(self):
+        """Chiude tutte le connessioni inattive del pool."""
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self) -> dict:
+        """
+        Restituisce le statistiche correnti del pool.
+
+        Returns:
+            dict: Dimensioni, connessioni libere/in uso e contatori cumulativi
+        """
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": len(self._idle) + self._in_use,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                **self._counters,
+            }
+
+
+# Pool condiviso dal processo, creato al primo utilizzo
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Restituisce il pool di connessioni del processo, creandolo se necessario.
+
+    Returns:
+        ConnectionPool: Pool condiviso configurato dalle variabili d'ambiente
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT,
+                    ping_after=DB_POOL_PING_AFTER,
+                    **DB_CONFIG
+                )
+    return _pool
+
+
+def get_pool_stats() -> dict:
+    """
+    Restituisce le statistiche del pool di connessioni.
+
+    Returns:
+        dict: Statistiche del pool, vuoto se il pool non è ancora stato creato
+    """
+    return _pool.stats() if _pool is not None else {}
+
 
 def connect_to_postgres():
     """
-    Stabilisce una connessione al database PostgreSQL.
-    
-    Questa funzione crea una nuova connessione al database utilizzando
-    i parametri di configurazione predefiniti per l'ambiente Docker.
-    
+    Ottiene una connessione al database PostgreSQL dal pool condiviso.
+
+    Questa funzione preleva una connessione già aperta dal pool
+    (o ne apre una nuova se il pool non ha connessioni libere),
+    utilizzando i parametri di configurazione predefiniti per l'ambiente Docker.
+
     Returns:
-        psycopg2.extensions.connection: Oggetto connessione al database PostgreSQL
-        
+        PooledConnection: Connessione al database PostgreSQL
+
     Note:
         I parametri di connessione sono configurati per funzionare
         con il servizio database definito nel docker-compose.yml.
-        La connessione deve essere chiusa manualmente dopo l'uso
-        o utilizzare execute_query che gestisce automaticamente la chiusura.
-    """
-    conn = psycopg2.connect(
-        host="database",      # Nome del servizio nel docker-compose
-        port=5432,            # Porta standard PostgreSQL
-        user="user",          # Deve combaciare con POSTGRES_USER
-        password="userpwd",   # Deve combaciare con POSTGRES_PASSWORD
-        dbname="HealthDB"     # Deve combaciare con POSTGRES_DB
-    )
+        La chiamata a close() restituisce la connessione al pool;
+        in alternativa utilizzare execute_query che gestisce
+        automaticamente la restituzione.
+    """
+    return _checkout(_caller_stack())
+
+
+def _caller_stack():
+    """Stack del chiamante da registrare con il prelievo (None se il rilevamento è disattivo)."""
+    if _request_connections.get() is None:
+        return None
+    return traceback.extract_stack(limit=9)[:-2]
+
+
+def _checkout(origin):
+    """
+    Preleva una connessione e la registra nella richiesta corrente.
+
+    Args:
+        origin: Stack del codice che ha chiesto la connessione; per i prelievi
+                asincroni è catturato nell'event loop, non nel thread dell'executor
+    """
+    conn = get_pool().getconn()
+
+    # Registrazione del prelievo se il rilevamento dei leak è attivo per la richiesta
+    registry = _request_connections.get()
+    if registry is not None:
+        registry.append((conn._finalizer, time.monotonic(), origin or []))
     return conn
 
 
+def get_db_session():
+    """
+    Dipendenza FastAPI che fornisce una connessione per la durata della richiesta.
+
+    La connessione viene prelevata dal pool all'inizio della richiesta e,
+    al termine, la transazione viene confermata (o annullata in caso di
+    eccezione) e la connessione restituita al pool.
+
+    Yields:
+        PooledConnection: Connessione al database PostgreSQL
+
+    Note:
+        Utilizzo: db: psycopg2.extensions.connection = Depends(get_db_session)
+    """
+    conn = connect_to_postgres()
+    try:
+        yield conn
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.commit()
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# =========================================
+# Rilevamento dei leak di connessione (sviluppo)
+# =========================================
+
+# Connessioni prelevate durante la richiesta corrente (None se il rilevamento è disattivo)
+_request_connections = contextvars.ContextVar("request_connections", default=None)
+
+
+@contextmanager
+def track_request_connections(label: str):
+    """
+    Traccia le connessioni prelevate durante una richiesta e segnala quelle
+    ancora in uso quando la richiesta termina.
+
+    Args:
+        label: Descrizione della richiesta usata nei messaggi (es. "GET /path")
+
+    Note:
+        Pensato per l'ambiente di sviluppo: per ogni prelievo viene salvato
+        lo stack del chiamante, operazione troppo costosa in produzione.
+    """
+    registry = []
+    token = _request_connections.set(registry)
+    try:
+        yield
+    finally:
+        _request_connections.reset(token)
+        now = time.monotonic()
+        for finalizer, checked_out_at, stack in registry:
+            # Il finalizer resta attivo finché la connessione non torna al pool
+            if finalizer is not None and finalizer.alive:
+                get_pool().record("held_past_request")
+                origin = "".join(traceback.format_list(stack[-3:])).rstrip()
+                logger.warning(
+                    "⚠️  Connessione al database non restituita al termine di %s "
+                    "(in uso da %.3fs), prelevata in:\n%s",
+                    label, now - checked_out_at, origin
+                )
+
+
 def execute_query(query: str, params: tuple = (), commit: bool = False, conn=None):
     """
     Esegue una query SQL sul database PostgreSQL.
-    
+
     Questa funzione gestisce l'esecuzione completa di query SQL:
-    - Gestisce automaticamente l'apertura e chiusura delle connessioni
+    - Preleva e restituisce automaticamente le connessioni dal pool
     - Supporta sia query di lettura che di scrittura
     - Gestisce automaticamente le transazioni (commit/rollback)
     - Gestisce la pulizia delle risorse (cursor e connessioni)
-    
+
     Args:
         query: Stringa SQL da eseguire
         params: Tupla con i parametri per la query (opzionale)
         commit: Se True, esegue commit della transazione
         conn: Connessione esistente da utilizzare (opzionale)
-        
+
     Returns:
         list: Lista dei risultati per query SELECT, None per altre query
-        
+
     Raises:
         Exception: Rilancia qualsiasi errore che si verifica durante l'esecuzione
-        
+
     Note:
-        Se non viene fornita una connessione, ne viene creata una nuova
-        che viene automaticamente chiusa dopo l'esecuzione.
+        Se non viene fornita una connessione, ne viene prelevata una dal pool
+        che viene automaticamente restituita dopo l'esecuzione.
         Per query di scrittura (INSERT, UPDATE, DELETE), impostare commit=True.
         In caso di errore, viene eseguito automaticamente rollback.
     """
-    # Flag per gestire la chiusura automatica della connessione
+    # Flag per gestire la restituzione automatica della connessione
     close_conn = False
-    
-    # Se non viene fornita una connessione, ne crea una nuova
+
+    # Se non viene fornita una connessione, ne preleva una dal pool
     if conn is None:
         conn = connect_to_postgres()
         close_conn = True
 
     # Creazione del cursor per eseguire la query
     cursor = conn.cursor()
-    
+
     try:
         # Esecuzione della query con i parametri forniti
         cursor.execute(query, params)
@@ -104,11 +540,173 @@ def execute_query(query: str, params: tuple = (), commit: bool = False, conn=Non
     finally:
         # Pulizia delle risorse: chiusura del cursor
         cursor.close()
-        
-        # Chiusura della connessione se è stata creata da questa funzione
+
+        # Restituzione della connessione al pool se è stata prelevata da questa funzione
         if close_conn:
             conn.close()
 
     return results
 
 
+# =========================================
+# Livello asincrono
+# =========================================
+
+# Executor dedicato alle query: i thread di lavoro sono dimensionati sul pool,
+# così le richieste in eccesso attendono in coda senza occupare l'event loop.
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix="db")
+
+# Executor delle query delle transazioni (transaction_async), che tengono la
+# connessione tra un await e l'altro. Le sue attività non attendono mai una
+# connessione dal pool e le transazioni aperte sono al più DB_POOL_MAX_SIZE:
+# anche con tutti i thread di _db_executor in attesa di una connessione, chi
+# la tiene trova sempre un thread libero per proseguire e restituirla.
+_tx_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix="db-tx")
+
+
+async def _run_in_executor(executor, func, *args, **kwargs):
+    """
+    Esegue una funzione bloccante del driver nell'executor indicato.
+
+    run_in_executor non propaga le variabili di contesto al thread: la
+    funzione viene eseguita in una copia del contesto del chiamante, così
+    i prelievi di connessioni restano registrati nella richiesta corrente
+    (track_request_connections).
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def _run_in_db_thread(func, *args, **kwargs):
+    """Esegue una funzione bloccante del driver nell'executor del database."""
+    return await _run_in_executor(_db_executor, func, *args, **kwargs)
+
+
+async def connect_to_postgres_async():
+    """
+    Variante asincrona di connect_to_postgres.
+
+    L'attesa di una connessione libera (pool esaurito) e l'eventuale
+    apertura di una nuova connessione avvengono fuori dall'event loop.
+
+    Returns:
+        PooledConnection: Connessione al database PostgreSQL
+
+    Note:
+        La connessione va restituita con release_async() (o close());
+        per il caso comune preferire transaction_async(). Non usarla per
+        più query separate da await: i thread dell'executor in attesa di
+        una connessione potrebbero impedirne l'esecuzione.
+    """
+    return await _run_in_db_thread(_checkout, _caller_stack())
+
+
+async def release_async(conn):
+    """
+    Restituisce al pool una connessione ottenuta con connect_to_postgres_async.
+
+    Args:
+        conn: Connessione da restituire
+    """
+    await _run_in_db_thread(conn.close)
+
+
+async def execute_query_async(query: str, params: tuple = (), commit: bool = False, conn=None):
+    """
+    Variante asincrona di execute_query.
+
+    Esegue la query in un thread dell'executor del database e restituisce
+    lo stesso risultato di execute_query, senza bloccare l'event loop
+    durante l'attesa della connessione e l'esecuzione della query.
+
+    Args:
+        query: Stringa SQL da eseguire
+        params: Tupla con i parametri per la query (opzionale)
+        commit: Se True, esegue commit della transazione
+        conn: Connessione esistente da utilizzare (opzionale)
+
+    Returns:
+        list: Lista dei risultati per query SELECT, None per altre query
+
+    Raises:
+        Exception: Rilancia qualsiasi errore che si verifica durante l'esecuzione
+    """
+    return await _run_in_db_thread(execute_query, query, params, commit, conn)
+
+
+class AsyncTransaction:
+    """
+    Transazione asincrona su una singola connessione del pool.
+
+    Tutte le query eseguite tramite execute() condividono la stessa
+    connessione, e vengono confermate o annullate insieme all'uscita dal
+    context manager restituito da transaction_async().
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, query: str, params: tuple = ()):
+        """
+        Esegue una query all'interno della transazione.
+
+        Args:
+            query: Stringa SQL da eseguire
+            params: Tupla con i parametri per la query (opzionale)
+
+        Returns:
+            list: Lista dei risultati per query SELECT, None per altre query
+        """
+        return await _run_in_executor(_tx_executor, _execute_in_transaction, self.conn, query, params)
+
+
+def _execute_in_transaction(conn, query: str, params: tuple):
+    """Esegue una query su una connessione senza gestirne la transazione."""
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        try:
+            return cursor.fetchall()
+        except psycopg2.ProgrammingError:
+            return None
+
+
+def _finish_transaction(conn, commit: bool):
+    """Conferma o annulla la transazione e restituisce la connessione al pool."""
+    try:
+        if commit:
+            conn.commit()
+        else:
+            conn.rollback()
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def transaction_async():
+    """
+    Context manager asincrono per eseguire più query in un'unica transazione.
+
+    Esempio:
+        async with transaction_async() as tx:
+            await tx.execute("DELETE FROM patient WHERE id = %s", (account_id,))
+            await tx.execute("DELETE FROM account WHERE id = %s", (account_id,))
+
+    Yields:
+        AsyncTransaction: Transazione legata a una connessione del pool
+
+    Note:
+        Alla chiusura esegue commit se il blocco termina senza errori,
+        altrimenti rollback; in entrambi i casi la connessione torna al pool.
+        La connessione viene attesa nell'executor condiviso, mentre le query
+        e la chiusura usano l'executor delle transazioni (_tx_executor): se
+        tutti i thread condivisi fossero in attesa di una connessione, le
+        transazioni che le tengono occupate potrebbero comunque proseguire.
+    """
+    conn = await _run_in_db_thread(_checkout, _caller_stack())
+    try:
+        yield AsyncTransaction(conn)
+    except BaseException:
+        await _run_in_executor(_tx_executor, _finish_transaction, conn, False)
+        raise
+    await _run_in_executor(_tx_executor, _finish_transaction, conn, True)
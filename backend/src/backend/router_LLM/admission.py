@@ -0,0 +1,317 @@
+"""
+Controllo di ammissione per le generazioni del modello AI.
+
+Un'unica istanza di Ollama su CPU degrada rapidamente quando riceve
+molte generazioni contemporanee. Questo modulo fornisce:
+- Un limite configurabile di generazioni in corso
+- Una coda di attesa limitata, servita a turno tra gli utenti (round-robin)
+- Un limite di richieste in coda per singolo utente
+- La posizione in coda di ogni richiesta in attesa
+- Il rifiuto immediato (503) quando la coda è piena
+
+In questo modo la latenza resta prevedibile invece di far scadere
+tutte le richieste insieme sotto carico.
+"""
+
+import os
+import asyncio
+import itertools
+from collections import OrderedDict, deque
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from jose import jwt, JWTError
+
+from backend.router_profile.cookies_login import SECRET_KEY, ALGORITHM
+
+# Configurazione tramite variabili d'ambiente
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "2"))               # Generazioni contemporanee verso Ollama
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "20"))                         # Richieste massime in attesa
+LLM_MAX_QUEUED_PER_USER = int(os.getenv("LLM_MAX_QUEUED_PER_USER", "2"))      # Richieste in attesa per utente
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))              # Attesa massima in coda (secondi)
+LLM_QUEUE_UPDATE_INTERVAL = float(os.getenv("LLM_QUEUE_UPDATE_INTERVAL", "1"))  # Intervallo aggiornamenti posizione (streaming)
+LLM_RETRY_AFTER = os.getenv("LLM_RETRY_AFTER", "5")                           # Valore dell'header Retry-After sui 503
+
+
+class QueueFullError(Exception):
+    """Sollevata quando la coda di attesa (globale o dell'utente) è piena."""
+
+
+class Ticket:
+    """
+    Richiesta di generazione registrata presso il limitatore.
+
+    Il ticket è "granted" quando la richiesta ha ottenuto uno slot
+    di generazione; va sempre restituito con GenerationLimiter.release().
+    Se lo slot è legato a una generazione (GenerationLimiter.bind), viene
+    liberato solo al termine di quella generazione.
+    """
+
+    __slots__ = ("id", "user", "future", "released", "generation")
+
+    def __init__(self, ticket_id: int, user: str, future: asyncio.Future):
+        self.id = ticket_id
+        self.user = user
+        self.future = future
+        self.released = False
+        self.generation: Optional[asyncio.Future] = None
+
+    @property
+    def granted(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+
+class GenerationLimiter:
+    """
+    Semaforo equo con coda limitata per le generazioni del modello.
+
+    Le richieste in attesa sono raggruppate per utente e servite a turno:
+    un utente con molte richieste non può scavalcare gli altri.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queued_per_user: int):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+
+        self._active = 0
+        self._queued = 0
+        self._waiting = OrderedDict()     # utente -> deque di ticket, nell'ordine di servizio
+        self._ids = itertools.count(1)
+
+        # Contatori per le statistiche
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def enqueue(self, user: str) -> Ticket:
+        """
+        Registra una nuova richiesta di generazione.
+
+        Se c'è uno slot libero e nessuno in attesa, il ticket è concesso subito;
+        altrimenti viene accodato dietro le richieste degli altri utenti.
+
+        Args:
+            user: Chiave dell'utente usata per l'equità tra utenti
+
+        Returns:
+            Ticket: Ticket da attendere con wait() e restituire con release()
+
+        Raises:
+            QueueFullError: Se la coda globale o quella dell'utente è piena
+        """
+        future = asyncio.get_running_loop().create_future()
+        ticket = Ticket(next(self._ids), user, future)
+
+        if self._active < self.max_concurrent and self._queued == 0:
+            self._active += 1
+            self._admitted += 1
+            future.set_result(True)
+            return ticket
+
+        user_queue = self._waiting.get(user)
+        if self._queued >= self.max_queue or (user_queue and len(user_queue) >= self.max_queued_per_user):
+            self._rejected += 1
+            raise QueueFullError("Coda delle richieste AI piena")
+
+        if user_queue is None:
+            user_queue = self._waiting[user] = deque()
+        user_queue.append(ticket)
+        self._queued += 1
+        return ticket
+
+    async def wait(self, ticket: Ticket, timeout: Optional[float] = None) -> bool:
+        """
+        Attende che il ticket ottenga uno slot di generazione.
+
+        Args:
+            ticket: Ticket restituito da enqueue()
+            timeout: Attesa massima in secondi (None = nessun limite)
+
+        Returns:
+            bool: True se lo slot è stato concesso, False se è scaduto il timeout
+        """
+        if ticket.granted:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return ticket.granted
+
+    def release(self, ticket: Ticket):
+        """
+        Restituisce il ticket: libera lo slot o rimuove la richiesta dalla coda.
+
+        L'operazione è idempotente e va eseguita in ogni caso
+        (completamento, errore, timeout o disconnessione del client).
+        Se il ticket è legato a una generazione ancora in corso, lo slot
+        verrà liberato al suo termine.
+        """
+        if ticket.released or (ticket.generation is not None and not ticket.generation.done()):
+            return
+        ticket.released = True
+
+        if ticket.granted:
+            self._active -= 1
+        else:
+            user_queue = self._waiting.get(ticket.user)
+            if user_queue is not None and ticket in user_queue:
+                user_queue.remove(ticket)
+                self._queued -= 1
+                if not user_queue:
+                    del self._waiting[ticket.user]
+            ticket.future.cancel()
+        self._grant_next()
+
+    def bind(self, ticket: Ticket, generation: asyncio.Future):
+        """
+        Lega lo slot del ticket a una generazione che può proseguire dopo la richiesta.
+
+        Una generazione condivisa con altre richieste continua anche se la
+        richiesta che l'ha avviata si disconnette: lo slot resta occupato
+        finché la generazione non termina, così le chiamate reali verso
+        Ollama non superano mai il limite.
+
+        Args:
+            ticket: Ticket concesso della richiesta che avvia la generazione
+            generation: Task della generazione
+        """
+        if ticket.released or not ticket.granted:
+            return
+        ticket.generation = generation
+        generation.add_done_callback(lambda _: self.release(ticket))
+
+    def record_timeout(self):
+        """Conta una richiesta abbandonata per attesa eccessiva in coda."""
+        self._timed_out += 1
+
+    def _grant_next(self):
+        """Concede gli slot liberi servendo gli utenti in attesa a turno."""
+        while self._active < self.max_concurrent and self._waiting:
+            user, user_queue = next(iter(self._waiting.items()))
+            ticket = user_queue.popleft()
+            self._queued -= 1
+            if user_queue:
+                # L'utente torna in fondo al giro
+                self._waiting.move_to_end(user)
+            else:
+                del self._waiting[user]
+            self._active += 1
+            self._admitted += 1
+            ticket.future.set_result(True)
+
+    def position(self, ticket: Ticket) -> int:
+        """
+        Calcola la posizione in coda del ticket (1 = il prossimo a essere servito).
+
+        Con il servizio a turno, il ticket i-esimo di un utente passa dopo
+        al più i richieste di ciascun altro utente in attesa.
+
+        Returns:
+            int: Posizione in coda, 0 se il ticket ha già uno slot
+        """
+        if ticket.granted or ticket.released:
+            return 0
+        users = list(self._waiting.keys())
+        if ticket.user not in self._waiting:
+            return 0
+        user_index = users.index(ticket.user)
+        round_index = self._waiting[ticket.user].index(ticket)
+
+        ahead = 0
+        for index, user in enumerate(users):
+            queued = len(self._waiting[user])
+            ahead += min(queued, round_index)
+            if index < user_index and queued > round_index:
+                ahead += 1
+        return ahead + 1
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente del limitatore.
+
+        Returns:
+            dict: Generazioni in corso, richieste in coda e contatori cumulativi
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": self._queued,
+            "waiting_users": len(self._waiting),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out
+        }
+
+
+# Limitatore condiviso dal processo
+generation_limiter = GenerationLimiter(LLM_MAX_CONCURRENT, LLM_MAX_QUEUE, LLM_MAX_QUEUED_PER_USER)
+
+
+def requester_key(http_request: Request) -> str:
+    """
+    Identifica l'utente che invia la richiesta, per l'equità della coda.
+
+    Usa l'id dell'account contenuto nel cookie access_token (senza accedere
+    al database); in sua assenza ricade sull'indirizzo IP del client.
+
+    Args:
+        http_request: Richiesta HTTP in ingresso
+
+    Returns:
+        str: Chiave dell'utente
+    """
+    token = http_request.cookies.get("access_token")
+    if token:
+        try:
+            account_id = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("id")
+            if account_id:
+                return f"account:{account_id}"
+        except JWTError:
+            pass
+    host = http_request.client.host if http_request.client else "unknown"
+    return f"ip:{host}"
+
+
+def admit_generation(http_request: Request) -> Ticket:
+    """
+    Registra la richiesta presso il limitatore o la rifiuta subito.
+
+    Args:
+        http_request: Richiesta HTTP in ingresso
+
+    Returns:
+        Ticket: Ticket da attendere e poi restituire
+
+    Raises:
+        HTTPException: 503 con header Retry-After se la coda è piena
+    """
+    try:
+        return generation_limiter.enqueue(requester_key(http_request))
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Servizio AI sovraccarico, riprova tra qualche secondo",
+            headers={"Retry-After": LLM_RETRY_AFTER}
+        )
+
+
+async def wait_for_generation_slot(ticket: Ticket):
+    """
+    Attende il turno del ticket entro LLM_QUEUE_TIMEOUT.
+
+    Args:
+        ticket: Ticket restituito da admit_generation
+
+    Raises:
+        HTTPException: 503 se l'attesa in coda supera il tempo massimo
+    """
+    if not await generation_limiter.wait(ticket, LLM_QUEUE_TIMEOUT):
+        generation_limiter.record_timeout()
+        raise HTTPException(
+            status_code=503,
+            detail="Tempo di attesa in coda esaurito, riprova tra qualche secondo",
+            headers={"Retry-After": LLM_RETRY_AFTER}
+        )
@@ -0,0 +1,147 @@
+"""
+Collegamento dei suggerimenti di prenotazione ai dottori prenotabili.
+
+Per ogni specializzazione suggerita dalla chat vengono allegati i dottori
+più vicini al paziente (o, senza posizione, quelli con rank più alto)
+insieme al loro primo slot libero. Tutte le specializzazioni sono servite
+da un'unica query, così il frontend non deve chiamare separatamente
+/free_doctors_by_specialization e /get_free_slots.
+
+Con la posizione del paziente si considerano prima gli slot nelle sedi
+entro LLM_SUGGESTED_DOCTORS_RADIUS_KM, con un filtro a riquadro che usa
+l'indice delle coordinate; il raggio si allarga solo per le specializzazioni
+che non hanno ancora abbastanza dottori.
+"""
+
+import os
+from typing import Optional
+
+from backend.connection import execute_query_async
+from backend.router_patient.location_index import MAX_DISTANCE_KM
+from backend.router_patient.proximity import proximity_filter, distance_sql
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("booking")
+
+# Numero di dottori allegati a ogni specializzazione suggerita
+LLM_SUGGESTED_DOCTORS = int(os.getenv("LLM_SUGGESTED_DOCTORS", "3"))
+
+# Raggio iniziale (km) della ricerca dei dottori vicini; si allarga se non ne trova abbastanza
+LLM_SUGGESTED_DOCTORS_RADIUS_KM = float(os.getenv("LLM_SUGGESTED_DOCTORS_RADIUS_KM", "25"))
+
+BOOKABLE_DOCTORS_QUERY = """
+WITH next_slot AS (
+    -- Primo slot libero di ogni dottore delle specializzazioni richieste
+    SELECT DISTINCT ON (a.doctor_id)
+        a.doctor_id, a.id AS appointment_id, a.date_time, a.price, a.location_id
+    FROM appointment a
+    JOIN doctor d ON d.id = a.doctor_id
+    JOIN location l ON l.id = a.location_id
+    WHERE d.specialization = ANY(%(specializations)s)
+      AND a.patient_id IS NULL
+      AND a.status = 'waiting'
+      AND a.date_time > NOW()
+      AND {proximity}
+    ORDER BY a.doctor_id, a.date_time
+),
+ranked AS (
+    SELECT
+        d.specialization, d.id, u.name, u.surname, d.rank, u.profile_img,
+        l.address, l.city, ns.appointment_id, ns.date_time, ns.price,
+        {distance} AS distance_km
+    FROM next_slot ns
+    JOIN doctor d ON d.id = ns.doctor_id
+    JOIN account u ON u.id = d.id
+    JOIN location l ON l.id = ns.location_id
+),
+numbered AS (
+    SELECT ranked.*, ROW_NUMBER() OVER (
+        PARTITION BY specialization
+        ORDER BY distance_km ASC NULLS LAST, rank DESC NULLS LAST, date_time ASC
+    ) AS position
+    FROM ranked
+)
+SELECT specialization, id, name, surname, rank, profile_img, address, city,
+       appointment_id, date_time, price, distance_km
+FROM numbered
+WHERE position <= %(per_specialization)s
+ORDER BY specialization, position
+"""
+
+
+async def attach_bookable_doctors(suggestions: list, latitude: Optional[float] = None,
+                                  longitude: Optional[float] = None,
+                                  per_specialization: int = LLM_SUGGESTED_DOCTORS) -> list:
+    """
+    Aggiunge a ogni suggerimento i dottori prenotabili con il loro primo slot libero.
+
+    Args:
+        suggestions: Suggerimenti di prenotazione (con chiave "specialization")
+        latitude: Latitudine del paziente (opzionale)
+        longitude: Longitudine del paziente (opzionale)
+        per_specialization: Numero massimo di dottori per specializzazione
+
+    Returns:
+        list: Gli stessi suggerimenti, ciascuno con la chiave "doctors";
+              in caso di errore del database i suggerimenti restano senza dottori
+    """
+    if not suggestions:
+        return suggestions
+
+    has_position = latitude is not None and longitude is not None
+    distance = distance_sql("l") if has_position else "NULL::float"
+
+    # Con la posizione si cercano prima gli slot nelle sedi entro il raggio (filtro sull'indice
+    # delle coordinate); il raggio si allarga, e viene ricercato, solo per le specializzazioni
+    # che non hanno ancora abbastanza dottori
+    radius = LLM_SUGGESTED_DOCTORS_RADIUS_KM if has_position else None
+    pending = list(dict.fromkeys(suggestion["specialization"] for suggestion in suggestions))
+    rows_by_specialization = {}
+    try:
+        while pending:
+            if has_position:
+                proximity, proximity_params = proximity_filter(latitude, longitude, radius)
+            else:
+                proximity, proximity_params = "TRUE", {}
+            query = BOOKABLE_DOCTORS_QUERY.format(distance=distance, proximity=proximity)
+            rows = await execute_query_async(query, {
+                "specializations": pending, "per_specialization": per_specialization, **proximity_params
+            })
+
+            # Un raggio più ampio comprende i dottori già trovati: i risultati sostituiscono i precedenti
+            for name in pending:
+                rows_by_specialization[name] = []
+            for row in rows:
+                rows_by_specialization[row[0]].append(row)
+            if radius is None:
+                break
+            pending = [name for name in pending if len(rows_by_specialization[name]) < per_specialization]
+            radius = radius * 4 if radius * 4 < MAX_DISTANCE_KM else None
+    except Exception as e:
+        # I dottori sono un'informazione aggiuntiva: la risposta della chat non deve fallire
+        logger.warning("⚠️  Impossibile recuperare i dottori prenotabili: %s", e)
+        return suggestions
+
+    doctors_by_specialization = {}
+    for rows in rows_by_specialization.values():
+        for (specialization, doctor_id, name, surname, rank, profile_img, address, city,
+             appointment_id, date_time, price, distance_km) in rows:
+            doctors_by_specialization.setdefault(specialization, []).append({
+                "id": doctor_id,
+                "name": name,
+                "surname": surname,
+                "rank": rank,
+                "profile_img": profile_img,
+                "address": address,
+                "city": city,
+                "distance_km": round(float(distance_km), 1) if distance_km is not None else None,
+                "next_slot": {
+                    "appointment_id": appointment_id,
+                    "date_time": date_time.isoformat(),
+                    "price": float(price) if price is not None else None
+                }
+            })
+
+    for suggestion in suggestions:
+        suggestion["doctors"] = doctors_by_specialization.get(suggestion["specialization"], [])
+    return suggestions
@@ -7,24 +7,65 @@ Questo modulo fornisce un sistema completo di conversazione AI per:
 - Suggerire specializzazioni mediche appropriate
 - Mantenere il contesto delle conversazioni
 - Considerare il profilo sanitario dell'utente
-- Generare suggerimenti di prenotazione intelligenti
+- Generare suggerimenti di prenotazione intelligenti, con i dottori prenotabili
+- Inviare le risposte in streaming tramite Server-Sent Events
+- Limitare le generazioni contemporanee con una coda equa tra utenti
+- Contenere la cronologia inviata al modello entro un budget di token
+- Conservare la cronologia sul server, identificata dal conversation_id
+- Riutilizzare le risposte alle domande frequenti (cache opzionale)
+- Suggerire le specializzazioni anche dalle parafrasi dei sintomi (embedding)
+- Degradare rapidamente sotto sovraccarico: circuit breaker, modello di riserva
+  e risposta di cortesia con i suggerimenti di prenotazione
+- Registrare le metriche di ogni richiesta (attese, durate, token al secondo)
+- Unificare le richieste identiche in corso (doppio clic, nuovi tentativi) in un'unica generazione
 
-Il sistema utilizza il modello llama3.2:latest tramite Ollama
-e implementa prompt di sistema specializzati per la medicina.
+Il sistema utilizza il modello indicato da OLLAMA_MODEL (llama3.2:latest)
+tramite il fornitore scelto con LLM_PROVIDER (Ollama, oppure un modello
+fittizio per i test di carico) e implementa prompt di sistema
+specializzati per la medicina.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import httpx
 import json
+import time
+import asyncio
+from contextlib import aclosing
+
+from backend.router_LLM.ollama_client import OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX
+from backend.router_LLM.providers import get_llm_provider
+from backend.router_LLM.logs import get_logger, sample_details, Redacted
+from backend.router_LLM.history import compact_history
+from backend.router_LLM.conversations import conversation_store, resolve_history, store_turn
+from backend.router_LLM.response_cache import response_cache
+from backend.router_LLM.specialization_router import specialization_router, suggest_booking
+from backend.router_LLM.suggestions import generate_booking_suggestions
+from backend.router_LLM.booking import attach_bookable_doctors
+from backend.router_LLM.metrics import llm_metrics, record_chat_metrics
+from backend.router_LLM.coalescing import chat_flights, payload_key
+from backend.router_LLM.circuit_breaker import (
+    get_circuit_breaker, model_chain, circuit_breaker_stats, ATTEMPT_TIMEOUT, BUSY_MESSAGE
+)
+from backend.router_LLM.admission import (
+    Ticket, generation_limiter, admit_generation, wait_for_generation_slot, requester_key,
+    LLM_QUEUE_TIMEOUT, LLM_QUEUE_UPDATE_INTERVAL
+)
 
 # Router per le funzionalità di chat AI
 router_LLM_chat = APIRouter()
 
-# Configurazione del servizio Ollama
-OLLAMA_URL = 'http://ollama:11434'
-MODEL = 'llama3.2:latest'
+logger = get_logger("chat")
+
+# Modello utilizzato per la chat
+MODEL = OLLAMA_MODEL
+
+# Fornitore e modello riportati nella risposta di cortesia (nessun modello disponibile)
+BUSY_PROVIDER = "fallback"
+BUSY_MODEL = "none"
 
 class Message(BaseModel):
     """
@@ -60,7 +101,11 @@ class ChatRequest(BaseModel):
     message: str                                 # Messaggio corrente dell'utente
     conversation_id: Optional[str] = None        # ID della conversazione per il tracking
     user_context: Optional[UserContext] = None  # Contesto sanitario dell'utente
-    message_history: Optional[List[Message]] = [] # Cronologia dei messaggi precedenti
+    message_history: Optional[List[Message]] = [] # Cronologia dei messaggi precedenti (opzionale se il server la conserva)
+    history_length: Optional[int] = None         # Messaggi precedenti noti al client, se la cronologia non viene inviata
+    include_doctors: bool = False                # Allega ai suggerimenti i dottori prenotabili e il primo slot libero
+    latitude: Optional[float] = None             # Posizione del paziente per ordinare i dottori per distanza
+    longitude: Optional[float] = None
 
 class ChatResponse(BaseModel):
     """
@@ -75,347 +120,835 @@ class ChatResponse(BaseModel):
     provider: str                    # Fornitore del servizio AI
     model: str                       # Modello AI utilizzato
     usage: Dict[str, int]           # Statistiche di utilizzo (token)
+    conversation_id: Optional[str] = None  # ID della conversazione conservata sul server
+
+# Prompt di sistema per il contesto sanitario
+SYSTEM_PROMPT = """Sei un assistente sanitario AI professionale e compassionevole. Il tuo ruolo è:
+1. Fornire informazioni sanitarie accurate e basate su evidenze
+2. Aiutare a comprendere sintomi e condizioni mediche
+3. Suggerire quando consultare un medico
+4. Offrire consigli su stili di vita sani
+5. Riconoscere situazioni di emergenza e guidare verso assistenza medica immediata
+6. Suggerire specializzazioni mediche in base alla diagnosi
+7. Considerare sempre il profilo sanitario del paziente nelle tue risposte
+8. Mantenere sempre la memoria della conversazione precedente
+
+IMPORTANTE: 
+- Ricorda sempre i sintomi e le informazioni che il paziente ha condiviso nella conversazione
+- Se il paziente chiede "che cos'ho" o simili, fai riferimento ai sintomi che ha menzionato prima
+- Non fornire mai diagnosi definitive. Incoraggia sempre la consultazione con un medico per problemi seri
+- Rispondi sempre in italiano e sii utile ma cauto nelle raccomandazioni mediche
+- Se è presente il PROFILO SANITARIO DEL PAZIENTE, considera sempre questi dati nel fornire consigli e raccomandazioni. Presta particolare attenzione alle allergie e condizioni croniche quando suggerisci farmaci o trattamenti"""
+
+
+def _canonical_list(values: Optional[List[str]]) -> str:
+    """Normalizza una lista del profilo: spazi, duplicati e ordine alfabetico."""
+    items = {}
+    for value in values or []:
+        item = " ".join(value.split())
+        if item:
+            items.setdefault(item.casefold(), item)
+    return ", ".join(items[key] for key in sorted(items))
+
+
+def build_profile_block(user_context: Optional[UserContext]) -> str:
+    """
+    Costruisce il blocco del profilo sanitario in forma canonica.
+
+    Campi in ordine fisso e liste ordinate e senza duplicati: lo stesso
+    profilo produce sempre lo stesso testo, così Ollama può riutilizzare
+    il prefisso del prompt già valutato (cache KV) nei turni successivi.
+
+    Args:
+        user_context: Contesto sanitario dell'utente (opzionale)
+
+    Returns:
+        str: Blocco da aggiungere al prompt di sistema, vuoto se non ci sono dati
+    """
+    if not user_context:
+        return ""
+
+    fields = [
+        ("Età", f"{user_context.eta} anni" if user_context.eta else ""),
+        ("Sesso", (user_context.sesso or "").strip()),
+        ("Gruppo sanguigno", (user_context.blood_type or "").strip()),
+        ("Allergie", _canonical_list(user_context.allergies)),
+        ("Condizioni croniche", _canonical_list(user_context.chronic_conditions)),
+        ("Patologie note", _canonical_list(user_context.patologie))
+    ]
+    context_info = [f"{label}: {value}" for label, value in fields if value]
+    if not context_info:
+        return ""
+    return "PROFILO SANITARIO DEL PAZIENTE:\n" + "\n".join(context_info)
+
+
+def profile_fingerprint(user_context: Optional[UserContext]) -> str:
+    """
+    Calcola l'impronta delle parti del profilo che influenzano la risposta.
+
+    Usata come parte della chiave della cache delle risposte: l'età è
+    ridotta alla decade e il gruppo sanguigno è escluso, così pazienti
+    con profili clinicamente equivalenti condividono le stesse risposte.
+
+    Args:
+        user_context: Contesto sanitario dell'utente (opzionale)
+
+    Returns:
+        str: Impronta del profilo (vuota se il profilo non è disponibile)
+    """
+    if not user_context:
+        return ""
+    return "|".join([
+        str(user_context.eta // 10 * 10) if user_context.eta else "",
+        (user_context.sesso or "").strip().casefold(),
+        _canonical_list(user_context.allergies).casefold(),
+        _canonical_list(user_context.chronic_conditions).casefold(),
+        _canonical_list(user_context.patologie).casefold()
+    ])
+
+
+def build_messages(request: ChatRequest, history: List[dict]) -> Tuple[list, Dict[str, int]]:
+    """
+    Costruisce la lista dei messaggi da inviare a Ollama.
+
+    Include il prompt di sistema (arricchito con il profilo sanitario
+    del paziente, se disponibile), i turni più recenti della conversazione
+    che rientrano nel budget di token (i più vecchi vengono riassunti)
+    e il messaggio corrente dell'utente.
+
+    Il prompt è composto dalla parte più stabile alla più variabile
+    (istruzioni fisse, profilo, riepilogo, cronologia), in modo che
+    richieste successive condividano il prefisso più lungo possibile.
+
+    Args:
+        request: Oggetto ChatRequest contenente il messaggio e il contesto
+        history: Cronologia dei messaggi precedenti, senza il messaggio corrente (vedi resolve_history)
+
+    Returns:
+        tuple: (messaggi nel formato atteso dall'endpoint /api/chat di Ollama,
+                statistiche di compattazione della cronologia da aggiungere a usage)
+    """
+    system_prompt = SYSTEM_PROMPT
+
+    # Aggiunta del profilo sanitario in coda alle istruzioni fisse
+    profile_block = build_profile_block(request.user_context)
+    if profile_block:
+        system_prompt += f"\n\n{profile_block}"
+
+    # Cronologia dei messaggi precedenti, compattata entro il budget di token
+    messages, history_stats = compact_history(system_prompt, history, request.message)
+
+    # Dettagli della richiesta solo a livello DEBUG e per le richieste campionate;
+    # testi e profilo sanitario restano oscurati salvo LLM_LOG_CONTENT=true
+    if sample_details(logger):
+        logger.debug("Messaggi inviati all'AI per conversazione %s: %d", request.conversation_id, len(messages))
+        for i, msg in enumerate(messages):
+            logger.debug("  %d. %s: %s", i + 1, msg["role"], Redacted(msg["content"]))
+        if request.user_context:
+            logger.debug("Contesto utente ricevuto dal frontend: %s", Redacted(request.user_context.model_dump()))
+        else:
+            logger.debug("Nessun contesto utente ricevuto dal frontend")
+
+    return messages, history_stats
+
+
+def build_payload(messages: list, stream: bool, model: str = MODEL) -> dict:
+    """
+    Prepara il payload per l'endpoint /api/chat di Ollama.
+
+    Args:
+        messages: Messaggi della conversazione costruiti da build_messages
+        stream: Se True, Ollama restituisce la risposta token per token
+        model: Modello da usare (il principale o una riserva)
+
+    Returns:
+        dict: Payload con modello, messaggi e parametri di generazione
+    """
+    return {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,   # Mantiene il modello (e la cache del prompt) in memoria
+        "options": {
+            "num_ctx": OLLAMA_NUM_CTX,  # Finestra di contesto, fissa per non ricaricare il modello
+            "temperature": 0.7,        # Controlla la creatività delle risposte
+            "num_predict": 1000,       # Numero massimo di token da generare
+            "top_k": 40,               # Top-k sampling per diversità
+            "top_p": 0.9,              # Nucleus sampling per qualità
+            "repeat_penalty": 1.1      # Penalità per ripetizioni
+        }
+    }
+
+
+def build_usage(data: dict) -> Dict[str, int]:
+    """
+    Estrae le statistiche di utilizzo dei token dalla risposta di Ollama.
+
+    Args:
+        data: Risposta finale di Ollama (o ultimo chunk dello stream)
+
+    Returns:
+        dict: Token del prompt, del completamento e totali
+    """
+    return {
+        "prompt_tokens": data.get("prompt_eval_count", 0),
+        "completion_tokens": data.get("eval_count", 0),
+        "total_tokens": (data.get("prompt_eval_count", 0) + data.get("eval_count", 0))
+    }
+
+
+def cached_usage() -> Dict[str, int]:
+    """Statistiche di utilizzo per una risposta servita dalla cache (nessun token generato)."""
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cache_hit": 1}
+
+
+def busy_usage() -> Dict[str, int]:
+    """Statistiche di utilizzo per la risposta di cortesia (nessun modello disponibile)."""
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "busy": 1}
+
+
+def describe_ollama_error(error: Exception) -> str:
+    """Messaggio di errore per il client a partire dall'eccezione della chiamata a Ollama."""
+    if isinstance(error, httpx.TimeoutException):
+        return "Timeout nella richiesta al servizio AI"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"Errore nel servizio AI: {error.response.status_code}"
+    if isinstance(error, httpx.RequestError):
+        return f"Errore di connessione al servizio AI: {str(error)}"
+    return f"Errore nel servizio AI: {str(error)}"
+
+
+async def build_suggestions(request: ChatRequest, semantic: bool = True) -> list:
+    """
+    Genera i suggerimenti di prenotazione per il messaggio dell'utente.
+
+    Se richiesto, allega a ogni specializzazione suggerita i dottori
+    prenotabili più vicini con il loro primo slot libero.
+
+    Args:
+        request: Oggetto ChatRequest contenente il messaggio e la posizione
+        semantic: Se False usa solo le parole chiave, senza chiamare Ollama
+                  (risposta di cortesia con il servizio AI sovraccarico)
+
+    Returns:
+        list: Suggerimenti di prenotazione
+    """
+    if semantic:
+        suggestions = await suggest_booking(request.message)
+    else:
+        suggestions = generate_booking_suggestions(request.message)
+    if request.include_doctors:
+        suggestions = await attach_bookable_doctors(suggestions, request.latitude, request.longitude)
+    return suggestions
+
+
+async def lookup_cached_response(request: ChatRequest, history: List[dict]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Cerca nella cache una risposta per il primo messaggio di una conversazione.
+
+    Args:
+        request: Oggetto ChatRequest contenente il messaggio e il contesto
+        history: Cronologia dei messaggi precedenti
+
+    Returns:
+        tuple: (risposta memorizzata o None, impronta del profilo da usare
+                per memorizzare la nuova risposta, None se la cache non si applica)
+    """
+    if not response_cache.enabled or history:
+        return None, None
+    fingerprint = profile_fingerprint(request.user_context)
+    return await response_cache.lookup(request.message, fingerprint), fingerprint
+
 
 @router_LLM_chat.post("/ask", response_model=ChatResponse)
-async def ask(request: ChatRequest):
+async def ask(request: ChatRequest, http_request: Request):
     """
     Endpoint principale per inviare domande di salute all'assistente AI.
     
     Questa funzione gestisce l'intera conversazione con l'AI, includendo:
+    - Controllo di ammissione (coda equa e limite di generazioni contemporanee)
     - Preparazione del prompt di sistema con contesto sanitario
-    - Gestione della cronologia delle conversazioni
+    - Gestione della cronologia delle conversazioni (inviata dal client o conservata sul server)
+    - Risposte dalla cache per le domande frequenti (se abilitata)
     - Invio delle richieste al servizio Ollama
     - Generazione di suggerimenti di prenotazione intelligenti
     - Gestione degli errori e timeout
     
     Args:
         request: Oggetto ChatRequest contenente il messaggio e il contesto
+        http_request: Richiesta HTTP, usata per identificare l'utente in coda
         
     Returns:
         ChatResponse: Risposta completa dell'assistente AI con suggerimenti
         
     Raises:
-        HTTPException: In caso di errori di connessione, timeout o errori del servizio
+        HTTPException: 503 se la coda è piena o l'attesa è troppo lunga,
+                       409 se la cronologia non è stata inviata e il server non la conserva,
+                       oppure in caso di errori interni non previsti
     """
+    started = time.monotonic()
+    owner = requester_key(http_request)
+    conversation_id, history = await resolve_history(
+        owner, request.conversation_id, request.message, message_history_dicts(request), request.history_length
+    )
+
+    # Una risposta già in cache non occupa uno slot di generazione
+    cached, fingerprint = await lookup_cached_response(request, history)
+    if cached is not None:
+        await store_turn(owner, conversation_id, history, request.message, cached)
+        response = ChatResponse(
+            response=cached,
+            confidence=0.9,
+            suggestions=await build_suggestions(request),
+            provider=get_llm_provider().name,
+            model=MODEL,
+            usage=cached_usage(),
+            conversation_id=conversation_id
+        )
+        record_chat_metrics("cache_hit", MODEL, time.monotonic() - started)
+        return response
+
+    # Con tutti i circuiti aperti la risposta di cortesia è immediata, senza attendere in coda
+    if not model_chain(MODEL):
+        return await busy_response(request, owner, conversation_id, history, started)
+
+    # Una generazione identica già in corso viene condivisa senza occupare uno slot
+    # (tra il controllo e l'iscrizione in generate_chat_response non ci sono attese)
+    messages, history_stats = build_messages(request, history)
+    flight_key = payload_key(build_payload(messages, stream=False))
+    if chat_flights.in_flight(flight_key):
+        return await generate_chat_response(
+            request, owner, conversation_id, history, messages, history_stats, flight_key, started, 0.0, fingerprint
+        )
+
+    # Rifiuto immediato se la coda è piena, poi attesa del proprio turno
+    ticket = admit_generation(http_request)
     try:
+        queued_at = time.monotonic()
+        await wait_for_generation_slot(ticket)
+        return await generate_chat_response(
+            request, owner, conversation_id, history, messages, history_stats, flight_key,
+            started, time.monotonic() - queued_at, fingerprint, ticket
+        )
+    finally:
+        # Se la generazione prosegue per altre richieste, lo slot viene liberato al suo termine
+        generation_limiter.release(ticket)
 
-        # Preparazione del prompt di sistema per il contesto sanitario
-        system_prompt = """Sei un assistente sanitario AI professionale e compassionevole. Il tuo ruolo è:
-1. Fornire informazioni sanitarie accurate e basate su evidenze
-2. Aiutare a comprendere sintomi e condizioni mediche
-3. Suggerire quando consultare un medico
-4. Offrire consigli su stili di vita sani
-5. Riconoscere situazioni di emergenza e guidare verso assistenza medica immediata
-6. Suggerire specializzazioni mediche in base alla diagnosi
-7. Considerare sempre il profilo sanitario del paziente nelle tue risposte
-8. Mantenere sempre la memoria della conversazione precedente
 
-IMPORTANTE: 
-- Ricorda sempre i sintomi e le informazioni che il paziente ha condiviso nella conversazione
-- Se il paziente chiede "che cos'ho" o simili, fai riferimento ai sintomi che ha menzionato prima
-- Non fornire mai diagnosi definitive. Incoraggia sempre la consultazione con un medico per problemi seri
-- Rispondi sempre in italiano e sii utile ma cauto nelle raccomandazioni mediche"""
+def message_history_dicts(request: ChatRequest) -> List[dict]:
+    """Converte la cronologia inviata dal client in dizionari {"role", "content"}."""
+    return [{"role": msg.role, "content": msg.content} for msg in (request.message_history or [])]
 
-        # Aggiunta del contesto utente se disponibile per personalizzare le risposte
-        if request.user_context:
-            context_info = []
-            if request.user_context.eta:
-                context_info.append(f"Età: {request.user_context.eta} anni")
-            if request.user_context.sesso:
-                context_info.append(f"Sesso: {request.user_context.sesso}")
-            if request.user_context.blood_type:
-                context_info.append(f"Gruppo sanguigno: {request.user_context.blood_type}")
-            if request.user_context.allergies and len(request.user_context.allergies) > 0:
-                context_info.append(f"Allergie: {', '.join(request.user_context.allergies)}")
-            if request.user_context.chronic_conditions and len(request.user_context.chronic_conditions) > 0:
-                context_info.append(f"Condizioni croniche: {', '.join(request.user_context.chronic_conditions)}")
-            if request.user_context.patologie and len(request.user_context.patologie) > 0:
-                context_info.append(f"Patologie note: {', '.join(request.user_context.patologie)}")
-            
-            if context_info:
-                system_prompt += f"\n\nPROFILO SANITARIO DEL PAZIENTE:\n{' | '.join(context_info)}\n\nConsidera sempre questi dati nel fornire consigli e raccomandazioni. Presta particolare attenzione alle allergie e condizioni croniche quando suggerisci farmaci o trattamenti."
-
-        # Costruzione dell'array dei messaggi includendo la cronologia completa
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            }
-        ]
-
-        # Aggiunta della cronologia dei messaggi precedenti per mantenere il contesto
-        if request.message_history:
-            for msg in request.message_history:
-                messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
 
-        # Aggiunta del messaggio corrente dell'utente
-        messages.append({
-            "role": "user",
-            "content": request.message
-        })
+async def chat_with_fallback(messages: list) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Genera la risposta provando in ordine il modello principale e le riserve.
 
-        # Debug: stampa i messaggi che vengono inviati all'AI per tracciabilità
-        print(f"🔍 Messaggi inviati all'AI per conversazione {request.conversation_id}:")
-        for i, msg in enumerate(messages):
-            print(f"  {i+1}. {msg['role']}: {msg['content'][:100]}...")
-        
-        # Debug: stampa il contesto utente ricevuto per verifica
-        if request.user_context:
-            print(f"👤 User Context ricevuto dal frontend:")
-            print(f"  - Età: {request.user_context.eta}")
-            print(f"  - Sesso: {request.user_context.sesso}")
-            print(f"  - Patologie: {request.user_context.patologie}")
-            print(f"  - Blood Type: {request.user_context.blood_type}")
-            print(f"  - Allergies: {request.user_context.allergies}")
-            print(f"  - Chronic Conditions: {request.user_context.chronic_conditions}")
-        else:
-            print("⚠️  Nessun user context ricevuto dal frontend")
-
-        # Preparazione del payload per Ollama con parametri ottimizzati
-        payload = {
-            "model": MODEL,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,        # Controlla la creatività delle risposte
-                "num_predict": 1000,       # Numero massimo di token da generare
-                "top_k": 40,               # Top-k sampling per diversità
-                "top_p": 0.9,              # Nucleus sampling per qualità
-                "repeat_penalty": 1.1      # Penalità per ripetizioni
-            }
-        }
+    I modelli con il circuito aperto vengono saltati; ogni errore, timeout
+    o risposta lenta viene registrato nel circuito del modello.
 
-        # Invio della richiesta a Ollama con gestione timeout
-        async with httpx.AsyncClient(timeout=httpx.Timeout(None)) as client:
-            response = await client.post(
-                f"{OLLAMA_URL}/api/chat",
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
+    Args:
+        messages: Messaggi della conversazione costruiti da build_messages
 
-            # Verifica del successo della richiesta
-            if not response.is_success:
-                error_text = response.text
-                print(f"❌ Errore Ollama API: {response.status_code} - {error_text}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Errore nel servizio AI: {response.status_code}"
-                )
-
-            data = response.json()
-            print(f"✅ Risposta da Ollama ricevuta per conversazione {request.conversation_id}")
-
-            # Generazione di suggerimenti di prenotazione basati sui sintomi menzionati
-            suggestions = generate_booking_suggestions(request.message)
-            print(f"🔍 Messaggio utente: '{request.message}'")
-            print(f"🔍 Suggerimenti generati: {suggestions}")
-
-            # Costruzione della risposta completa con tutte le informazioni
-            return ChatResponse(
-                response=data.get("message", {}).get("content", "Mi dispiace, non ho ricevuto una risposta valida."),
-                confidence=0.9,
-                suggestions=suggestions,
-                provider="ollama",
-                model=MODEL,
-                usage={
-                    "prompt_tokens": data.get("prompt_eval_count", 0),
-                    "completion_tokens": data.get("eval_count", 0),
-                    "total_tokens": (data.get("prompt_eval_count", 0) + data.get("eval_count", 0))
-                }
-            )
+    Returns:
+        tuple: (risposta nel formato di Ollama, modello che l'ha generata),
+               oppure (None, None) se nessun modello ha risposto
+    """
+    provider = get_llm_provider()
+    for model in model_chain(MODEL):
+        breaker = get_circuit_breaker(model)
+        if not breaker.allow():
+            continue
+        started = time.monotonic()
+        try:
+            data = await provider.chat(build_payload(messages, stream=False, model=model), timeout=ATTEMPT_TIMEOUT)
+        except (httpx.HTTPError, ValueError) as e:
+            breaker.record_failure()
+            logger.warning("⚠️  Modello %s non disponibile, provo il successivo: %s", model, describe_ollama_error(e))
+            continue
+        breaker.record_success(time.monotonic() - started)
+        return data, model
+    return None, None
 
-    except httpx.TimeoutException:
-        # Gestione specifica dei timeout nelle richieste
-        raise HTTPException(
-            status_code=408,
-            detail="Timeout nella richiesta al servizio AI"
+
+async def busy_response(request: ChatRequest, owner: str, conversation_id: str, history: List[dict],
+                        started: float) -> ChatResponse:
+    """
+    Risposta di cortesia quando nessun modello è disponibile.
+
+    I suggerimenti usano solo le parole chiave, così la risposta non
+    dipende da Ollama e arriva subito.
+
+    Returns:
+        ChatResponse: Messaggio di servizio occupato con i suggerimenti di prenotazione
+    """
+    await store_turn(owner, conversation_id, history, request.message, BUSY_MESSAGE)
+    response = ChatResponse(
+        response=BUSY_MESSAGE,
+        confidence=0.0,
+        suggestions=await build_suggestions(request, semantic=False),
+        provider=BUSY_PROVIDER,
+        model=BUSY_MODEL,
+        usage=busy_usage(),
+        conversation_id=conversation_id
+    )
+    record_chat_metrics("busy", BUSY_MODEL, time.monotonic() - started)
+    return response
+
+
+def bind_ticket(ticket: Optional[Ticket]):
+    """
+    Callback per chat_flights che lega lo slot del ticket alla generazione avviata.
+
+    Se la richiesta che ha avviato una generazione condivisa si disconnette,
+    lo slot resta occupato finché la generazione prosegue per le altre.
+    """
+    if ticket is None:
+        return None
+    return lambda generation: generation_limiter.bind(ticket, generation)
+
+
+async def generate_chat_response(request: ChatRequest, owner: str, conversation_id: str, history: List[dict],
+                                 messages: list, history_stats: Dict[str, int], flight_key: str,
+                                 started: float, queue_wait: float,
+                                 cache_fingerprint: Optional[str] = None,
+                                 ticket: Optional[Ticket] = None) -> ChatResponse:
+    """
+    Genera la risposta completa (senza streaming) tramite Ollama.
+
+    Se il modello principale non risponde si passa ai modelli di riserva
+    e, in ultima istanza, alla risposta di cortesia.
+
+    Args:
+        request: Oggetto ChatRequest contenente il messaggio e il contesto
+        owner: Chiave dell'utente proprietario della conversazione
+        conversation_id: Identificativo della conversazione
+        history: Cronologia dei messaggi precedenti
+        messages: Messaggi per il modello costruiti da build_messages
+        history_stats: Statistiche della compattazione della cronologia
+        flight_key: Chiave per condividere la generazione con le richieste identiche in corso
+        started: Istante di arrivo della richiesta (time.monotonic), per le metriche
+        queue_wait: Secondi trascorsi in coda prima di ottenere lo slot
+        cache_fingerprint: Impronta del profilo per memorizzare la risposta in cache (None = non memorizzare)
+        ticket: Ticket di ammissione, legato alla generazione se questa richiesta la avvia
+                (None se la richiesta attende una generazione identica già in corso)
+
+    Returns:
+        ChatResponse: Risposta completa dell'assistente AI con suggerimenti
+
+    Raises:
+        HTTPException: 500 in caso di errori interni non previsti
+    """
+    # I suggerimenti (e l'eventuale ricerca dei dottori) procedono in parallelo alla generazione
+    suggestions_task = asyncio.create_task(build_suggestions(request))
+    try:
+
+        # Invio a Ollama, con le eventuali riserve, o attesa della generazione identica in corso
+        (data, model), shared = await chat_flights.run(
+            flight_key, lambda: chat_with_fallback(messages), on_start=bind_ticket(ticket)
         )
-    except httpx.RequestError as e:
-        # Gestione degli errori di connessione al servizio
-        raise HTTPException(
-            status_code=503,
-            detail=f"Errore di connessione al servizio AI: {str(e)}"
+        if data is None:
+            return await busy_response(request, owner, conversation_id, history, started)
+
+        logger.debug("Risposta da %s ricevuta per conversazione %s", model, conversation_id)
+        reply = data.get("message", {}).get("content", "Mi dispiace, non ho ricevuto una risposta valida.")
+        await store_turn(owner, conversation_id, history, request.message, reply)
+        # In cache solo le risposte del modello principale, una volta per generazione
+        if cache_fingerprint is not None and model == MODEL and not shared and data.get("message", {}).get("content"):
+            await response_cache.store(request.message, cache_fingerprint, reply)
+
+        # Suggerimenti di prenotazione basati sui sintomi menzionati
+        suggestions = await suggestions_task
+        if sample_details(logger):
+            logger.debug("Suggerimenti generati per %s: %s", Redacted(request.message),
+                         [suggestion.get("specialization") for suggestion in suggestions])
+
+        # Costruzione della risposta completa con tutte le informazioni
+        response = ChatResponse(
+            response=reply,
+            confidence=0.9,
+            suggestions=suggestions,
+            provider=get_llm_provider().name,
+            model=model,
+            usage={**build_usage(data), **history_stats},
+            conversation_id=conversation_id
         )
+        if shared:
+            # Le statistiche di generazione sono già state registrate dalla prima richiesta
+            record_chat_metrics("coalesced", model, time.monotonic() - started, queue_wait)
+        else:
+            record_chat_metrics(
+                "generated" if model == MODEL else "fallback_model", model,
+                time.monotonic() - started, queue_wait, data=data
+            )
+        return response
+
     except Exception as e:
         # Gestione degli errori generici non previsti
-        print(f"❌ Errore generico nella chat: {str(e)}")
+        record_chat_metrics("error", MODEL, time.monotonic() - started, queue_wait)
+        logger.error("❌ Errore generico nella chat: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore interno del server: {str(e)}"
         )
+    finally:
+        suggestions_task.cancel()
 
 
-def generate_booking_suggestions(user_message: str) -> list:
+def sse_event(event: str, data: dict) -> str:
     """
-    Genera suggerimenti di prenotazione basati sui sintomi/condizioni menzionati.
-    
-    Questa funzione analizza il messaggio dell'utente per identificare
-    sintomi o condizioni mediche e suggerisce le specializzazioni
-    mediche più appropriate per la prenotazione di visite.
-    
+    Formatta un evento Server-Sent Events.
+
     Args:
-        user_message: Messaggio dell'utente da analizzare
-        
+        event: Nome dell'evento (token, done, error)
+        data: Dati dell'evento serializzati in JSON
+
     Returns:
-        list: Lista di suggerimenti di prenotazione con specializzazioni appropriate
+        str: Evento pronto per essere inviato al client
     """
-    suggestions = []
-    
-    # Mappa completa di sintomi/condizioni a specializzazioni mediche
-    specialization_map = {
-        # Cardiologia - problemi cardiaci e circolatori
-        "cuore": "Cardiologia",
-        "cardiaca": "Cardiologia",
-        "pressione": "Cardiologia",
-        "ipertensione": "Cardiologia",
-        "aritmia": "Cardiologia",
-        "dolore al petto": "Cardiologia",
-        
-        # Dermatologia - problemi della pelle
-        "pelle": "Dermatologia",
-        "eruzione": "Dermatologia",
-        "acne": "Dermatologia",
-        "psoriasi": "Dermatologia",
-        "eczema": "Dermatologia",
-        
-        # Gastroenterologia - problemi digestivi
-        "stomaco": "Gastroenterologia",
-        "digestione": "Gastroenterologia",
-        "nausea": "Gastroenterologia",
-        "vomito": "Gastroenterologia",
-        "diarrea": "Gastroenterologia",
-        "stipsi": "Gastroenterologia",
-        
-        # Neurologia - problemi del sistema nervoso
-        "cervello": "Neurologia",
-        "testa": "Neurologia",
-        "mal di testa": "Neurologia",
-        "emicrania": "Neurologia",
-        "vertigini": "Neurologia",
-        "convulsioni": "Neurologia",
-        
-        # Oculistica - problemi della vista
-        "occhi": "Oculistica",
-        "vista": "Oculistica",
-        "cecità": "Oculistica",
-        "cataratta": "Oculistica",
-        "glaucoma": "Oculistica",
-        
-        # Otorinolaringoiatria - problemi di orecchie, naso e gola
-        "orecchie": "Otorinolaringoiatria",
-        "naso": "Otorinolaringoiatria",
-        "gola": "Otorinolaringoiatria",
-        "udito": "Otorinolaringoiatria",
-        "tinnito": "Otorinolaringoiatria",
-        "tonsille": "Otorinolaringoiatria",
-        
-        # Ortopedia - problemi muscoloscheletrici
-        "ossa": "Ortopedia",
-        "articolazioni": "Ortopedia",
-        "schiena": "Ortopedia",
-        "lombare": "Ortopedia",
-        "frattura": "Ortopedia",
-        "artrite": "Ortopedia",
-        "reumatismi": "Ortopedia",
-        "ginocchio": "Ortopedia",
-        "dolore al ginocchio": "Ortopedia",
-        
-        # Pneumologia - problemi respiratori
-        "polmoni": "Pneumologia",
-        "respirazione": "Pneumologia",
-        "asma": "Pneumologia",
-        "bronchite": "Pneumologia",
-        "tosse": "Pneumologia",
-        
-        # Nefrologia - problemi renali
-        "reni": "Nefrologia",
-        "urine": "Nefrologia",
-        "dialisi": "Nefrologia",
-        
-        # Endocrinologia - problemi ormonali e metabolici
-        "tiroide": "Endocrinologia",
-        "diabete": "Endocrinologia",
-        "ormoni": "Endocrinologia",
-        "metabolismo": "Endocrinologia",
-        
-        # Pediatria - problemi dell'infanzia
-        "bambini": "Pediatria",
-        "pediatrico": "Pediatria",
-        "infantile": "Pediatria",
-        
-        # Psichiatria - problemi di salute mentale
-        "psiche": "Psichiatria",
-        "depressione": "Psichiatria",
-        "ansia": "Psichiatria",
-        "stress": "Psichiatria",
-        "panico": "Psichiatria",
-        
-        # Psicologia - supporto psicologico
-        "psicologico": "Psicologia",
-        "terapia": "Psicologia",
-        "counseling": "Psicologia",
-        
-        # Oncologia - problemi tumorali
-        "tumore": "Oncologia",
-        "cancro": "Oncologia",
-        "chemioterapia": "Oncologia",
-        "radioterapia": "Oncologia",
-        
-        # Urologia - problemi urogenitali maschili
-        "vescica": "Urologia",
-        "prostata": "Urologia",
-        "genitale": "Urologia",
-        
-        # Ginecologia - problemi ginecologici e ostetrici
-        "ginecologico": "Ginecologia",
-        "gravidanza": "Ginecologia",
-        "mestruazioni": "Ginecologia",
-        "menopausa": "Ginecologia",
-        
-        # Allergologia - problemi allergici
-        "allergia": "Allergologia",
-        "allergico": "Allergologia",
-        "anafilassi": "Allergologia",
-        
-        # Anestesia e Rianimazione
-        "anestesia": "Anestesia e Rianimazione",
-        
-        # Chirurgia Generale
-        "chirurgia": "Chirurgia Generale",
-        "operazione": "Chirurgia Generale",
-        
-        # Radiologia - diagnostica per immagini
-        "radiografia": "Radiologia",
-        "risonanza": "Radiologia",
-        "tac": "Radiologia",
-        "ecografia": "Radiologia"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_with_fallback(messages: list):
+    """
+    Genera la risposta in streaming provando in ordine il modello principale e le riserve.
+
+    Si passa al modello successivo solo se l'errore arriva prima del primo
+    token; se nessun modello risponde lo stream termina senza elementi.
+
+    Args:
+        messages: Messaggi della conversazione costruiti da build_messages
+
+    Yields:
+        tuple: ("token", testo), poi ("done", modello, ultimo chunk di Ollama)
+               oppure ("error", messaggio) se la generazione si interrompe
+    """
+    provider = get_llm_provider()
+    for model in model_chain(MODEL):
+        breaker = get_circuit_breaker(model)
+        if not breaker.allow():
+            continue
+        attempt_started = time.monotonic()
+        responded = False
+        try:
+            # aclosing chiude subito lo stream del fornitore (e la connessione) anche se si esce prima della fine
+            async with aclosing(provider.stream_chat(
+                build_payload(messages, stream=True, model=model), timeout=ATTEMPT_TIMEOUT
+            )) as chunks:
+                async for chunk in chunks:
+                    if chunk.get("error"):
+                        raise ValueError(chunk["error"])
+
+                    if not responded:
+                        # Per il circuito conta l'attesa del primo token
+                        responded = True
+                        breaker.record_success(time.monotonic() - attempt_started)
+
+                    content = chunk.get("message", {}).get("content", "")
+                    if content:
+                        yield ("token", content)
+
+                    if chunk.get("done"):
+                        # Ultimo chunk: contiene le statistiche di generazione
+                        yield ("done", model, chunk)
+                        return
+                raise ValueError("risposta interrotta prima del termine")
+
+        except (httpx.HTTPError, ValueError) as e:
+            breaker.record_failure()
+            if responded:
+                # Parte della risposta è già stata inviata: non si può passare a un altro modello
+                yield ("error", describe_ollama_error(e))
+                return
+            logger.warning("⚠️  Modello %s non disponibile, provo il successivo: %s", model, describe_ollama_error(e))
+
+
+async def stream_chat_events(request: ChatRequest, owner: str, conversation_id: str, history: List[dict],
+                             messages: list, history_stats: Dict[str, int], flight_key: str,
+                             ticket: Optional[Ticket], events, started: float,
+                             cache_fingerprint: Optional[str] = None):
+    """
+    Inoltra al client, come eventi SSE, i token generati da Ollama in streaming.
+
+    Eventi emessi:
+    - queue: posizione in coda mentre si attende uno slot di generazione
+    - token: frammento di testo della risposta ({"content": ...})
+    - done: evento finale con suggerimenti di prenotazione, statistiche di utilizzo e conversation_id
+    - error: errore del servizio AI (gli header HTTP sono già stati inviati)
+
+    Args:
+        request: Richiesta di chat originale
+        owner: Chiave dell'utente proprietario della conversazione
+        conversation_id: Identificativo della conversazione
+        history: Cronologia dei messaggi precedenti
+        messages: Messaggi per il modello costruiti da build_messages
+        history_stats: Statistiche della compattazione della cronologia
+        flight_key: Chiave per condividere lo stream con le richieste identiche in corso
+        ticket: Ticket di ammissione, restituito al termine dello stream condiviso
+                (None se la richiesta legge uno stream identico già in corso)
+        events: Iscrizione allo stream identico già in corso (None = avviarne uno dopo l'attesa in coda)
+        started: Istante di arrivo della richiesta (time.monotonic), per le metriche
+        cache_fingerprint: Impronta del profilo per memorizzare la risposta in cache (None = non memorizzare)
+
+    Yields:
+        str: Eventi SSE formattati
+    """
+    reply_parts = []
+    queued_at = time.monotonic()
+    first_token = None
+
+    # I suggerimenti (e l'eventuale ricerca dei dottori) procedono in parallelo alla generazione
+    suggestions_task = asyncio.create_task(build_suggestions(request))
+
+    try:
+        # Attesa del proprio turno con aggiornamenti periodici della posizione
+        deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+        while ticket is not None and not ticket.granted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                generation_limiter.record_timeout()
+                yield sse_event("error", {"detail": "Tempo di attesa in coda esaurito, riprova tra qualche secondo"})
+                return
+            yield sse_event("queue", {"position": generation_limiter.position(ticket)})
+            await generation_limiter.wait(ticket, min(LLM_QUEUE_UPDATE_INTERVAL, remaining))
+        queue_wait = time.monotonic() - queued_at
+
+        shared = events is not None
+        if not shared:
+            events, shared = chat_flights.stream(
+                flight_key, lambda: stream_with_fallback(messages), on_start=bind_ticket(ticket)
+            )
+
+        async for event in events:
+            if event[0] == "token":
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                reply_parts.append(event[1])
+                yield sse_event("token", {"content": event[1]})
+
+            elif event[0] == "done":
+                _, model, chunk = event
+                reply = "".join(reply_parts)
+                await store_turn(owner, conversation_id, history, request.message, reply)
+                if cache_fingerprint is not None and model == MODEL and not shared:
+                    await response_cache.store(request.message, cache_fingerprint, reply)
+                yield sse_event("done", {
+                    "suggestions": await suggestions_task,
+                    "provider": get_llm_provider().name,
+                    "model": model,
+                    "usage": {**build_usage(chunk), **history_stats},
+                    "conversation_id": conversation_id
+                })
+                if shared:
+                    # Le statistiche di generazione sono già state registrate dalla prima richiesta
+                    record_chat_metrics("coalesced", model, time.monotonic() - started, queue_wait, first_token)
+                else:
+                    record_chat_metrics(
+                        "generated" if model == MODEL else "fallback_model", model,
+                        time.monotonic() - started, queue_wait, first_token, chunk
+                    )
+                return
+
+            else:
+                record_chat_metrics("error", MODEL, time.monotonic() - started, queue_wait, first_token)
+                yield sse_event("error", {"detail": event[1]})
+                return
+
+        # Nessun modello ha risposto: risposta di cortesia
+        suggestions_task.cancel()
+        async for event in stream_busy_events(request, owner, conversation_id, history, started):
+            yield event
+
+    finally:
+        suggestions_task.cancel()
+        if events is not None:
+            # Lascia lo stream condiviso (e lo interrompe se nessun altro lo sta leggendo)
+            await events.aclose()
+        if ticket is not None:
+            # Se altre richieste leggono ancora lo stream, lo slot viene liberato al suo termine
+            generation_limiter.release(ticket)
+
+
+async def stream_cached_events(request: ChatRequest, owner: str, conversation_id: str, history: List[dict],
+                               reply: str, started: float):
+    """
+    Invia come eventi SSE una risposta servita dalla cache.
+
+    La risposta arriva in un unico evento token, seguito dall'evento done.
+
+    Yields:
+        str: Eventi SSE formattati
+    """
+    await store_turn(owner, conversation_id, history, request.message, reply)
+    yield sse_event("token", {"content": reply})
+    yield sse_event("done", {
+        "suggestions": await build_suggestions(request),
+        "provider": get_llm_provider().name,
+        "model": MODEL,
+        "usage": cached_usage(),
+        "conversation_id": conversation_id
+    })
+    record_chat_metrics("cache_hit", MODEL, time.monotonic() - started)
+
+
+async def stream_busy_events(request: ChatRequest, owner: str, conversation_id: str, history: List[dict],
+                             started: float):
+    """
+    Invia come eventi SSE la risposta di cortesia (nessun modello disponibile).
+
+    Yields:
+        str: Eventi SSE formattati
+    """
+    await store_turn(owner, conversation_id, history, request.message, BUSY_MESSAGE)
+    yield sse_event("token", {"content": BUSY_MESSAGE})
+    yield sse_event("done", {
+        "suggestions": await build_suggestions(request, semantic=False),
+        "provider": BUSY_PROVIDER,
+        "model": BUSY_MODEL,
+        "usage": busy_usage(),
+        "conversation_id": conversation_id
+    })
+    record_chat_metrics("busy", BUSY_MODEL, time.monotonic() - started)
+
+
+@router_LLM_chat.post("/ask/stream")
+async def ask_stream(request: ChatRequest, http_request: Request):
+    """
+    Variante in streaming di /ask basata su Server-Sent Events.
+
+    Invece di attendere la generazione completa, inoltra al client
+    ogni token appena prodotto da Ollama, riducendo il tempo di attesa
+    per il primo token a poche centinaia di millisecondi. I suggerimenti
+    di prenotazione e le statistiche di utilizzo arrivano nell'evento finale "done".
+
+    Args:
+        request: Oggetto ChatRequest contenente il messaggio e il contesto
+        http_request: Richiesta HTTP, usata per identificare l'utente in coda
+
+    Returns:
+        StreamingResponse: Flusso di eventi SSE (queue, token, done, error)
+
+    Raises:
+        HTTPException: 503 immediato se la coda delle generazioni è piena,
+                       409 se la cronologia non è stata inviata e il server non la conserva
+    """
+    started = time.monotonic()
+    owner = requester_key(http_request)
+    conversation_id, history = await resolve_history(
+        owner, request.conversation_id, request.message, message_history_dicts(request), request.history_length
+    )
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"     # Disabilita il buffering di eventuali proxy
     }
-    
-    # Conversione del messaggio in minuscolo per la ricerca case-insensitive
-    user_message_lower = user_message.lower()
-    print(f"🔍 Messaggio in minuscolo: '{user_message_lower}'")
-    
-    # Ricerca delle specializzazioni appropriate nel messaggio dell'utente
-    suggested_specializations = []
-    for keyword, specialization in specialization_map.items():
-        # Ricerca di parole intere per evitare falsi positivi
-        if f" {keyword} " in f" {user_message_lower} " or user_message_lower.startswith(keyword + " ") or user_message_lower.endswith(" " + keyword):
-            suggested_specializations.append(specialization)
-            print(f"🔍 Trovata keyword '{keyword}' -> {specialization}")
-    
-    # Rimozione dei duplicati per evitare suggerimenti ripetuti
-    suggested_specializations = list(set(suggested_specializations))
-    
-    # Generazione dei suggerimenti di prenotazione per le specializzazioni trovate
-    if suggested_specializations:
-        for spec in suggested_specializations[:2]:  # Massimo 2 specialisti per evitare confusione
-            suggestions.append({
-                "type": "BOOK_APPOINTMENT",
-                "specialization": spec,
-                "text": f"Prenota visita di {spec}"
-            })
-    
-    return suggestions
\ No newline at end of file
+
+    # Una risposta già in cache non occupa uno slot di generazione
+    cached, fingerprint = await lookup_cached_response(request, history)
+    if cached is not None:
+        return StreamingResponse(
+            stream_cached_events(request, owner, conversation_id, history, cached, started),
+            media_type="text/event-stream",
+            headers=headers
+        )
+
+    # Con tutti i circuiti aperti la risposta di cortesia è immediata, senza attendere in coda
+    if not model_chain(MODEL):
+        return StreamingResponse(
+            stream_busy_events(request, owner, conversation_id, history, started),
+            media_type="text/event-stream",
+            headers=headers
+        )
+
+    # Uno stream identico già in corso viene condiviso senza occupare uno slot
+    messages, history_stats = build_messages(request, history)
+    flight_key = payload_key(build_payload(messages, stream=True))
+    events = chat_flights.join_stream(flight_key)
+    ticket = admit_generation(http_request) if events is None else None
+    return StreamingResponse(
+        stream_chat_events(
+            request, owner, conversation_id, history, messages, history_stats, flight_key,
+            ticket, events, started, fingerprint
+        ),
+        media_type="text/event-stream",
+        # Restituisce il ticket anche se il client si disconnette prima dello stream
+        background=BackgroundTask(generation_limiter.release, ticket) if ticket is not None else None,
+        headers=headers
+    )
+
+
+@router_LLM_chat.get("/queue")
+async def get_queue_status():
+    """
+    Restituisce lo stato della coda delle generazioni AI.
+
+    Returns:
+        dict: Generazioni in corso, richieste in attesa e contatori cumulativi
+    """
+    return generation_limiter.stats()
+
+
+@router_LLM_chat.get("/conversations/stats")
+async def get_conversation_store_stats():
+    """
+    Restituisce lo stato dell'archivio delle conversazioni.
+
+    Returns:
+        dict: Conversazioni in memoria e contatori di hit/miss
+    """
+    return conversation_store.stats()
+
+
+@router_LLM_chat.get("/cache/stats")
+async def get_response_cache_stats():
+    """
+    Restituisce lo stato della cache delle risposte.
+
+    Returns:
+        dict: Risposte memorizzate, hit esatti e per similarità, miss e hit rate
+    """
+    return response_cache.stats()
+
+
+@router_LLM_chat.get("/router/stats")
+async def get_specialization_router_stats():
+    """
+    Restituisce lo stato dell'instradamento semantico delle specializzazioni.
+
+    Returns:
+        dict: Disponibilità degli embedding, cache dei messaggi e ricadute sulle parole chiave
+    """
+    return specialization_router.stats()
+
+
+@router_LLM_chat.get("/circuit/stats")
+async def get_circuit_breaker_stats():
+    """
+    Restituisce lo stato dei circuit breaker dei modelli.
+
+    Returns:
+        dict: Stato del circuito, quota di errori recente e rifiuti per ogni modello
+    """
+    return circuit_breaker_stats()
+
+
+@router_LLM_chat.get("/metrics")
+async def get_chat_metrics():
+    """
+    Restituisce le metriche raccolte sulle richieste alla chat.
+
+    Returns:
+        dict: Contatori per esito e modello, istogrammi di attese, durate,
+              token e token al secondo con i percentili p50/p95/p99
+    """
+    return llm_metrics.snapshot()
+
+
+@router_LLM_chat.get("/coalescing/stats")
+async def get_coalescing_stats():
+    """
+    Restituisce lo stato dell'unificazione delle richieste identiche.
+
+    Returns:
+        dict: Generazioni in corso e richieste servite da una generazione già avviata
+    """
+    return chat_flights.stats()
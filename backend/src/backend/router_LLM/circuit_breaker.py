@@ -0,0 +1,188 @@
+"""
+Circuit breaker per le chiamate ai modelli di Ollama.
+
+Quando Ollama è sovraccarico ogni nuova richiesta resta bloccata fino
+al timeout e peggiora la situazione. Per ogni modello questo modulo
+tiene traccia dell'esito delle ultime chiamate:
+- closed: le chiamate passano; se la quota di errori o di chiamate lente
+  supera la soglia, il circuito si apre
+- open: le chiamate vengono rifiutate subito (si passa al modello di
+  riserva o alla risposta di cortesia) per LLM_BREAKER_OPEN_SECONDS
+- half_open: passa una sola chiamata di prova; se riesce il circuito
+  si richiude, altrimenti si riapre
+"""
+
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+from backend.router_LLM.ollama_client import OLLAMA_CONNECT_TIMEOUT, OLLAMA_WRITE_TIMEOUT, OLLAMA_POOL_TIMEOUT
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("circuit_breaker")
+
+# Configurazione tramite variabili d'ambiente
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))                     # Chiamate recenti considerate
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))                # Chiamate minime prima di valutare la soglia
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))      # Quota di errori/lentezze che apre il circuito
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "60"))       # Oltre questa latenza la chiamata conta come errore
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))       # Durata dell'apertura prima della prova
+
+# Modelli di riserva, in ordine, usati quando il modello principale non risponde
+# (es. "llama3.2:1b"; stringa vuota = nessuna riserva, solo la risposta di cortesia)
+LLM_FALLBACK_MODELS = [model.strip() for model in os.getenv("LLM_FALLBACK_MODELS", "llama3.2:1b").split(",") if model.strip()]
+
+# Timeout di lettura di ogni tentativo: per le risposte senza streaming copre
+# l'intera generazione, per lo streaming l'attesa del primo token
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "120"))
+ATTEMPT_TIMEOUT = httpx.Timeout(
+    connect=OLLAMA_CONNECT_TIMEOUT, read=LLM_ATTEMPT_TIMEOUT, write=OLLAMA_WRITE_TIMEOUT, pool=OLLAMA_POOL_TIMEOUT
+)
+
+# Risposta di cortesia quando nessun modello è disponibile
+BUSY_MESSAGE = (
+    "Al momento l'assistente AI è sovraccarico e non riesce a rispondere. "
+    "Riprova tra qualche minuto. Se i sintomi sono gravi o improvvisi chiama "
+    "il 112 o rivolgiti al pronto soccorso; intanto puoi prenotare una visita "
+    "con uno degli specialisti suggeriti."
+)
+
+
+class CircuitBreaker:
+    """
+    Stato del circuito di un singolo modello, basato su una finestra
+    scorrevole degli esiti delle ultime chiamate.
+    """
+
+    def __init__(self, name: str, window: int, min_calls: int, failure_rate: float,
+                 slow_seconds: float, open_seconds: float):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+
+        self._outcomes = deque(maxlen=window)   # True = chiamata fallita o lenta
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+        # Contatori per le statistiche
+        self._rejected = 0
+        self._opened = 0
+
+    @property
+    def state(self) -> str:
+        """Stato corrente; un circuito aperto da abbastanza tempo diventa half_open."""
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = "half_open"
+            self._probe_started = None
+        return self._state
+
+    def available(self) -> bool:
+        """True se una chiamata verrebbe ammessa (senza occupare la prova)."""
+        state = self.state
+        if state == "half_open":
+            return self._probe_started is None or time.monotonic() - self._probe_started >= self.open_seconds
+        return state == "closed"
+
+    def allow(self) -> bool:
+        """
+        Ammette o rifiuta una chiamata.
+
+        Returns:
+            bool: True se la chiamata può procedere; in half_open la prima
+                  chiamata ammessa diventa la prova
+        """
+        if not self.available():
+            self._rejected += 1
+            return False
+        if self._state == "half_open":
+            self._probe_started = time.monotonic()
+        return True
+
+    def _open(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+        self._opened += 1
+        logger.warning("⚠️  Circuito aperto per il modello %s: chiamate sospese per %.0fs", self.name, self.open_seconds)
+
+    def record_success(self, duration: float):
+        """
+        Registra una chiamata completata.
+
+        Args:
+            duration: Latenza della chiamata in secondi (oltre slow_seconds conta come errore)
+        """
+        if duration > self.slow_seconds:
+            self.record_failure()
+            return
+        if self._state == "half_open":
+            # Prova riuscita: si riparte da una finestra pulita
+            self._outcomes.clear()
+            self._state = "closed"
+            logger.info("✅ Circuito richiuso per il modello %s", self.name)
+        self._outcomes.append(False)
+
+    def record_failure(self):
+        """Registra una chiamata fallita (errore, timeout o latenza eccessiva)."""
+        if self._state == "half_open":
+            self._open()
+            return
+        self._outcomes.append(True)
+        if (self._state == "closed" and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+            self._open()
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente del circuito.
+
+        Returns:
+            dict: Stato, quota di errori recente e contatori
+        """
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "recent_calls": calls,
+            "recent_failure_rate": round(sum(self._outcomes) / calls, 4) if calls else 0.0,
+            "rejected": self._rejected,
+            "times_opened": self._opened
+        }
+
+
+# Un circuito per ogni modello, creato al primo utilizzo
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Restituisce il circuito del modello, creandolo se necessario."""
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(
+            model, LLM_BREAKER_WINDOW, LLM_BREAKER_MIN_CALLS, LLM_BREAKER_FAILURE_RATE,
+            LLM_BREAKER_SLOW_SECONDS, LLM_BREAKER_OPEN_SECONDS
+        )
+    return breaker
+
+
+def model_chain(primary: str) -> List[str]:
+    """
+    Restituisce i modelli da provare, in ordine, con il circuito disponibile.
+
+    Args:
+        primary: Modello principale della chat
+
+    Returns:
+        list: Modello principale seguito dalle riserve; vuota se tutti i circuiti sono aperti
+    """
+    return [model for model in [primary, *LLM_FALLBACK_MODELS] if get_circuit_breaker(model).available()]
+
+
+def circuit_breaker_stats() -> dict:
+    """Stato dei circuiti di tutti i modelli usati finora."""
+    return {model: breaker.stats() for model, breaker in _breakers.items()}
@@ -0,0 +1,270 @@
+"""
+Unificazione delle generazioni identiche in corso (single-flight).
+
+Un doppio clic su "invia" o un nuovo tentativo del frontend producono
+richieste con lo stesso prompt mentre la prima è ancora in generazione.
+Invece di generare più volte la stessa risposta, le richieste con la
+stessa chiave (impronta del payload inviato a Ollama) condividono:
+- Il risultato di un'unica chiamata, per le risposte complete
+- Un unico stream, per le risposte in streaming: chi arriva dopo riceve
+  prima i token già generati e poi quelli nuovi
+
+La generazione prosegue finché almeno una richiesta la sta attendendo.
+"""
+
+import json
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def payload_key(payload: dict) -> str:
+    """
+    Calcola la chiave di unificazione di un payload per Ollama.
+
+    Args:
+        payload: Payload con modello, messaggi e opzioni (vedi build_payload)
+
+    Returns:
+        str: Impronta SHA-256 del payload serializzato in modo canonico
+    """
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class SharedStream:
+    """
+    Stream prodotto una sola volta e letto da più richieste.
+
+    Gli elementi prodotti vengono conservati finché lo stream è in corso,
+    così chi si aggiunge in ritardo li riceve tutti dall'inizio.
+    """
+
+    def __init__(self, source: AsyncIterator):
+        self._items = []
+        self._finished = False
+        self._error = None
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self.task = asyncio.create_task(self._produce(source))
+
+    async def _produce(self, source: AsyncIterator):
+        """Legge lo stream di origine e notifica ogni nuovo elemento."""
+        try:
+            async for item in source:
+                async with self._changed:
+                    self._items.append(item)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            async with self._changed:
+                self._finished = True
+                self._changed.notify_all()
+
+    @property
+    def done(self) -> bool:
+        return self.task.done()
+
+    def subscribe(self) -> "Subscription":
+        """
+        Iscrive una richiesta allo stream.
+
+        L'iscrizione vale da subito, anche prima della lettura: se l'ultima
+        richiesta iscritta si disconnette, la generazione viene interrotta.
+
+        Returns:
+            Subscription: Iteratore di tutti gli elementi dello stream, dal primo
+        """
+        self._subscribers += 1
+        return Subscription(self)
+
+    def unsubscribe(self):
+        """Rimuove un iscritto; senza iscritti la generazione viene interrotta."""
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self.task.done():
+            self.task.cancel()
+
+    async def read(self) -> AsyncIterator:
+        """
+        Restituisce gli elementi dello stream dal primo, attendendo quelli nuovi.
+
+        Raises:
+            Exception: L'errore sollevato dallo stream di origine
+        """
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self._items) or self._finished)
+                items = self._items[index:]
+                finished = self._finished
+            for item in items:
+                yield item
+            index += len(items)
+            if finished and index == len(self._items):
+                if self._error is not None:
+                    raise self._error
+                return
+
+
+class Subscription:
+    """
+    Lettura di uno stream condiviso da parte di una singola richiesta.
+
+    Va chiusa con aclose() (anche se non è mai stata letta) per
+    liberare l'iscrizione.
+    """
+
+    def __init__(self, stream: SharedStream):
+        self._stream = stream
+        self._items = stream.read()
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._items.__anext__()
+
+    async def aclose(self):
+        """Chiude la lettura e libera l'iscrizione una sola volta."""
+        if not self._closed:
+            self._closed = True
+            await self._items.aclose()
+            self._stream.unsubscribe()
+
+
+class SingleFlight:
+    """
+    Registro delle generazioni in corso, indicizzate per chiave.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}   # Richieste in attesa di ogni chiamata
+        self._streams: Dict[str, SharedStream] = {}
+
+        # Contatori per le statistiche
+        self._leaders = 0
+        self._followers = 0
+
+    def in_flight(self, key: str) -> bool:
+        """True se una generazione con la stessa chiave è già in corso."""
+        task = self._calls.get(key)
+        stream = self._streams.get(key)
+        return (task is not None and not task.done()) or (stream is not None and not stream.done)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]],
+                  on_start: Optional[Callable[[asyncio.Future], None]] = None) -> Tuple[Any, bool]:
+        """
+        Esegue la chiamata, oppure attende quella identica già in corso.
+
+        La chiamata gira in un task separato: se la richiesta che l'ha
+        avviata viene annullata, le altre ricevono comunque il risultato.
+        Quando tutte le richieste in attesa vengono annullate (client
+        disconnessi), anche la chiamata viene interrotta.
+
+        Args:
+            key: Chiave di unificazione (vedi payload_key)
+            call: Funzione che avvia la chiamata
+            on_start: Chiamata con il task della generazione, solo se viene avviata
+                      da questa richiesta (es. per legarle lo slot di generazione)
+
+        Returns:
+            tuple: (risultato, True se condiviso con una chiamata già in corso)
+        """
+        task = self._calls.get(key)
+        shared = task is not None and not task.done()
+        if shared:
+            self._followers += 1
+        else:
+            self._leaders += 1
+            task = asyncio.create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda finished: self._forget(self._calls, key, finished))
+            if on_start is not None:
+                on_start(task)
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if self._waiters[task] == 0:
+                del self._waiters[task]
+                if not task.done():
+                    # Nessuno attende più il risultato: le nuove richieste avviano una nuova chiamata
+                    if self._calls.get(key) is task:
+                        del self._calls[key]
+                    task.cancel()
+
+    def join_stream(self, key: str) -> Optional[Subscription]:
+        """
+        Si iscrive allo stream identico già in corso, se presente.
+
+        L'iscrizione conserva il riferimento allo stream: gli elementi
+        restano disponibili anche se lo stream termina prima della lettura.
+
+        Args:
+            key: Chiave di unificazione (vedi payload_key)
+
+        Returns:
+            Subscription: Elementi dello stream dal primo, None se non c'è uno stream in corso
+        """
+        stream = self._streams.get(key)
+        if stream is None or stream.done:
+            return None
+        self._followers += 1
+        return stream.subscribe()
+
+    def stream(self, key: str, source: Callable[[], AsyncIterator],
+               on_start: Optional[Callable[[asyncio.Future], None]] = None) -> Tuple[Subscription, bool]:
+        """
+        Si iscrive allo stream identico già in corso, oppure ne avvia uno nuovo.
+
+        Args:
+            key: Chiave di unificazione (vedi payload_key)
+            source: Funzione che crea lo stream di origine
+            on_start: Chiamata con il task dello stream, solo se viene avviato da questa richiesta
+
+        Returns:
+            tuple: (iteratore degli elementi dal primo, True se condiviso con uno stream già in corso)
+        """
+        stream = self._streams.get(key)
+        shared = stream is not None and not stream.done
+        if shared:
+            self._followers += 1
+        else:
+            self._leaders += 1
+            stream = SharedStream(source())
+            self._streams[key] = stream
+            stream.task.add_done_callback(lambda finished: self._forget(self._streams, key, finished))
+            if on_start is not None:
+                on_start(stream.task)
+        return stream.subscribe(), shared
+
+    @staticmethod
+    def _forget(registry: dict, key: str, task: asyncio.Task):
+        """Rimuove la generazione terminata dal registro."""
+        entry = registry.get(key)
+        if entry is task or getattr(entry, "task", None) is task:
+            del registry[key]
+        if not task.cancelled():
+            task.exception()   # Evita l'avviso "exception was never retrieved"
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente delle generazioni unificate.
+
+        Returns:
+            dict: Generazioni in corso e richieste che ne hanno condiviso una
+        """
+        return {
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "leaders": self._leaders,
+            "coalesced": self._followers
+        }
+
+
+# Registro condiviso dal processo
+chat_flights = SingleFlight()
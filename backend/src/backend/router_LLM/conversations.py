@@ -0,0 +1,210 @@
+"""
+Archivio lato server delle conversazioni con l'assistente AI.
+
+Senza archivio il client deve reinviare a ogni turno l'intera cronologia,
+con richieste sempre più grandi da trasferire e da validare. Questo modulo
+mantiene la cronologia di ogni conversazione sul server:
+- Cache in memoria LRU con scadenza per inattività (TTL)
+- Persistenza opzionale nella tabella chat_conversation di PostgreSQL
+- Conversazioni separate per utente (gli id sono generati dal client)
+
+Il client può quindi inviare solo il nuovo messaggio e il conversation_id;
+se invia comunque la cronologia, questa ha la precedenza e aggiorna l'archivio.
+"""
+
+import os
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from backend.connection import execute_query_async
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("conversations")
+
+# Configurazione tramite variabili d'ambiente
+LLM_CONVERSATION_TTL = float(os.getenv("LLM_CONVERSATION_TTL", "3600"))               # Secondi di inattività prima della scadenza
+LLM_CONVERSATION_MAX = int(os.getenv("LLM_CONVERSATION_MAX", "1000"))                 # Conversazioni mantenute in memoria
+LLM_CONVERSATION_MAX_MESSAGES = int(os.getenv("LLM_CONVERSATION_MAX_MESSAGES", "200"))  # Messaggi conservati per conversazione
+LLM_CONVERSATION_PERSIST = os.getenv("LLM_CONVERSATION_PERSIST", "false").lower() == "true"  # Salvataggio su PostgreSQL
+
+
+class ConversationStore:
+    """
+    Cache LRU con TTL delle cronologie, con persistenza opzionale su PostgreSQL.
+
+    Le chiavi sono coppie (utente, conversation_id): gli id generati dal
+    frontend non sono univoci tra utenti diversi.
+    """
+
+    def __init__(self, max_conversations: int, ttl: float, max_messages: int, persist: bool):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.persist = persist
+
+        self._entries = OrderedDict()   # (utente, id) -> (scadenza, messaggi)
+
+        # Contatori per le statistiche
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    def _get_cached(self, key: Tuple[str, str]) -> Optional[List[dict]]:
+        """Restituisce la cronologia in memoria se presente e non scaduta."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, messages = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return messages
+
+    def _put_cached(self, key: Tuple[str, str], messages: List[dict]):
+        """Salva la cronologia in memoria, eliminando le conversazioni meno recenti."""
+        self._entries[key] = (time.monotonic() + self.ttl, messages)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+            self._evicted += 1
+
+    async def get(self, owner: str, conversation_id: str) -> Optional[List[dict]]:
+        """
+        Recupera la cronologia di una conversazione.
+
+        Args:
+            owner: Chiave dell'utente proprietario
+            conversation_id: Identificativo della conversazione
+
+        Returns:
+            list: Messaggi ({"role", "content"}) oppure None se la conversazione non è nota
+        """
+        key = (owner, conversation_id)
+        messages = self._get_cached(key)
+        if messages is None and self.persist:
+            try:
+                rows = await execute_query_async("""
+                    SELECT messages FROM chat_conversation
+                    WHERE owner = %s AND conversation_id = %s
+                      AND updated_at > NOW() - make_interval(secs => %s)
+                """, (owner, conversation_id, self.ttl))
+            except Exception as e:
+                logger.warning("⚠️  Impossibile leggere la conversazione dal database: %s", e)
+                rows = None
+            if rows:
+                messages = rows[0][0]
+                self._put_cached(key, messages)
+        if messages is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return messages
+
+    async def save(self, owner: str, conversation_id: str, messages: List[dict]):
+        """
+        Salva la cronologia aggiornata di una conversazione.
+
+        Args:
+            owner: Chiave dell'utente proprietario
+            conversation_id: Identificativo della conversazione
+            messages: Cronologia completa, inclusa l'ultima risposta
+        """
+        messages = messages[-self.max_messages:]
+        self._put_cached((owner, conversation_id), messages)
+        if self.persist:
+            # Un errore del database non deve far perdere la risposta già generata
+            try:
+                await execute_query_async("""
+                    INSERT INTO chat_conversation (owner, conversation_id, messages, updated_at)
+                    VALUES (%s, %s, %s, NOW())
+                    ON CONFLICT (owner, conversation_id)
+                    DO UPDATE SET messages = EXCLUDED.messages, updated_at = NOW()
+                """, (owner, conversation_id, json.dumps(messages, ensure_ascii=False)), commit=True)
+            except Exception as e:
+                logger.warning("⚠️  Impossibile salvare la conversazione nel database: %s", e)
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente dell'archivio.
+
+        Returns:
+            dict: Conversazioni in memoria, configurazione e contatori cumulativi
+        """
+        return {
+            "conversations": len(self._entries),
+            "max_conversations": self.max_conversations,
+            "persist": self.persist,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evicted": self._evicted
+        }
+
+
+# Archivio condiviso dal processo
+conversation_store = ConversationStore(
+    LLM_CONVERSATION_MAX, LLM_CONVERSATION_TTL, LLM_CONVERSATION_MAX_MESSAGES, LLM_CONVERSATION_PERSIST
+)
+
+
+async def resolve_history(owner: str, conversation_id: Optional[str], message: str,
+                          message_history: List[dict], history_length: Optional[int]) -> Tuple[str, List[dict]]:
+    """
+    Determina la cronologia da usare per il turno corrente.
+
+    Se il client invia la cronologia viene usata quella; altrimenti
+    viene ricostruita dall'archivio a partire dal conversation_id.
+
+    Args:
+        owner: Chiave dell'utente proprietario
+        conversation_id: Identificativo della conversazione (generato se assente)
+        message: Messaggio corrente dell'utente
+        message_history: Cronologia inviata dal client (eventualmente vuota)
+        history_length: Numero di messaggi precedenti noti al client, se dichiarato
+
+    Returns:
+        tuple: (conversation_id, cronologia senza il messaggio corrente)
+
+    Raises:
+        HTTPException: 409 se il client non invia la cronologia e il server
+                       non ne conserva una copia completa (es. dopo un riavvio)
+    """
+    if not conversation_id:
+        conversation_id = uuid.uuid4().hex
+
+    if message_history:
+        history = message_history
+    else:
+        history = await conversation_store.get(owner, conversation_id) or []
+        if history_length and len(history) < min(history_length, LLM_CONVERSATION_MAX_MESSAGES):
+            raise HTTPException(
+                status_code=409,
+                detail="Cronologia della conversazione non disponibile sul server, reinviarla"
+            )
+
+    # Il frontend include anche il messaggio corrente in coda alla cronologia
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+        history = history[:-1]
+    return conversation_id, history
+
+
+async def store_turn(owner: str, conversation_id: str, history: List[dict], message: str, reply: str):
+    """
+    Aggiunge all'archivio il turno appena completato (domanda e risposta).
+
+    Args:
+        owner: Chiave dell'utente proprietario
+        conversation_id: Identificativo della conversazione
+        history: Cronologia restituita da resolve_history
+        message: Messaggio dell'utente
+        reply: Risposta generata dall'assistente
+    """
+    await conversation_store.save(owner, conversation_id, history + [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply}
+    ])
@@ -0,0 +1,51 @@
+"""
+Calcolo degli embedding tramite il fornitore del modello (/api/embed di Ollama).
+
+Gli embedding sono vettori numerici che rappresentano il significato
+di un testo: testi simili producono vettori vicini. Sono usati per
+riconoscere domande equivalenti formulate con parole diverse.
+"""
+
+import os
+from typing import List
+
+import numpy as np
+
+from backend.router_LLM.providers import get_llm_provider
+
+# Modello di embedding (deve essere disponibile in Ollama, es. "ollama pull nomic-embed-text")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Calcola gli embedding di una lista di testi con una sola richiesta.
+
+    Args:
+        texts: Testi da trasformare in vettori
+
+    Returns:
+        list: Un vettore per ogni testo, nello stesso ordine
+
+    Raises:
+        httpx.HTTPError: Se Ollama non è raggiungibile o il modello non è disponibile
+    """
+    return await get_llm_provider().embed(OLLAMA_EMBED_MODEL, texts)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Converte gli embedding in float32 e normalizza ogni riga.
+
+    Con vettori normalizzati il prodotto scalare è la similarità coseno:
+    il confronto con molti vettori diventa un unico prodotto matrice-vettore.
+
+    Args:
+        vectors: Un vettore o una lista di vettori
+
+    Returns:
+        np.ndarray: Vettori di norma 1 (i vettori nulli restano nulli)
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
@@ -0,0 +1,132 @@
+"""
+Gestione della cronologia della conversazione entro un budget di token.
+
+Il client invia a ogni turno l'intera cronologia; inoltrarla così com'è
+fa crescere linearmente il tempo di valutazione del prompt e, nelle
+conversazioni lunghe, supera la finestra di contesto del modello.
+
+Questo modulo fornisce:
+- Una stima rapida del numero di token di un testo
+- La selezione dei turni più recenti che rientrano nel budget
+- Un riepilogo compatto dei messaggi più vecchi scritti dal paziente
+- Le statistiche sul risparmio ottenuto, riportate in usage
+"""
+
+import os
+from typing import List, Tuple
+
+# Configurazione tramite variabili d'ambiente
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "3000"))    # Token massimi del prompt (sistema + cronologia + messaggio)
+LLM_HISTORY_SUMMARY_TOKENS = int(os.getenv("LLM_HISTORY_SUMMARY_TOKENS", "200"))  # Token riservati al riepilogo dei turni esclusi
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3.5"))          # Caratteri medi per token (testo italiano)
+LLM_HISTORY_DROP_STEP = int(os.getenv("LLM_HISTORY_DROP_STEP", "6"))           # Messaggi esclusi a blocchi, per un prefisso stabile
+
+# Overhead fisso per messaggio (ruolo e delimitatori del template di chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Stima il numero di token di un testo senza tokenizzarlo.
+
+    Args:
+        text: Testo da valutare
+
+    Returns:
+        int: Numero stimato di token
+    """
+    return int(len(text) / LLM_CHARS_PER_TOKEN) + 1
+
+
+def message_tokens(message: dict) -> int:
+    """Stima i token di un messaggio di chat, incluso l'overhead del template."""
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _summarize(dropped: List[dict], budget: int) -> str:
+    """
+    Riassume i turni esclusi mantenendo quanto scritto dal paziente.
+
+    Le risposte dell'assistente vengono omesse: sono ricostruibili dal
+    modello, mentre sintomi e informazioni del paziente vanno ricordati.
+    I messaggi più recenti hanno la precedenza se il budget non basta.
+    """
+    header = "RIEPILOGO DELLA CONVERSAZIONE PRECEDENTE (il paziente aveva scritto):"
+    remaining = budget - estimate_tokens(header)
+    lines = []
+    for message in reversed(dropped):
+        if message["role"] != "user":
+            continue
+        line = f"- {message['content'].strip()}"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            # Tronca l'ultimo messaggio che rientra parzialmente
+            max_chars = int(remaining * LLM_CHARS_PER_TOKEN) - 4
+            if max_chars > 20:
+                lines.append(line[:max_chars] + "...")
+            break
+        lines.append(line)
+        remaining -= cost
+    if not lines:
+        return ""
+    return header + "\n" + "\n".join(reversed(lines))
+
+
+def compact_history(system_prompt: str, history: List[dict], current_message: str,
+                    budget: int = LLM_PROMPT_TOKEN_BUDGET) -> Tuple[List[dict], dict]:
+    """
+    Costruisce i messaggi da inviare al modello rispettando il budget di token.
+
+    Il prompt di sistema e il messaggio corrente sono sempre inclusi; dalla
+    cronologia vengono tenuti i turni più recenti che rientrano nel budget,
+    mentre quelli più vecchi sono sostituiti da un breve riepilogo.
+
+    Args:
+        system_prompt: Prompt di sistema (già arricchito con il profilo del paziente)
+        history: Cronologia dei messaggi precedenti ({"role", "content"}), senza il
+                 messaggio corrente (già rimosso da resolve_history)
+        current_message: Messaggio corrente dell'utente
+        budget: Token massimi stimati per l'intero prompt
+
+    Returns:
+        tuple: (messaggi per Ollama, statistiche di compattazione)
+    """
+    system = {"role": "system", "content": system_prompt}
+    current = {"role": "user", "content": current_message}
+    original_tokens = message_tokens(system) + message_tokens(current) + sum(message_tokens(m) for m in history)
+
+    available = budget - message_tokens(system) - message_tokens(current)
+    kept = []
+    if original_tokens > budget:
+        # Riserva spazio per il riepilogo dei turni che verranno esclusi
+        available -= LLM_HISTORY_SUMMARY_TOKENS
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if cost > available:
+            break
+        kept.append(message)
+        available -= cost
+    kept.reverse()
+
+    # I turni vengono esclusi a blocchi: il punto di taglio (e quindi il
+    # riepilogo) resta uguale per più turni e Ollama può riutilizzare il prefisso
+    dropped_count = len(history) - len(kept)
+    if dropped_count:
+        step = max(LLM_HISTORY_DROP_STEP, 1)
+        dropped_count = min(-(-dropped_count // step) * step, len(history))
+        kept = history[dropped_count:]
+
+    dropped = history[:dropped_count]
+    if dropped:
+        summary = _summarize(dropped, LLM_HISTORY_SUMMARY_TOKENS)
+        if summary:
+            system = {"role": "system", "content": f"{system_prompt}\n\n{summary}"}
+
+    messages = [system] + kept + [current]
+    prompt_tokens = sum(message_tokens(m) for m in messages)
+    stats = {
+        "history_messages_dropped": len(dropped),
+        "estimated_prompt_tokens": prompt_tokens,
+        "estimated_prompt_tokens_saved": max(original_tokens - prompt_tokens, 0)
+    }
+    return messages, stats
@@ -0,0 +1,97 @@
+"""
+Test di carico della pipeline della chat con il fornitore fittizio.
+
+Invia richieste contemporanee agli endpoint /llm/chat/ask e
+/llm/chat/ask/stream dell'applicazione, eseguita nello stesso processo,
+e riporta latenze, esiti e metriche raccolte. Con LLM_PROVIDER=fake non
+serve un modello in esecuzione:
+
+    LLM_PROVIDER=fake LLM_FAKE_PARALLEL=2 python -m backend.router_LLM.load_test --requests 200 --concurrency 50
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+# Senza un modello reale il preriscaldamento e gli embedding all'avvio non servono
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_WARMUP", "false")
+
+import httpx
+from jose import jwt
+
+from backend.backend import app
+from backend.router_profile.cookies_login import SECRET_KEY, ALGORITHM
+from backend.router_LLM.metrics import llm_metrics
+
+# Messaggi di prova, con ripetizioni per esercitare cache e unificazione delle richieste
+SAMPLE_MESSAGES = (
+    "Ho mal di testa da tre giorni, cosa posso fare?",
+    "Ho la tosse e un po' di febbre",
+    "Mi fa male il ginocchio quando salgo le scale",
+    "Qual è la pressione normale?",
+    "Ho delle macchie rosse sulla pelle che prudono",
+)
+
+
+async def run_load_test(total: int, concurrency: int, stream: bool) -> dict:
+    """
+    Esegue il test di carico.
+
+    Args:
+        total: Numero complessivo di richieste
+        concurrency: Richieste contemporanee
+        stream: Se True usa /ask/stream, altrimenti /ask
+
+    Returns:
+        dict: Latenze (secondi), esiti per codice di stato e metriche della chat
+    """
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test",
+                                 timeout=None) as client:
+        async def one(index: int):
+            body = {"message": f"{SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)]} ({index // 10})"}
+            # Ogni richiesta simula un utente diverso, per non superare il limite di coda per utente
+            token = jwt.encode({"id": index + 1}, SECRET_KEY, algorithm=ALGORITHM)
+            headers = {"Cookie": f"access_token={token}"}
+            async with semaphore:
+                started = time.perf_counter()
+                if stream:
+                    async with client.stream("POST", "/llm/chat/ask/stream", json=body, headers=headers) as response:
+                        async for _ in response.aiter_lines():
+                            pass
+                else:
+                    response = await client.post("/llm/chat/ask", json=body, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "latency_max": round(latencies[-1], 3),
+        "status_codes": statuses,
+        "chat_metrics": llm_metrics.snapshot()["counters"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test di carico della chat AI")
+    parser.add_argument("--requests", type=int, default=100, help="Numero complessivo di richieste")
+    parser.add_argument("--concurrency", type=int, default=20, help="Richieste contemporanee")
+    parser.add_argument("--stream", action="store_true", help="Usa l'endpoint in streaming")
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(run_load_test(args.requests, args.concurrency, args.stream)).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,169 @@
+"""
+Log del router della chat AI.
+
+Le stampe di debug su stdout a ogni richiesta sono sincrone e rallentano
+il percorso della chat; inoltre riportano messaggi e profilo sanitario
+dei pazienti. Questo modulo configura un logger dedicato con:
+- Livelli (LLM_LOG_LEVEL): i dettagli di ogni richiesta sono a livello
+  DEBUG, quindi esclusi per impostazione predefinita; in produzione il
+  livello predefinito è WARNING
+- Formattazione differita: gli argomenti vengono formattati solo se il
+  record viene davvero scritto
+- Campionamento (LLM_LOG_SAMPLE_RATE) dei dettagli per richiesta
+- Contenuti oscurati: testi dei messaggi e dati del profilo compaiono
+  solo con LLM_LOG_CONTENT=true, altrimenti se ne riporta la lunghezza
+- Formato testuale o JSON (LLM_LOG_FORMAT) per la raccolta strutturata
+"""
+
+import os
+import sys
+import json
+import random
+import logging
+from typing import Optional
+
+# Configurazione tramite variabili d'ambiente
+_DEFAULT_LEVEL = "WARNING" if os.getenv("ENVIRONMENT", "development") == "production" else "INFO"
+LLM_LOG_LEVEL = os.getenv("LLM_LOG_LEVEL", _DEFAULT_LEVEL).upper()              # DEBUG, INFO, WARNING, ERROR
+LLM_LOG_SAMPLE_RATE = float(os.getenv("LLM_LOG_SAMPLE_RATE", "1"))              # Quota di richieste con log di dettaglio
+LLM_LOG_CONTENT = os.getenv("LLM_LOG_CONTENT", "false").lower() == "true"       # Testi dei messaggi nei log (dati sanitari)
+LLM_LOG_CONTENT_CHARS = int(os.getenv("LLM_LOG_CONTENT_CHARS", "100"))          # Caratteri riportati per messaggio
+LLM_LOG_FORMAT = os.getenv("LLM_LOG_FORMAT", "text").lower()                    # "text" oppure "json"
+
+# Attributi standard dei record, esclusi dai campi aggiuntivi in JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Scrive ogni record come un oggetto JSON su una riga, con i campi passati in extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class Redacted:
+    """
+    Testo da riportare nei log solo se LLM_LOG_CONTENT è attivo.
+
+    La conversione in stringa avviene solo alla scrittura del record,
+    quindi non costa nulla se il livello di log lo esclude.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: Optional[object]):
+        self.text = text
+
+    def __str__(self) -> str:
+        if self.text is None:
+            return "-"
+        text = str(self.text)
+        if not LLM_LOG_CONTENT:
+            return f"<{len(text)} caratteri>"
+        if len(text) > LLM_LOG_CONTENT_CHARS:
+            return text[:LLM_LOG_CONTENT_CHARS] + "..."
+        return text
+
+
+def _configure() -> logging.Logger:
+    """Crea il logger del router con il proprio handler su stderr."""
+    base = logging.getLogger("backend.router_LLM")
+    base.setLevel(LLM_LOG_LEVEL)
+    if not base.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        if LLM_LOG_FORMAT == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        base.addHandler(handler)
+    # Evita che i record vengano scritti una seconda volta dal logger radice
+    base.propagate = False
+    return base
+
+
+_base_logger = _configure()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Restituisce il logger di un modulo del router.
+
+    Args:
+        name: Nome del modulo (es. "chat")
+
+    Returns:
+        logging.Logger: Logger figlio di "backend.router_LLM"
+    """
+    return _base_logger.getChild(name)
+
+
+def sample_details(logger: logging.Logger) -> bool:
+    """
+    Decide se scrivere i log di dettaglio (DEBUG) di una richiesta.
+
+    Args:
+        logger: Logger del modulo chiamante
+
+    Returns:
+        bool: True se il livello DEBUG è attivo e la richiesta rientra nel campione
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return LLM_LOG_SAMPLE_RATE >= 1 or random.random() < LLM_LOG_SAMPLE_RATE
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m backend.router_LLM.logs
+    # Confronta il costo per richiesta delle vecchie stampe di debug con il logger
+    import io
+    import timeit
+    import tempfile
+
+    messages = [{"role": "system", "content": "Sei un assistente sanitario. " * 40}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": "Ho mal di testa da tre giorni e un po' di febbre. " * 4}
+        for i in range(10)
+    ]
+    suggestions = [{"type": "BOOK_APPOINTMENT", "specialization": "Neurologia", "text": "Prenota visita di Neurologia"}]
+    logger = get_logger("benchmark")
+
+    def print_debug(stream):
+        # Stampe presenti in precedenza in chat.build_messages e generate_chat_response
+        print("🔍 Messaggi inviati all'AI per conversazione abc:", file=stream)
+        for i, msg in enumerate(messages):
+            print(f"  {i+1}. {msg['role']}: {msg['content'][:100]}...", file=stream)
+        print(f"🔍 Messaggio utente: '{messages[-1]['content']}'", file=stream)
+        print(f"🔍 Suggerimenti generati: {suggestions}", file=stream)
+
+    def logger_debug():
+        if sample_details(logger):
+            logger.debug("Messaggi inviati all'AI per conversazione %s: %d", "abc", len(messages))
+            for i, msg in enumerate(messages):
+                logger.debug("  %d. %s: %s", i + 1, msg["role"], Redacted(msg["content"]))
+            logger.debug("Suggerimenti generati: %s", [s["specialization"] for s in suggestions])
+
+    def run(label, function, runs=20000):
+        elapsed = timeit.timeit(function, number=runs)
+        print(f"{label:>42}: {elapsed / runs * 1e6:8.2f} µs/richiesta ({runs / elapsed:10.0f} richieste/s)")
+
+    with tempfile.TemporaryFile("w") as stdout_file:
+        run("print su file (stdout reindirizzato)", lambda: print_debug(stdout_file))
+    run("print in memoria", lambda: print_debug(io.StringIO()))
+
+    for level, rate in (("WARNING", 1.0), ("INFO", 1.0), ("DEBUG", 0.01), ("DEBUG", 1.0)):
+        _base_logger.setLevel(level)
+        LLM_LOG_SAMPLE_RATE = rate
+        with tempfile.TemporaryFile("w") as log_file:
+            stream = _base_logger.handlers[0].setStream(log_file)
+            run(f"logger {level}, campione {rate:g}", logger_debug)
+            _base_logger.handlers[0].setStream(stream)
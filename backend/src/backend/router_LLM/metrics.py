@@ -0,0 +1,176 @@
+"""
+Metriche delle richieste alla chat AI.
+
+Per dimensionare l'hardware di Ollama servono dati reali su attese e
+velocità di generazione. Questo modulo raccoglie, per ogni richiesta:
+- Attesa in coda, tempo al primo token e durata complessiva
+- Tempi di caricamento, valutazione del prompt e generazione riportati da Ollama
+- Token del prompt e della risposta, token al secondo
+- Esito (generata, modello di riserva, cache, servizio occupato, errore)
+
+I valori sono aggregati in istogrammi a bucket fissi in memoria:
+la registrazione costa pochi microsecondi e la memoria non cresce
+con il numero di richieste.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence
+
+# Bucket (limiti superiori) per durate in secondi, conteggi di token e velocità
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKENS_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """
+    Istogramma a bucket fissi con conteggio, somma, minimo e massimo.
+
+    I percentili sono stimati interpolando all'interno del bucket.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # L'ultimo raccoglie i valori oltre l'ultimo limite
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float):
+        """Registra un valore."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Stima il percentile richiesto.
+
+        Args:
+            q: Percentile tra 0 e 1 (es. 0.95)
+
+        Returns:
+            float: Valore stimato, None se non ci sono osservazioni
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else min(self.min, self.buckets[0])
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self) -> dict:
+        """Riepilogo dell'istogramma con percentili e conteggi cumulativi per bucket."""
+        if not self.count:
+            return {"count": 0}
+        cumulative, buckets = 0, {}
+        for limit, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            buckets[str(limit)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "avg": round(self.sum / self.count, 4),
+            "min": round(self.min, 4),
+            "max": round(self.max, 4),
+            "p50": round(self.quantile(0.5), 4),
+            "p95": round(self.quantile(0.95), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "buckets": buckets
+        }
+
+
+class MetricsRegistry:
+    """Raccolta di istogrammi e contatori identificati per nome."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._started_at = time.time()
+
+    def observe(self, name: str, value: Optional[float], buckets: Sequence[float] = SECONDS_BUCKETS):
+        """Registra un valore nell'istogramma (creato al primo utilizzo); None viene ignorato."""
+        if value is None:
+            return
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def increment(self, name: str, amount: int = 1):
+        """Incrementa un contatore."""
+        self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> dict:
+        """
+        Restituisce tutte le metriche raccolte.
+
+        Returns:
+            dict: Secondi di raccolta, contatori e riepilogo degli istogrammi
+        """
+        return {
+            "uptime_seconds": round(time.time() - self._started_at, 1),
+            "counters": dict(sorted(self._counters.items())),
+            "histograms": {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+        }
+
+
+# Metriche condivise dal processo
+llm_metrics = MetricsRegistry()
+
+
+def _seconds(nanoseconds: Optional[int]) -> Optional[float]:
+    """Converte in secondi le durate di Ollama (nanosecondi)."""
+    return nanoseconds / 1e9 if nanoseconds else None
+
+
+def record_chat_metrics(outcome: str, model: str, total_seconds: float, queue_wait: Optional[float] = None,
+                        first_token: Optional[float] = None, data: Optional[dict] = None):
+    """
+    Registra le metriche di una richiesta alla chat.
+
+    Args:
+        outcome: Esito (generated, fallback_model, cache_hit, busy, error)
+        model: Modello che ha prodotto la risposta
+        total_seconds: Durata complessiva dall'arrivo della richiesta
+        queue_wait: Attesa per uno slot di generazione (None se non ha atteso in coda)
+        first_token: Tempo al primo token inviato al client (solo streaming)
+        data: Risposta finale di Ollama con le statistiche di generazione
+    """
+    llm_metrics.increment(f"requests_{outcome}")
+    llm_metrics.increment(f"model_{model}")
+    llm_metrics.observe("total_duration_seconds", total_seconds)
+    llm_metrics.observe("queue_wait_seconds", queue_wait)
+    llm_metrics.observe("time_to_first_token_seconds", first_token)
+    if not data:
+        return
+
+    prompt_tokens = data.get("prompt_eval_count", 0)
+    completion_tokens = data.get("eval_count", 0)
+    prompt_eval = _seconds(data.get("prompt_eval_duration"))
+    generation = _seconds(data.get("eval_duration"))
+
+    llm_metrics.observe("load_seconds", _seconds(data.get("load_duration")))
+    llm_metrics.observe("prompt_eval_seconds", prompt_eval)
+    llm_metrics.observe("eval_seconds", generation)
+    llm_metrics.observe("prompt_tokens", prompt_tokens, TOKENS_BUCKETS)
+    llm_metrics.observe("completion_tokens", completion_tokens, TOKENS_BUCKETS)
+    if prompt_eval and prompt_tokens:
+        llm_metrics.observe("prompt_tokens_per_second", prompt_tokens / prompt_eval, RATE_BUCKETS)
+    if generation and completion_tokens:
+        llm_metrics.observe("completion_tokens_per_second", completion_tokens / generation, RATE_BUCKETS)
@@ -0,0 +1,107 @@
+"""
+Client HTTP condiviso per le comunicazioni con il servizio Ollama.
+
+Questo modulo fornisce un unico httpx.AsyncClient per l'intero processo:
+- Riutilizzo delle connessioni (keep-alive) tra richieste successive
+- Limiti sul numero di connessioni verso Ollama
+- Timeout distinti per connessione, lettura, scrittura e attesa del pool
+- Apertura e chiusura legate al ciclo di vita dell'applicazione
+
+Il client viene avviato e chiuso dal lifespan dell'app FastAPI
+(vedi backend.py) ed è usato dal fornitore Ollama (vedi providers.py).
+"""
+
+import os
+from typing import Optional
+
+import httpx
+
+# URL del servizio Ollama
+OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
+
+# Modello principale della chat (senza tag si usa ":latest", come fa Ollama)
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+if ":" not in OLLAMA_MODEL:
+    OLLAMA_MODEL = f"{OLLAMA_MODEL}:latest"
+
+# Limiti del pool di connessioni verso Ollama
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+
+# Timeout per fase (in secondi). Il timeout di lettura copre l'attesa
+# tra due blocchi di dati: per le richieste senza streaming corrisponde
+# all'intera generazione, quindi deve essere ampio ma non infinito.
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+OLLAMA_WRITE_TIMEOUT = float(os.getenv("OLLAMA_WRITE_TIMEOUT", "10"))
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "10"))
+
+# Permanenza del modello in memoria dopo l'ultima richiesta (es. "30m", "-1" = sempre)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit():
+    OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE)   # Ollama interpreta i numeri come secondi
+
+# Finestra di contesto del modello: deve contenere il budget del prompt
+# (LLM_PROMPT_TOKEN_BUDGET) più i token generati (num_predict)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# Timeout complessivo per le chiamate leggere (stato dei modelli)
+OLLAMA_STATUS_TIMEOUT = httpx.Timeout(5.0)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    """Crea il client configurato con limiti e timeout per fase."""
+    return httpx.AsyncClient(
+        base_url=OLLAMA_URL,
+        headers={"Content-Type": "application/json"},
+        limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            connect=OLLAMA_CONNECT_TIMEOUT,
+            read=OLLAMA_READ_TIMEOUT,
+            write=OLLAMA_WRITE_TIMEOUT,
+            pool=OLLAMA_POOL_TIMEOUT
+        )
+    )
+
+
+async def start_ollama_client():
+    """
+    Apre il client condiviso all'avvio dell'applicazione.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+
+
+async def close_ollama_client():
+    """
+    Chiude il client condiviso e le connessioni keep-alive allo spegnimento.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_ollama_client() -> httpx.AsyncClient:
+    """
+    Restituisce il client condiviso per Ollama.
+
+    Returns:
+        httpx.AsyncClient: Client con base_url già impostato su OLLAMA_URL
+
+    Note:
+        Se il lifespan dell'applicazione non è stato eseguito
+        (es. script o test), il client viene creato al primo utilizzo.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
@@ -0,0 +1,270 @@
+"""
+Fornitori del modello linguistico usati dalla chat.
+
+Tutto il percorso della chat (coda, circuit breaker, cache, streaming,
+metriche) dialoga con un fornitore tramite la stessa interfaccia, con
+richieste e risposte nel formato dell'API di Ollama. Il fornitore è
+scelto con LLM_PROVIDER:
+- "ollama": il servizio Ollama reale (predefinito)
+- "fake": un modello fittizio deterministico che simula latenza,
+  velocità di generazione, parallelismo ed errori, per i test di carico
+  dell'intera pipeline senza eseguire un modello
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from backend.router_LLM.ollama_client import get_ollama_client, OLLAMA_MODEL, OLLAMA_STATUS_TIMEOUT
+from backend.router_LLM.circuit_breaker import LLM_FALLBACK_MODELS
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("providers")
+
+# Fornitore del modello: "ollama" oppure "fake"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama").lower()
+
+# Parametri del fornitore fittizio
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.2"))             # Secondi fissi prima della valutazione del prompt
+LLM_FAKE_PROMPT_RATE = float(os.getenv("LLM_FAKE_PROMPT_RATE", "500"))     # Token del prompt valutati al secondo
+LLM_FAKE_TOKEN_RATE = float(os.getenv("LLM_FAKE_TOKEN_RATE", "20"))        # Token generati al secondo
+LLM_FAKE_MAX_TOKENS = int(os.getenv("LLM_FAKE_MAX_TOKENS", "60"))          # Lunghezza delle risposte (token)
+LLM_FAKE_PARALLEL = int(os.getenv("LLM_FAKE_PARALLEL", "1"))               # Generazioni servite in parallelo (come OLLAMA_NUM_PARALLEL)
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))         # Quota di richieste che falliscono
+LLM_FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", "42"))                      # Seme per errori riproducibili
+LLM_FAKE_EMBED_DIMENSIONS = 64
+
+
+class LLMProvider(ABC):
+    """
+    Interfaccia comune dei fornitori del modello.
+
+    Gli errori del servizio vengono sollevati come httpx.HTTPError,
+    così la gestione (circuit breaker, modelli di riserva) è la stessa
+    per tutti i fornitori. Un nuovo fornitore deve implementare tutti
+    i metodi astratti, altrimenti non può essere istanziato.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> dict:
+        """
+        Genera la risposta completa.
+
+        Args:
+            payload: Payload nel formato di /api/chat (vedi build_payload)
+            timeout: Timeout della singola richiesta
+
+        Returns:
+            dict: Risposta nel formato di /api/chat, con le statistiche di generazione
+        """
+
+    @abstractmethod
+    def stream_chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> AsyncIterator[dict]:
+        """
+        Genera la risposta in streaming.
+
+        Yields:
+            dict: Chunk nel formato di /api/chat; l'ultimo ha "done": True
+        """
+
+    @abstractmethod
+    async def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Calcola gli embedding dei testi, uno per testo nello stesso ordine."""
+
+    @abstractmethod
+    async def list_models(self) -> List[dict]:
+        """Modelli disponibili (formato di /api/tags: name, size)."""
+
+    @abstractmethod
+    async def running_models(self) -> List[dict]:
+        """Modelli caricati in memoria (formato di /api/ps: name, size, size_vram, expires_at)."""
+
+
+class OllamaProvider(LLMProvider):
+    """Fornitore basato sul servizio Ollama, tramite il client HTTP condiviso."""
+
+    name = "ollama"
+
+    async def chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> dict:
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        response = await get_ollama_client().post("/api/chat", json=payload, **kwargs)
+        if not response.is_success:
+            logger.error("❌ Errore Ollama API (%s): %s - %s", payload["model"], response.status_code, response.text)
+        response.raise_for_status()
+        return response.json()
+
+    async def stream_chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> AsyncIterator[dict]:
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        async with get_ollama_client().stream("POST", "/api/chat", json=payload, **kwargs) as response:
+            if not response.is_success:
+                error_text = (await response.aread()).decode(errors="replace")
+                logger.error("❌ Errore Ollama API (%s): %s - %s", payload["model"], response.status_code, error_text)
+            response.raise_for_status()
+
+            # Ollama invia un oggetto JSON per riga (NDJSON)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        response = await get_ollama_client().post("/api/embed", json={"model": model, "input": texts})
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    async def list_models(self) -> List[dict]:
+        response = await get_ollama_client().get("/api/tags", timeout=OLLAMA_STATUS_TIMEOUT)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+    async def running_models(self) -> List[dict]:
+        response = await get_ollama_client().get("/api/ps", timeout=OLLAMA_STATUS_TIMEOUT)
+        response.raise_for_status()
+        return response.json().get("models", [])
+
+
+# Vocabolario delle risposte fittizie
+FAKE_WORDS = (
+    "ti", "consiglio", "di", "bere", "molta", "acqua", "riposare", "e", "monitorare", "i", "sintomi",
+    "se", "il", "dolore", "persiste", "rivolgiti", "al", "tuo", "medico", "curante", "per", "una",
+    "visita", "specialistica", "evita", "sforzi", "nei", "prossimi", "giorni", "misura", "la", "febbre"
+)
+
+
+class FakeProvider(LLMProvider):
+    """
+    Modello fittizio deterministico per i test di carico.
+
+    La risposta dipende solo dal prompt; i tempi seguono i parametri
+    LLM_FAKE_* e le statistiche restituite hanno lo stesso formato di Ollama.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float, prompt_rate: float, token_rate: float, max_tokens: int,
+                 parallel: int, error_rate: float, seed: int):
+        self.latency = latency
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self._slots = asyncio.Semaphore(max(parallel, 1))
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _prompt_tokens(payload: dict) -> int:
+        """Stima dei token del prompt (circa 4 caratteri per token)."""
+        return sum(len(message.get("content", "")) for message in payload.get("messages", [])) // 4 + 1
+
+    def _reply_tokens(self, payload: dict) -> List[str]:
+        """Token della risposta, scelti in modo deterministico a partire dal prompt."""
+        digest = hashlib.sha256(json.dumps(payload.get("messages", []), sort_keys=True).encode()).digest()
+        rng = random.Random(digest)
+        limit = min(self.max_tokens, payload.get("options", {}).get("num_predict", self.max_tokens))
+        return [rng.choice(FAKE_WORDS) + " " for _ in range(max(limit, 1))]
+
+    def _check_failure(self, payload: dict):
+        """Simula un errore del servizio secondo LLM_FAKE_ERROR_RATE."""
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise httpx.ConnectError(f"Errore simulato dal fornitore fittizio ({payload['model']})")
+
+    async def _prefill(self, payload: dict, timeout: Optional[httpx.Timeout]) -> float:
+        """Attende la latenza iniziale e la valutazione del prompt; restituisce la durata in secondi."""
+        duration = self.latency + self._prompt_tokens(payload) / self.prompt_rate
+        read_timeout = timeout.read if timeout is not None else None
+        if read_timeout is not None and duration > read_timeout:
+            await asyncio.sleep(read_timeout)
+            raise httpx.ReadTimeout("Timeout simulato dal fornitore fittizio")
+        await asyncio.sleep(duration)
+        return duration
+
+    def _final_chunk(self, payload: dict, content: str, prefill: float, generated: int, started: float) -> dict:
+        """Ultimo chunk con le statistiche di generazione nel formato di Ollama (nanosecondi)."""
+        return {
+            "model": payload["model"],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": self._prompt_tokens(payload),
+            "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": generated,
+            "eval_duration": int(generated / self.token_rate * 1e9)
+        }
+
+    async def chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> dict:
+        started = time.monotonic()
+        async with self._slots:
+            self._check_failure(payload)
+            prefill = await self._prefill(payload, timeout)
+            tokens = self._reply_tokens(payload)
+            await asyncio.sleep(len(tokens) / self.token_rate)
+            return self._final_chunk(payload, "".join(tokens).strip(), prefill, len(tokens), started)
+
+    async def stream_chat(self, payload: dict, timeout: Optional[httpx.Timeout] = None) -> AsyncIterator[dict]:
+        started = time.monotonic()
+        async with self._slots:
+            self._check_failure(payload)
+            prefill = await self._prefill(payload, timeout)
+            tokens = self._reply_tokens(payload)
+            for token in tokens:
+                await asyncio.sleep(1 / self.token_rate)
+                yield {"model": payload["model"], "message": {"role": "assistant", "content": token}, "done": False}
+            yield self._final_chunk(payload, "", prefill, len(tokens), started)
+
+    async def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        # Vettori "bag of words": testi con parole in comune risultano simili
+        vectors = []
+        for text in texts:
+            vector = [0.0] * LLM_FAKE_EMBED_DIMENSIONS
+            for word in text.lower().split():
+                bucket = int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little")
+                vector[bucket % LLM_FAKE_EMBED_DIMENSIONS] += 1.0
+            vectors.append(vector)
+        return vectors
+
+    async def list_models(self) -> List[dict]:
+        return [{"name": model, "size": 0} for model in [OLLAMA_MODEL, *LLM_FALLBACK_MODELS]]
+
+    async def running_models(self) -> List[dict]:
+        return [{**model, "size_vram": 0, "expires_at": None} for model in await self.list_models()]
+
+
+def _create_provider() -> LLMProvider:
+    """Crea il fornitore indicato da LLM_PROVIDER."""
+    if LLM_PROVIDER == "fake":
+        logger.warning("⚠️  Fornitore del modello fittizio attivo (LLM_PROVIDER=fake): le risposte sono simulate")
+        return FakeProvider(
+            LLM_FAKE_LATENCY, LLM_FAKE_PROMPT_RATE, LLM_FAKE_TOKEN_RATE, LLM_FAKE_MAX_TOKENS,
+            LLM_FAKE_PARALLEL, LLM_FAKE_ERROR_RATE, LLM_FAKE_SEED
+        )
+    if LLM_PROVIDER != "ollama":
+        raise ValueError(f"LLM_PROVIDER non valido: {LLM_PROVIDER} (valori ammessi: ollama, fake)")
+    return OllamaProvider()
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """
+    Restituisce il fornitore del modello condiviso dal processo.
+
+    Returns:
+        LLMProvider: Fornitore scelto con LLM_PROVIDER, creato al primo utilizzo
+    """
+    global _provider
+    if _provider is None:
+        _provider = _create_provider()
+    return _provider
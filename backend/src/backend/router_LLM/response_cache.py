@@ -0,0 +1,258 @@
+"""
+Cache delle risposte per le domande di salute più frequenti.
+
+Molti pazienti pongono domande quasi identiche ("qual è la pressione
+normale?") e ognuna richiede una generazione completa del modello.
+Questo modulo, attivabile con LLM_RESPONSE_CACHE=true, fornisce:
+- Una chiave basata sul messaggio normalizzato e sulle parti rilevanti del profilo
+- La ricerca esatta e, opzionalmente, per similarità degli embedding
+- Scadenza delle risposte (TTL) ed eliminazione delle meno usate (LRU)
+- Statistiche di hit/miss
+
+La cache va usata solo per il primo messaggio di una conversazione:
+con una cronologia la risposta dipende dal contesto precedente.
+"""
+
+import os
+import re
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+import httpx
+import numpy as np
+
+from backend.router_LLM.embeddings import embed_texts, normalize_rows
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("response_cache")
+
+# Configurazione tramite variabili d'ambiente
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "false").lower() == "true"           # Attivazione della cache
+LLM_RESPONSE_CACHE_TTL = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "86400"))               # Validità di una risposta (secondi)
+LLM_RESPONSE_CACHE_MAX = int(os.getenv("LLM_RESPONSE_CACHE_MAX", "500"))                   # Risposte mantenute in memoria
+LLM_RESPONSE_CACHE_SIMILARITY = float(os.getenv("LLM_RESPONSE_CACHE_SIMILARITY", "0"))     # Soglia coseno (0 = solo corrispondenza esatta)
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalizza un messaggio per il confronto: minuscole, senza accenti,
+    punteggiatura e spazi superflui.
+
+    Args:
+        message: Messaggio dell'utente
+
+    Returns:
+        str: Messaggio normalizzato
+    """
+    text = unicodedata.normalize("NFKD", message.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class CachedResponse:
+    """Risposta memorizzata con la riga del relativo embedding (se calcolato)."""
+
+    __slots__ = ("response", "fingerprint", "row", "expires_at")
+
+    def __init__(self, response: str, fingerprint: str, row: Optional[int], expires_at: float):
+        self.response = response
+        self.fingerprint = fingerprint
+        self.row = row
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Cache LRU con TTL delle risposte, indicizzata per messaggio normalizzato
+    e impronta del profilo, con ricerca opzionale per similarità.
+
+    Gli embedding normalizzati delle risposte sono righe di un'unica matrice:
+    la ricerca per similarità calcola tutti i punteggi con un solo prodotto
+    matrice-vettore, invece di confrontare le risposte una alla volta.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl: float, similarity: float):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+
+        self._entries = OrderedDict()   # chiave -> CachedResponse
+        self._pending = OrderedDict()   # chiave -> embedding calcolato in lookup, riusato da store
+
+        # Embedding delle risposte (una riga per risposta), allocati al primo embedding
+        self._matrix: Optional[np.ndarray] = None
+        self._row_keys: List[Optional[str]] = []
+        self._row_fingerprints = np.empty(0, dtype=object)
+        self._row_expires = np.empty(0)
+        self._free_rows: List[int] = []
+
+        # Contatori per le statistiche
+        self._exact_hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._embedding_errors = 0
+
+    @staticmethod
+    def _key(normalized: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\n{normalized}".encode()).hexdigest()
+
+    async def _embed(self, normalized: str) -> Optional[np.ndarray]:
+        """Calcola l'embedding normalizzato del messaggio; None se il servizio non è disponibile."""
+        try:
+            return normalize_rows((await embed_texts([normalized]))[0])
+        except (httpx.HTTPError, KeyError, IndexError) as e:
+            self._embedding_errors += 1
+            logger.warning("⚠️  Embedding non disponibile per la cache delle risposte: %s", e)
+            return None
+
+    def _allocate(self, dimension: int):
+        """Crea la matrice degli embedding; le risposte già memorizzate perdono il proprio."""
+        self._matrix = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        self._row_keys = [None] * self.max_entries
+        self._row_fingerprints = np.full(self.max_entries, None, dtype=object)
+        self._row_expires = np.full(self.max_entries, -np.inf)
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+        for entry in self._entries.values():
+            entry.row = None
+
+    def _write_row(self, key: str, entry: CachedResponse, embedding: np.ndarray):
+        """Salva l'embedding della risposta in una riga libera (o nella sua)."""
+        if self._matrix is None or embedding.shape[0] != self._matrix.shape[1]:
+            # Primo embedding o modello di embedding cambiato
+            self._allocate(embedding.shape[0])
+        if entry.row is None:
+            entry.row = self._free_rows.pop()
+        self._matrix[entry.row] = embedding
+        self._row_keys[entry.row] = key
+        self._row_fingerprints[entry.row] = entry.fingerprint
+        self._row_expires[entry.row] = entry.expires_at
+
+    def _free_row(self, entry: CachedResponse):
+        """Libera la riga dell'embedding di una risposta eliminata."""
+        if entry.row is not None:
+            self._row_keys[entry.row] = None
+            self._row_fingerprints[entry.row] = None
+            self._row_expires[entry.row] = -np.inf
+            self._free_rows.append(entry.row)
+            entry.row = None
+
+    def _most_similar(self, embedding: np.ndarray, fingerprint: str, now: float) -> Optional[str]:
+        """
+        Cerca la risposta più simile con la stessa impronta del profilo.
+
+        Returns:
+            str: Chiave della risposta con similarità almeno pari alla soglia, None se assente
+        """
+        if self._matrix is None or embedding.shape[0] != self._matrix.shape[1]:
+            return None
+        scores = self._matrix @ embedding
+        # Righe libere, scadute o di altri profili non possono essere scelte
+        scores[(self._row_fingerprints != fingerprint) | (self._row_expires < now)] = -np.inf
+        row = int(np.argmax(scores))
+        if scores[row] < self.similarity:
+            return None
+        return self._row_keys[row]
+
+    async def lookup(self, message: str, fingerprint: str) -> Optional[str]:
+        """
+        Cerca una risposta già generata per il messaggio.
+
+        Args:
+            message: Messaggio dell'utente
+            fingerprint: Impronta delle parti rilevanti del profilo
+
+        Returns:
+            str: Risposta memorizzata, oppure None se non presente
+        """
+        if not self.enabled:
+            return None
+
+        normalized = normalize_message(message)
+        now = time.monotonic()
+        key = self._key(normalized, fingerprint)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at >= now:
+            self._entries.move_to_end(key)
+            self._exact_hits += 1
+            return entry.response
+
+        if self.similarity > 0:
+            embedding = await self._embed(normalized)
+            if embedding is not None:
+                self._pending[key] = embedding
+                while len(self._pending) > self.max_entries:
+                    self._pending.popitem(last=False)
+                best_key = self._most_similar(embedding, fingerprint, now)
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._similar_hits += 1
+                    return self._entries[best_key].response
+
+        self._misses += 1
+        return None
+
+    async def store(self, message: str, fingerprint: str, response: str):
+        """
+        Memorizza la risposta generata per il messaggio.
+
+        Args:
+            message: Messaggio dell'utente
+            fingerprint: Impronta delle parti rilevanti del profilo
+            response: Risposta completa generata dal modello
+        """
+        if not self.enabled or not response or self.max_entries <= 0:
+            return
+
+        normalized = normalize_message(message)
+        key = self._key(normalized, fingerprint)
+        embedding = self._pending.pop(key, None)
+        if embedding is None and self.similarity > 0:
+            embedding = await self._embed(normalized)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = CachedResponse(response, fingerprint, None, time.monotonic() + self.ttl)
+            self._entries[key] = entry
+        else:
+            entry.response, entry.expires_at = response, time.monotonic() + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._free_row(evicted)
+
+        if embedding is not None:
+            self._write_row(key, entry, embedding)
+        else:
+            self._free_row(entry)
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente della cache.
+
+        Returns:
+            dict: Configurazione, risposte memorizzate, contatori e hit rate
+        """
+        hits = self._exact_hits + self._similar_hits
+        lookups = hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity,
+            "exact_hits": self._exact_hits,
+            "similar_hits": self._similar_hits,
+            "misses": self._misses,
+            "embedding_errors": self._embedding_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Cache condivisa dal processo
+response_cache = ResponseCache(
+    LLM_RESPONSE_CACHE, LLM_RESPONSE_CACHE_MAX, LLM_RESPONSE_CACHE_TTL, LLM_RESPONSE_CACHE_SIMILARITY
+)
@@ -0,0 +1,238 @@
+"""
+Instradamento semantico dei messaggi verso le specializzazioni mediche.
+
+Le parole chiave non riconoscono le parafrasi ("mi fa male il petto quando
+salgo le scale"). Questo modulo confronta invece il significato del
+messaggio con una descrizione di ogni specializzazione:
+- Embedding delle descrizioni calcolati una sola volta, all'avvio, tramite Ollama
+- Matrice NumPy normalizzata: la similarità coseno con tutte le descrizioni
+  è un unico prodotto matrice-vettore
+- Cache degli embedding dei messaggi già visti
+- Ricaduta sul riconoscimento per parole chiave se gli embedding non sono disponibili
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from backend.router_LLM.embeddings import embed_texts, normalize_rows
+from backend.router_LLM.suggestions import (
+    SPECIALIZATION_KEYWORDS, MAX_SUGGESTIONS, match_specializations, normalize_text
+)
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("specialization_router")
+
+# Configurazione tramite variabili d'ambiente
+LLM_EMBEDDING_ROUTER = os.getenv("LLM_EMBEDDING_ROUTER", "true").lower() == "true"        # Attivazione dell'instradamento semantico
+LLM_ROUTER_MIN_SIMILARITY = float(os.getenv("LLM_ROUTER_MIN_SIMILARITY", "0.55"))         # Similarità minima per suggerire una specializzazione
+LLM_ROUTER_CACHE_SIZE = int(os.getenv("LLM_ROUTER_CACHE_SIZE", "1000"))                   # Embedding dei messaggi mantenuti in cache
+LLM_ROUTER_RETRY_INTERVAL = float(os.getenv("LLM_ROUTER_RETRY_INTERVAL", "60"))           # Secondi tra due tentativi di inizializzazione
+
+# Descrizione dei disturbi trattati da ogni specializzazione
+SPECIALIZATION_DESCRIPTIONS = {
+    "Cardiologia": "Dolore o oppressione al petto, anche sotto sforzo o salendo le scale, palpitazioni, battito irregolare, fiato corto, pressione alta, gonfiore alle caviglie",
+    "Dermatologia": "Problemi della pelle: macchie, nei che cambiano, prurito, arrossamenti, eruzioni cutanee, brufoli, pelle secca o che si squama",
+    "Gastroenterologia": "Mal di pancia, bruciore di stomaco, reflusso, digestione difficile, gonfiore addominale, nausea, vomito, diarrea, stitichezza",
+    "Neurologia": "Mal di testa frequente o forte, emicrania, capogiri, vertigini, formicolii, perdita di forza, tremori, svenimenti, convulsioni, problemi di memoria",
+    "Oculistica": "Problemi agli occhi e alla vista: vista offuscata, vedo male da lontano o da vicino, occhi rossi o che bruciano, lacrimazione",
+    "Otorinolaringoiatria": "Mal di gola, naso chiuso, sinusite, mal d'orecchio, sento poco, fischi nelle orecchie, tonsille gonfie, raucedine",
+    "Ortopedia": "Dolore alle ossa, alle articolazioni o alla schiena, mal di schiena, ginocchio gonfio, distorsioni, fratture, difficoltà a camminare",
+    "Pneumologia": "Tosse persistente, respiro affannoso, fatico a respirare, asma, bronchite, catarro, dolore respirando",
+    "Nefrologia": "Problemi ai reni, dolore ai fianchi, urine scure o con sangue, calcoli renali, gonfiore, insufficienza renale",
+    "Endocrinologia": "Problemi di tiroide, diabete, glicemia alta, squilibri ormonali, aumento o perdita di peso senza motivo, stanchezza cronica",
+    "Pediatria": "Disturbi e salute di neonati, bambini e ragazzi: febbre del bambino, crescita, vaccinazioni",
+    "Psichiatria": "Depressione, tristezza costante, ansia forte, attacchi di panico, insonnia, sbalzi d'umore, pensieri ricorrenti",
+    "Psicologia": "Bisogno di parlare con qualcuno, stress, difficoltà emotive o relazionali, supporto psicologico, psicoterapia",
+    "Oncologia": "Tumori, noduli o masse sospette, cancro, chemioterapia, radioterapia, perdita di peso inspiegabile",
+    "Urologia": "Problemi di vescica e prostata, bruciore urinando, urino spesso, difficoltà a urinare, disturbi genitali maschili",
+    "Ginecologia": "Salute femminile: ciclo mestruale irregolare o doloroso, gravidanza, menopausa, dolori pelvici, contraccezione",
+    "Allergologia": "Allergie, starnuti e naso che cola in primavera, orticaria, reazioni a cibi o farmaci, gonfiore dopo una puntura",
+    "Anestesia e Rianimazione": "Anestesia per interventi, terapia del dolore, valutazione prima di un'operazione",
+    "Chirurgia Generale": "Interventi chirurgici, ernie, appendicite, calcoli alla cistifellea, operazioni",
+    "Radiologia": "Esami diagnostici per immagini: radiografia, ecografia, risonanza magnetica, TAC",
+}
+
+
+class SpecializationRouter:
+    """
+    Classificatore delle specializzazioni basato sulla similarità coseno
+    tra l'embedding del messaggio e quelli delle descrizioni.
+    """
+
+    def __init__(self, enabled: bool, min_similarity: float, cache_size: int, retry_interval: float):
+        self.enabled = enabled
+        self.min_similarity = min_similarity
+        self.cache_size = cache_size
+        self.retry_interval = retry_interval
+
+        self._labels: List[str] = []                # Specializzazione di ogni riga della matrice
+        self._matrix: Optional[np.ndarray] = None   # Embedding normalizzati (righe x dimensione)
+        self._cache = OrderedDict()                 # messaggio normalizzato -> embedding normalizzato
+        self._task: Optional[asyncio.Task] = None
+        self._last_attempt = float("-inf")
+
+        # Contatori per le statistiche
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._fallbacks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._matrix is not None
+
+    @staticmethod
+    def _corpus() -> Tuple[List[str], List[str]]:
+        """Testi da indicizzare: descrizione e parole chiave di ogni specializzazione."""
+        labels, texts = [], []
+        for specialization, keywords in SPECIALIZATION_KEYWORDS.items():
+            description = SPECIALIZATION_DESCRIPTIONS.get(specialization)
+            if description:
+                labels.append(specialization)
+                texts.append(description)
+            labels.append(specialization)
+            texts.append(f"{specialization}: {', '.join(keywords)}")
+        return labels, texts
+
+    async def _load(self):
+        """Calcola gli embedding del corpus con una sola richiesta a Ollama."""
+        labels, texts = self._corpus()
+        try:
+            embeddings = await embed_texts(texts)
+        except (httpx.HTTPError, KeyError) as e:
+            logger.warning("⚠️  Instradamento semantico non disponibile, uso le parole chiave: %s", e)
+            return
+        self._labels = labels
+        self._matrix = normalize_rows(embeddings)
+        logger.info("✅ Instradamento semantico pronto: %d descrizioni, dimensione %d", *self._matrix.shape)
+
+    def start(self):
+        """
+        Avvia in background il calcolo degli embedding del corpus.
+
+        Viene chiamata all'avvio dell'applicazione e, finché il classificatore
+        non è pronto (Ollama non raggiungibile, modello di embedding non
+        installato), ritentata al più ogni retry_interval secondi.
+        Le richieste non attendono mai il caricamento.
+        """
+        if not self.enabled or self.ready or (self._task and not self._task.done()):
+            return
+        if time.monotonic() - self._last_attempt < self.retry_interval:
+            return
+        self._last_attempt = time.monotonic()
+        self._task = asyncio.create_task(self._load())
+
+    async def stop(self):
+        """Interrompe un eventuale caricamento in corso allo spegnimento."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _embed_message(self, message: str) -> Optional[np.ndarray]:
+        """Restituisce l'embedding normalizzato del messaggio, usando la cache."""
+        key = normalize_text(" ".join(message.split()))
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+            return vector
+
+        self._cache_misses += 1
+        try:
+            vector = normalize_rows((await embed_texts([message]))[0])
+        except (httpx.HTTPError, KeyError, IndexError) as e:
+            logger.warning("⚠️  Embedding del messaggio non disponibile: %s", e)
+            return None
+        if self._matrix is None or vector.shape[0] != self._matrix.shape[1]:
+            # Il modello di embedding è cambiato: il corpus va ricalcolato
+            self._matrix = None
+            self._cache.clear()
+            return None
+        self._cache[key] = vector
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return vector
+
+    async def route(self, message: str, top_k: int = MAX_SUGGESTIONS) -> List[Tuple[str, float]]:
+        """
+        Individua le specializzazioni più vicine al messaggio.
+
+        Args:
+            message: Messaggio dell'utente
+            top_k: Numero massimo di specializzazioni restituite
+
+        Returns:
+            list: Coppie (specializzazione, punteggio) in ordine decrescente;
+                  con il classificatore non disponibile, il risultato delle parole chiave
+        """
+        self.start()
+        vector = await self._embed_message(message) if self.ready else None
+        if vector is None:
+            self._fallbacks += 1
+            return match_specializations(message)[:top_k]
+
+        # Similarità con tutte le descrizioni, poi massimo per specializzazione
+        similarities = self._matrix @ vector
+        best = {}
+        for index in np.argsort(similarities)[::-1]:
+            score = float(similarities[index])
+            if score < self.min_similarity or len(best) == top_k:
+                break
+            best.setdefault(self._labels[index], score)
+        if not best:
+            # Nessuna descrizione abbastanza vicina: restano valide le parole chiave esplicite
+            return match_specializations(message)[:top_k]
+        return list(best.items())
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente del classificatore.
+
+        Returns:
+            dict: Disponibilità, dimensione della matrice e contatori della cache
+        """
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "descriptions": len(self._labels),
+            "dimensions": int(self._matrix.shape[1]) if self.ready else 0,
+            "cache_entries": len(self._cache),
+            "cache_hits": self._cache_hits,
+            "cache_misses": self._cache_misses,
+            "keyword_fallbacks": self._fallbacks
+        }
+
+
+# Classificatore condiviso dal processo
+specialization_router = SpecializationRouter(
+    LLM_EMBEDDING_ROUTER, LLM_ROUTER_MIN_SIMILARITY, LLM_ROUTER_CACHE_SIZE, LLM_ROUTER_RETRY_INTERVAL
+)
+
+
+async def suggest_booking(user_message: str) -> list:
+    """
+    Genera i suggerimenti di prenotazione con l'instradamento semantico.
+
+    Args:
+        user_message: Messaggio dell'utente da analizzare
+
+    Returns:
+        list: Suggerimenti nello stesso formato di generate_booking_suggestions
+    """
+    return [
+        {
+            "type": "BOOK_APPOINTMENT",
+            "specialization": specialization,
+            "text": f"Prenota visita di {specialization}",
+            "weight": round(score, 2)
+        }
+        for specialization, score in await specialization_router.route(user_message)
+    ]
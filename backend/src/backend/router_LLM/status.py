@@ -6,22 +6,34 @@ Questo modulo fornisce funzionalità per:
 - Monitorare la disponibilità dei modelli AI
 - Controllare lo stato di download dei modelli
 - Fornire informazioni sui modelli disponibili
+- Sapere se il modello è caricato in memoria e quanto occupa
 
-Il sistema si connette al servizio Ollama per verificare
-la disponibilità e lo stato dei modelli di linguaggio.
+Lo stato viene aggiornato da un'attività in background a intervalli
+regolari (più ravvicinati, con backoff, in caso di errore): l'endpoint
+get_status, interrogato periodicamente dal frontend, risponde dalla
+memoria senza contattare Ollama.
 """
 
 from fastapi import FastAPI, APIRouter
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
+import os
+import time
+import asyncio
 import httpx
 
+from backend.router_LLM.ollama_client import OLLAMA_MODEL
+from backend.router_LLM.providers import get_llm_provider
+
+# Configurazione tramite variabili d'ambiente
+LLM_STATUS_POLL_INTERVAL = float(os.getenv("LLM_STATUS_POLL_INTERVAL", "10"))      # Secondi tra due aggiornamenti
+LLM_STATUS_BACKOFF_INITIAL = float(os.getenv("LLM_STATUS_BACKOFF_INITIAL", "1"))   # Primo ritentativo dopo un errore
+LLM_STATUS_BACKOFF_MAX = float(os.getenv("LLM_STATUS_BACKOFF_MAX", "60"))          # Attesa massima tra i ritentativi
+
 # Router per il monitoraggio dello stato dei modelli LLM
 router_LLM_status = APIRouter()
 
-# URL del servizio Ollama per la connessione
-OLLAMA_URL = 'http://ollama:11434'
-
 class ollama_message(BaseModel):
     """
     Modello per i messaggi di Ollama.
@@ -52,60 +64,153 @@ class answer(BaseModel):
     """
     answer: str   # Contenuto della risposta generata
 
-@router_LLM_status.get("/get_status")
-async def get_status():
+
+class ModelStatusMonitor:
     """
-    Verifica lo stato di connessione e disponibilità dei modelli AI.
-    
-    Questa funzione controlla:
-    - La connessione al servizio Ollama
-    - La disponibilità del modello llama3.2:latest
-    - Lo stato di download dei modelli
-    - Le dimensioni dei modelli disponibili
-    
-    Returns:
-        dict: Dizionario con lo stato del servizio e informazioni sui modelli
-        
-    Raises:
-        Exception: In caso di errori di connessione o comunicazione
+    Stato del modello AI mantenuto in memoria e aggiornato in background.
+
+    Ogni aggiornamento interroga /api/tags (modelli scaricati) e /api/ps
+    (modelli caricati in memoria). Dopo un errore i tentativi successivi
+    seguono un backoff esponenziale fino a LLM_STATUS_BACKOFF_MAX.
     """
-    try:
-        async with httpx.AsyncClient() as client:
-            # Verifica che Ollama risponda correttamente
-            response = await client.get(f"{OLLAMA_URL}/api/tags")
-            if response.status_code == 200:
-                data = response.json()
-                models = data.get("models", [])
-                
-                # Cerca specificamente il modello llama3.2:latest
-                llama_model = next((model for model in models if "llama3.2:latest" in model.get("name", "")), None)
-                
+
+    def __init__(self, model: str, interval: float, backoff_initial: float, backoff_max: float):
+        self.model = model
+        self.interval = interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self._snapshot: Optional[dict] = None
+        self._failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> dict:
+        """
+        Interroga Ollama e aggiorna lo stato in memoria.
+
+        Returns:
+            dict: Nuovo stato del modello
+        """
+        started = time.perf_counter()
+        try:
+            provider = get_llm_provider()
+            models, loaded = await asyncio.gather(
+                provider.list_models(), provider.running_models(), return_exceptions=True
+            )
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+            if isinstance(models, httpx.HTTPStatusError):
+                # Ollama non risponde correttamente
+                self._failures += 1
+                snapshot = {
+                    "status": "error",
+                    "message": "Ollama non risponde correttamente"
+                }
+            elif isinstance(models, Exception):
+                raise models
+            else:
+                self._failures = 0
+                if isinstance(loaded, Exception):
+                    loaded = []
+
+                # Cerca specificamente il modello usato dalla chat
+                llama_model = next((model for model in models if self.model in model.get("name", "")), None)
+                running = next((model for model in loaded if self.model in model.get("name", "")), None)
+
                 if llama_model:
                     # Modello disponibile e pronto per l'uso
-                    return {
+                    snapshot = {
                         "status": "ready",
                         "model": llama_model["name"],
                         "size": llama_model.get("size", 0),
+                        "loaded": running is not None,
+                        "memory_size": running.get("size", 0) if running else 0,
+                        "vram_size": running.get("size_vram", 0) if running else 0,
+                        "expires_at": running.get("expires_at") if running else None,
                         "message": "Modello AI pronto per l'uso"
                     }
                 else:
                     # Modello non ancora scaricato
-                    return {
+                    snapshot = {
                         "status": "downloading",
+                        "loaded": False,
                         "message": "Modello AI in fase di download..."
                     }
-            else:
-                # Ollama non risponde correttamente
-                return {
-                    "status": "error",
-                    "message": "Ollama non risponde correttamente"
-                }
-    except Exception as e:
-        # Errore generico di connessione
-        return {
-            "status": "error",
-            "message": f"Errore nella connessione a Ollama: {str(e)}"
-        }
+            snapshot["latency_ms"] = latency_ms
+        except Exception as e:
+            # Errore generico di connessione
+            self._failures += 1
+            snapshot = {
+                "status": "error",
+                "message": f"Errore nella connessione a Ollama: {str(e)}"
+            }
+
+        snapshot["checked_at"] = datetime.now(timezone.utc).isoformat()
+        snapshot["consecutive_failures"] = self._failures
+        self._snapshot = snapshot
+        return snapshot
+
+    def next_delay(self) -> float:
+        """Attesa prima del prossimo aggiornamento: intervallo regolare o backoff dopo errori."""
+        if self._failures == 0:
+            return self.interval
+        return min(self.backoff_initial * 2 ** (self._failures - 1), self.backoff_max)
+
+    async def _run(self):
+        """Ciclo di aggiornamento in background."""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.next_delay())
+
+    def start(self):
+        """Avvia l'aggiornamento periodico in background (all'avvio dell'applicazione)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Interrompe l'aggiornamento periodico allo spegnimento."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def get(self) -> dict:
+        """
+        Restituisce l'ultimo stato noto senza contattare Ollama.
+
+        Returns:
+            dict: Stato del modello (aggiornato subito solo se non è mai stato letto)
+        """
+        if self._snapshot is None:
+            await self.refresh()
+        return dict(self._snapshot)
+
+
+# Monitor condiviso dal processo
+model_status_monitor = ModelStatusMonitor(
+    OLLAMA_MODEL, LLM_STATUS_POLL_INTERVAL, LLM_STATUS_BACKOFF_INITIAL, LLM_STATUS_BACKOFF_MAX
+)
+
+
+@router_LLM_status.get("/get_status")
+async def get_status():
+    """
+    Verifica lo stato di connessione e disponibilità dei modelli AI.
+    
+    Questa funzione restituisce, dalla memoria:
+    - La connessione al servizio Ollama
+    - La disponibilità del modello della chat (OLLAMA_MODEL)
+    - Lo stato di download dei modelli
+    - Le dimensioni dei modelli disponibili
+    - Se il modello è caricato in memoria e la latenza dell'ultimo controllo
+    
+    Returns:
+        dict: Dizionario con lo stato del servizio e informazioni sui modelli
+    """
+    return await model_status_monitor.get()
 
 
 # Codice commentato per funzionalità future di richiesta diretta
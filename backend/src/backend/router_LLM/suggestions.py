@@ -0,0 +1,344 @@
+"""
+Suggerimenti di prenotazione basati sui sintomi menzionati dal paziente.
+
+Il messaggio dell'utente viene confrontato con una mappa di sintomi e
+condizioni associati alle specializzazioni mediche:
+- Un indice delle parole chiave (e delle loro forme) costruito all'importazione del modulo
+- Confronto senza accenti e senza distinzione tra maiuscole e minuscole
+- Riconoscimento delle forme singolari e plurali delle parole chiave
+- Specializzazioni ordinate per peso complessivo delle corrispondenze
+
+Il costo per messaggio è una singola scansione delle parole del testo
+con ricerche in tabelle hash, indipendente dal numero di parole chiave.
+"""
+
+import string
+import unicodedata
+from itertools import product
+from typing import Dict, List, Tuple
+
+# Massimo numero di specialisti suggeriti per evitare confusione
+MAX_SUGGESTIONS = 2
+
+# Peso predefinito delle parole singole e delle espressioni di più parole
+# (più specifiche, quindi più affidabili)
+DEFAULT_WEIGHT = 1.0
+PHRASE_WEIGHT = 1.5
+
+# Mappa di sintomi/condizioni a specializzazioni mediche.
+# Le parole generiche o ambigue hanno un peso ridotto.
+SPECIALIZATION_KEYWORDS = {
+    # Cardiologia - problemi cardiaci e circolatori
+    "Cardiologia": {
+        "cuore": DEFAULT_WEIGHT,
+        "cardiaca": DEFAULT_WEIGHT,
+        "pressione": 0.8,
+        "ipertensione": DEFAULT_WEIGHT,
+        "aritmia": DEFAULT_WEIGHT,
+        "dolore al petto": PHRASE_WEIGHT,
+    },
+    # Dermatologia - problemi della pelle
+    "Dermatologia": {
+        "pelle": DEFAULT_WEIGHT,
+        "eruzione": DEFAULT_WEIGHT,
+        "acne": DEFAULT_WEIGHT,
+        "psoriasi": DEFAULT_WEIGHT,
+        "eczema": DEFAULT_WEIGHT,
+    },
+    # Gastroenterologia - problemi digestivi
+    "Gastroenterologia": {
+        "stomaco": DEFAULT_WEIGHT,
+        "digestione": DEFAULT_WEIGHT,
+        "nausea": DEFAULT_WEIGHT,
+        "vomito": DEFAULT_WEIGHT,
+        "diarrea": DEFAULT_WEIGHT,
+        "stipsi": DEFAULT_WEIGHT,
+    },
+    # Neurologia - problemi del sistema nervoso
+    "Neurologia": {
+        "cervello": DEFAULT_WEIGHT,
+        "testa": 0.5,
+        "mal di testa": PHRASE_WEIGHT,
+        "emicrania": DEFAULT_WEIGHT,
+        "vertigini": DEFAULT_WEIGHT,
+        "convulsioni": DEFAULT_WEIGHT,
+    },
+    # Oculistica - problemi della vista
+    "Oculistica": {
+        "occhi": DEFAULT_WEIGHT,
+        "vista": DEFAULT_WEIGHT,
+        "cecità": DEFAULT_WEIGHT,
+        "cataratta": DEFAULT_WEIGHT,
+        "glaucoma": DEFAULT_WEIGHT,
+    },
+    # Otorinolaringoiatria - problemi di orecchie, naso e gola
+    "Otorinolaringoiatria": {
+        "orecchie": DEFAULT_WEIGHT,
+        "naso": DEFAULT_WEIGHT,
+        "gola": DEFAULT_WEIGHT,
+        "udito": DEFAULT_WEIGHT,
+        "tinnito": DEFAULT_WEIGHT,
+        "tonsille": DEFAULT_WEIGHT,
+    },
+    # Ortopedia - problemi muscoloscheletrici
+    "Ortopedia": {
+        "ossa": DEFAULT_WEIGHT,
+        "articolazioni": DEFAULT_WEIGHT,
+        "schiena": DEFAULT_WEIGHT,
+        "lombare": DEFAULT_WEIGHT,
+        "frattura": DEFAULT_WEIGHT,
+        "artrite": DEFAULT_WEIGHT,
+        "reumatismi": DEFAULT_WEIGHT,
+        "ginocchio": DEFAULT_WEIGHT,
+        "dolore al ginocchio": PHRASE_WEIGHT,
+    },
+    # Pneumologia - problemi respiratori
+    "Pneumologia": {
+        "polmoni": DEFAULT_WEIGHT,
+        "respirazione": DEFAULT_WEIGHT,
+        "asma": DEFAULT_WEIGHT,
+        "bronchite": DEFAULT_WEIGHT,
+        "tosse": DEFAULT_WEIGHT,
+    },
+    # Nefrologia - problemi renali
+    "Nefrologia": {
+        "reni": DEFAULT_WEIGHT,
+        "urine": DEFAULT_WEIGHT,
+        "dialisi": DEFAULT_WEIGHT,
+    },
+    # Endocrinologia - problemi ormonali e metabolici
+    "Endocrinologia": {
+        "tiroide": DEFAULT_WEIGHT,
+        "diabete": DEFAULT_WEIGHT,
+        "ormoni": DEFAULT_WEIGHT,
+        "metabolismo": DEFAULT_WEIGHT,
+    },
+    # Pediatria - problemi dell'infanzia
+    "Pediatria": {
+        "bambini": DEFAULT_WEIGHT,
+        "pediatrico": DEFAULT_WEIGHT,
+        "infantile": DEFAULT_WEIGHT,
+    },
+    # Psichiatria - problemi di salute mentale
+    "Psichiatria": {
+        "psiche": DEFAULT_WEIGHT,
+        "depressione": DEFAULT_WEIGHT,
+        "ansia": DEFAULT_WEIGHT,
+        "stress": 0.7,
+        "panico": DEFAULT_WEIGHT,
+    },
+    # Psicologia - supporto psicologico
+    "Psicologia": {
+        "psicologico": DEFAULT_WEIGHT,
+        "terapia": 0.5,
+        "counseling": DEFAULT_WEIGHT,
+    },
+    # Oncologia - problemi tumorali
+    "Oncologia": {
+        "tumore": DEFAULT_WEIGHT,
+        "cancro": DEFAULT_WEIGHT,
+        "chemioterapia": DEFAULT_WEIGHT,
+        "radioterapia": DEFAULT_WEIGHT,
+    },
+    # Urologia - problemi urogenitali maschili
+    "Urologia": {
+        "vescica": DEFAULT_WEIGHT,
+        "prostata": DEFAULT_WEIGHT,
+        "genitale": DEFAULT_WEIGHT,
+    },
+    # Ginecologia - problemi ginecologici e ostetrici
+    "Ginecologia": {
+        "ginecologico": DEFAULT_WEIGHT,
+        "gravidanza": DEFAULT_WEIGHT,
+        "mestruazioni": DEFAULT_WEIGHT,
+        "menopausa": DEFAULT_WEIGHT,
+    },
+    # Allergologia - problemi allergici
+    "Allergologia": {
+        "allergia": DEFAULT_WEIGHT,
+        "allergico": DEFAULT_WEIGHT,
+        "anafilassi": DEFAULT_WEIGHT,
+    },
+    # Anestesia e Rianimazione
+    "Anestesia e Rianimazione": {
+        "anestesia": DEFAULT_WEIGHT,
+    },
+    # Chirurgia Generale
+    "Chirurgia Generale": {
+        "chirurgia": DEFAULT_WEIGHT,
+        "operazione": 0.7,
+    },
+    # Radiologia - diagnostica per immagini
+    "Radiologia": {
+        "radiografia": DEFAULT_WEIGHT,
+        "risonanza": DEFAULT_WEIGHT,
+        "tac": DEFAULT_WEIGHT,
+        "ecografia": DEFAULT_WEIGHT,
+    },
+}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Porta il testo in minuscolo e rimuove gli accenti ("cecità" -> "cecita").
+
+    Args:
+        text: Testo da normalizzare
+
+    Returns:
+        str: Testo normalizzato
+    """
+    text = text.casefold()
+    if text.isascii():
+        return text
+    # Le lettere accentate si scompongono in lettera base + accento, che viene scartato
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+# Desinenze alternative per singolare e plurale (regolari e in -co/-ca, -go/-ga, -io)
+_INFLECTIONS = (
+    ("chi", ("co", "chio")), ("che", ("ca",)), ("ghi", ("go",)), ("ghe", ("ga",)),
+    ("co", ("chi", "ci")), ("ca", ("che",)), ("go", ("ghi",)), ("ga", ("ghe",)),
+    ("io", ("i",)), ("ie", ("io", "ia")), ("o", ("i",)), ("a", ("e",)), ("e", ("i", "a")), ("i", ("o", "e", "io")),
+)
+
+
+def _word_forms(word: str) -> set:
+    """Restituisce la parola con le sue forme singolari/plurali più comuni."""
+    forms = {word}
+    if len(word) < 4:
+        return forms
+    for suffix, alternatives in _INFLECTIONS:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            forms.update(stem + alternative for alternative in alternatives)
+            break
+    return forms
+
+
+def _keyword_forms(keyword: str) -> set:
+    """Forme di una parola chiave, flettendo ogni parola piena (non le preposizioni)."""
+    words = normalize_text(keyword).split()
+    choices = [_word_forms(word) if len(word) > 3 else {word} for word in words]
+    return {" ".join(combination) for combination in product(*choices)}
+
+
+def _build_index() -> Tuple[Dict[tuple, Tuple[str, str, float]], set, int]:
+    """
+    Costruisce l'indice di tutte le forme delle parole chiave, come tuple di parole.
+
+    Returns:
+        tuple: (forma -> (parola chiave, specializzazione, peso),
+                insieme delle parole iniziali, numero massimo di parole per forma)
+    """
+    forms = {}
+    for specialization, keywords in SPECIALIZATION_KEYWORDS.items():
+        for keyword, weight in keywords.items():
+            for form in _keyword_forms(keyword):
+                key = tuple(form.split())
+                # In caso di forme condivise prevale la parola chiave con peso maggiore
+                if key not in forms or forms[key][2] < weight:
+                    forms[key] = (keyword, specialization, weight)
+    first_words = {key[0] for key in forms}
+    return forms, first_words, max(len(key) for key in forms)
+
+
+# Punteggiatura sostituita da spazi prima di separare le parole ("l'ansia" -> "l ansia")
+_PUNCTUATION_TABLE = str.maketrans({char: " " for char in string.punctuation})
+_KEYWORD_FORMS, _FIRST_WORDS, _MAX_KEYWORD_WORDS = _build_index()
+
+
+def _find_keywords(text: str):
+    """
+    Scorre le parole del testo e restituisce le parole chiave trovate.
+
+    Per ogni parola basta un controllo in un insieme; solo se può iniziare
+    una parola chiave si provano le espressioni dalla più lunga, così
+    "mal di testa" prevale su "testa".
+
+    Yields:
+        tuple: (posizione della parola, (parola chiave, specializzazione, peso))
+    """
+    words = normalize_text(text).translate(_PUNCTUATION_TABLE).split()
+    if _FIRST_WORDS.isdisjoint(words):
+        return
+    count = len(words)
+    next_index = 0
+    for index, word in enumerate(words):
+        if index < next_index or word not in _FIRST_WORDS:
+            continue
+        for size in range(min(_MAX_KEYWORD_WORDS, count - index), 0, -1):
+            entry = _KEYWORD_FORMS.get(tuple(words[index:index + size]))
+            if entry is not None:
+                yield index, entry
+                next_index = index + size
+                break
+
+
+def match_specializations(user_message: str) -> List[Tuple[str, float]]:
+    """
+    Individua le specializzazioni pertinenti al messaggio, ordinate per rilevanza.
+
+    Ogni parola chiave contribuisce una sola volta con il suo peso; a parità
+    di peso precede la specializzazione citata per prima nel messaggio.
+
+    Args:
+        user_message: Messaggio dell'utente da analizzare
+
+    Returns:
+        list: Coppie (specializzazione, peso complessivo) in ordine decrescente
+    """
+    scores = {}
+    first_position = {}
+    seen_keywords = set()
+    for position, (keyword, specialization, weight) in _find_keywords(user_message):
+        if keyword in seen_keywords:
+            continue
+        seen_keywords.add(keyword)
+        scores[specialization] = scores.get(specialization, 0.0) + weight
+        first_position.setdefault(specialization, position)
+    return sorted(scores.items(), key=lambda item: (-item[1], first_position[item[0]]))
+
+
+def generate_booking_suggestions(user_message: str) -> list:
+    """
+    Genera suggerimenti di prenotazione basati sui sintomi/condizioni menzionati.
+
+    Questa funzione analizza il messaggio dell'utente per identificare
+    sintomi o condizioni mediche e suggerisce le specializzazioni
+    mediche più appropriate per la prenotazione di visite.
+
+    Args:
+        user_message: Messaggio dell'utente da analizzare
+
+    Returns:
+        list: Lista di suggerimenti di prenotazione con specializzazioni appropriate,
+              ordinati per peso delle corrispondenze
+    """
+    return [
+        {
+            "type": "BOOK_APPOINTMENT",
+            "specialization": specialization,
+            "text": f"Prenota visita di {specialization}",
+            "weight": round(weight, 2)
+        }
+        for specialization, weight in match_specializations(user_message)[:MAX_SUGGESTIONS]
+    ]
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python -m backend.router_LLM.suggestions
+    import timeit
+
+    samples = {
+        "breve": "ho mal di testa e tosse da tre giorni",
+        "lungo": ("Salve dottore, da qualche settimana ho un forte dolore al petto quando salgo "
+                  "le scale, la pressione è alta e a volte ho vertigini. ") * 20,
+        "senza sintomi": "buongiorno, vorrei sapere gli orari dello studio " * 50,
+    }
+    print(f"Forme compilate: {len(_KEYWORD_FORMS)}")
+    for label, message in samples.items():
+        runs = 2000
+        elapsed = timeit.timeit(lambda: generate_booking_suggestions(message), number=runs)
+        print(f"{label:>14} ({len(message):5d} caratteri): {elapsed / runs * 1e6:8.1f} µs/messaggio "
+              f"-> {generate_booking_suggestions(message)}")
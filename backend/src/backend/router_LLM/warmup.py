@@ -0,0 +1,136 @@
+"""
+Preriscaldamento del modello AI all'avvio del backend.
+
+Il primo caricamento del modello in memoria richiede spesso decine di
+secondi, che altrimenti ricadrebbero sulla prima richiesta di un paziente.
+All'avvio dell'applicazione questo modulo:
+- Attende che Ollama risponda e che il modello sia stato scaricato
+- Invia una generazione minima (un solo token) con lo stesso prompt di
+  sistema e le stesse opzioni della chat, così il modello e la cache del
+  prefisso del prompt restano caricati
+- Tiene traccia dello stato, esposto da /health e /health/ready
+"""
+
+import os
+import time
+import asyncio
+from typing import Optional
+
+import httpx
+
+from backend.router_LLM.providers import get_llm_provider
+from backend.router_LLM.chat import SYSTEM_PROMPT, MODEL, build_payload
+from backend.router_LLM.status import model_status_monitor
+from backend.router_LLM.logs import get_logger
+
+logger = get_logger("warmup")
+
+# Configurazione tramite variabili d'ambiente
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"                       # Attivazione del preriscaldamento
+LLM_WARMUP_RETRY_INTERVAL = float(os.getenv("LLM_WARMUP_RETRY_INTERVAL", "5"))      # Secondi tra due tentativi
+
+# Messaggio usato per la generazione di prova
+WARMUP_MESSAGE = "Ciao"
+
+
+class ModelWarmup:
+    """
+    Stato di preparazione del modello: attesa di Ollama, attesa del
+    download, caricamento in memoria e infine pronto.
+    """
+
+    def __init__(self, enabled: bool, retry_interval: float):
+        self.enabled = enabled
+        self.retry_interval = retry_interval
+
+        self._state = "disabled" if not enabled else "pending"
+        self._message = ""
+        self._attempts = 0
+        self._started_at: Optional[float] = None
+        self._ready_after: Optional[float] = None    # Secondi dall'avvio alla disponibilità
+        self._load_duration: Optional[float] = None  # Secondi impiegati da Ollama per caricare il modello
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """True se il modello è caricato (o il preriscaldamento è disattivato)."""
+        return self._state in ("ready", "disabled")
+
+    async def _wait_for_model(self):
+        """Attende che Ollama risponda e che il modello sia disponibile."""
+        while True:
+            snapshot = await model_status_monitor.refresh()
+            if snapshot["status"] == "ready":
+                return
+            self._state = "waiting_model" if snapshot["status"] == "downloading" else "waiting_ollama"
+            self._message = snapshot.get("message", "")
+            await asyncio.sleep(self.retry_interval)
+
+    async def _generate(self):
+        """Genera un solo token per caricare il modello e il prefisso del prompt."""
+        payload = build_payload(
+            [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": WARMUP_MESSAGE}],
+            stream=False
+        )
+        payload["options"]["num_predict"] = 1
+        data = await get_llm_provider().chat(payload)
+        # Ollama riporta le durate in nanosecondi
+        self._load_duration = round(data.get("load_duration", 0) / 1e9, 2)
+
+    async def _run(self):
+        """Ciclo di preparazione: riprova finché il modello non risponde."""
+        self._started_at = time.monotonic()
+        await self._wait_for_model()
+        while True:
+            self._state = "warming"
+            self._message = f"Caricamento di {MODEL} in memoria"
+            self._attempts += 1
+            try:
+                await self._generate()
+                break
+            except (httpx.HTTPError, ValueError) as e:
+                self._message = f"Preriscaldamento non riuscito: {str(e)}"
+                logger.warning("⚠️  %s", self._message)
+                await asyncio.sleep(self.retry_interval)
+                await self._wait_for_model()
+
+        self._state = "ready"
+        self._message = f"{MODEL} caricato e pronto"
+        self._ready_after = round(time.monotonic() - self._started_at, 2)
+        logger.info("✅ Modello %s pronto dopo %ss (caricamento %ss)", MODEL, self._ready_after, self._load_duration)
+
+    def start(self):
+        """Avvia il preriscaldamento in background (all'avvio dell'applicazione)."""
+        if self.enabled and not self.ready and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Interrompe un eventuale preriscaldamento in corso allo spegnimento."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente del preriscaldamento.
+
+        Returns:
+            dict: Stato, messaggio, tentativi e tempi di caricamento
+        """
+        return {
+            "ready": self.ready,
+            "state": self._state,
+            "model": MODEL,
+            "message": self._message,
+            "attempts": self._attempts,
+            "ready_after_seconds": self._ready_after,
+            "load_duration_seconds": self._load_duration
+        }
+
+
+# Stato di preparazione condiviso dal processo
+model_warmup = ModelWarmup(LLM_WARMUP, LLM_WARMUP_RETRY_INTERVAL)
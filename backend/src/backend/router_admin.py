@@ -18,7 +18,7 @@ from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import List, Optional
 import json
-from backend.connection import execute_query
+from backend.connection import execute_query_async
 
 # Router per le funzionalità di amministrazione
 router_admin = APIRouter()
@@ -137,7 +137,7 @@ async def get_doctor_requests():
         per garantire la continuità del servizio amministrativo.
     """
     try:
-        from backend.connection import execute_query
+        from backend.connection import execute_query_async
         import json
         
         # Query per recuperare tutte le richieste pendenti ordinate per data
@@ -148,7 +148,7 @@ async def get_doctor_requests():
         ORDER BY created_at ASC
         """
         
-        results = execute_query(query)
+        results = await execute_query_async(query)
         
         # Elaborazione dei risultati con parsing delle locations e documenti
         requests = []
@@ -168,7 +168,7 @@ async def get_doctor_requests():
             WHERE request_id = %s
             ORDER BY uploaded_at ASC
             """
-            documents = execute_query(docs_query, (row[0],))
+            documents = await execute_query_async(docs_query, (row[0],))
             
             # Formattazione dei documenti per il frontend
             doc_list = []
@@ -302,7 +302,7 @@ async def get_doctor_document(document_id: int):
         """
         
         print(f"Eseguendo query per documento ID: {document_id}")
-        result = execute_query(query, (document_id,))
+        result = await execute_query_async(query, (document_id,))
         print(f"Risultato query: {result}")
         
         if not result:
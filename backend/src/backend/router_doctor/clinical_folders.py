@@ -14,6 +14,10 @@ Il sistema mantiene una struttura organizzata per ogni paziente con:
 - Cronologia medica completa
 - Prescrizioni attive e storiche
 - Documenti medici organizzati per tipo
+
+Gli handler usano la connessione sincrona di get_db_session e sono quindi
+funzioni normali (def): FastAPI li esegue nel suo threadpool, così le
+query bloccanti di psycopg2 non occupano l'event loop.
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, Form
@@ -31,7 +35,7 @@ from .pydantic.doctor_basemodels import (
     MedicalDocumentCreate, MedicalDocumentUpdate, MedicalDocumentResponse,
     ClinicalFolderResponse
 )
-from ..connection import connect_to_postgres
+from ..connection import get_db_session
 
 # Router per la gestione delle cartelle cliniche
 router = APIRouter()
@@ -45,7 +49,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # =========================================
 
 @router.get("/patients/{doctor_id}")
-async def get_doctor_patients(doctor_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_doctor_patients(doctor_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera tutti i pazienti associati a un dottore specifico.
     
@@ -108,7 +112,7 @@ async def get_doctor_patients(doctor_id: int, db: psycopg2.extensions.connection
         raise HTTPException(status_code=500, detail=f"Errore imprevisto: {str(e)}")
 
 @router.get("/patient/{patient_id}", response_model=ClinicalFolderResponse)
-async def get_patient_clinical_folder(patient_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_patient_clinical_folder(patient_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera la cartella clinica completa di un paziente specifico.
     
@@ -225,10 +229,10 @@ async def get_patient_clinical_folder(patient_id: int, db: psycopg2.extensions.c
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.get("/patient/{patient_id}/doctor/{doctor_id}", response_model=ClinicalFolderResponse)
-async def get_patient_clinical_folder_by_doctor(
+def get_patient_clinical_folder_by_doctor(
     patient_id: int, 
     doctor_id: int, 
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Recupera la cartella clinica di un paziente filtrata per un dottore specifico.
@@ -343,10 +347,10 @@ async def get_patient_clinical_folder_by_doctor(
 # =========================================
 
 @router.post("/medical-records", response_model=MedicalRecordResponse)
-async def create_medical_record(
+def create_medical_record(
     record: MedicalRecordCreate,
     doctor_id: int = Query(..., description="ID of the doctor creating the record"),
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Crea un nuovo record medico per un paziente specifico.
@@ -443,7 +447,7 @@ async def create_medical_record(
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.get("/medical-records/{record_id}", response_model=MedicalRecordResponse)
-async def get_medical_record(record_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_medical_record(record_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera un record medico specifico.
     
@@ -479,10 +483,10 @@ async def get_medical_record(record_id: int, db: psycopg2.extensions.connection
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.put("/medical-records/{record_id}", response_model=MedicalRecordResponse)
-async def update_medical_record(
+def update_medical_record(
     record_id: int,
     record_update: MedicalRecordUpdate,
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Aggiorna un record medico esistente.
@@ -564,9 +568,9 @@ async def update_medical_record(
 # =========================================
 
 @router.post("/prescriptions", response_model=PrescriptionResponse)
-async def create_prescription(
+def create_prescription(
     prescription: PrescriptionCreate,
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Crea una nuova prescrizione.
@@ -609,7 +613,7 @@ async def create_prescription(
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.get("/prescriptions/{prescription_id}", response_model=PrescriptionResponse)
-async def get_prescription(prescription_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_prescription(prescription_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera una prescrizione specifica.
     
@@ -642,7 +646,7 @@ async def get_prescription(prescription_id: int, db: psycopg2.extensions.connect
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.get("/medical-records/{record_id}/prescriptions")
-async def get_prescriptions_for_record(record_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_prescriptions_for_record(record_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera tutte le prescrizioni per un record medico specifico.
     
@@ -674,10 +678,10 @@ async def get_prescriptions_for_record(record_id: int, db: psycopg2.extensions.c
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.put("/prescriptions/{prescription_id}", response_model=PrescriptionResponse)
-async def update_prescription(
+def update_prescription(
     prescription_id: int,
     prescription_update: PrescriptionUpdate,
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Aggiorna una prescrizione esistente.
@@ -751,10 +755,10 @@ async def update_prescription(
 # =========================================
 
 @router.post("/documents", response_model=MedicalDocumentResponse)
-async def create_medical_document(
+def create_medical_document(
     document: MedicalDocumentCreate,
     doctor_id: int = Query(..., description="ID of the doctor uploading the document"),
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Crea un nuovo documento medico.
@@ -829,7 +833,7 @@ async def create_medical_document(
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.get("/documents/{document_id}", response_model=MedicalDocumentResponse)
-async def get_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def get_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Recupera un documento medico specifico.
     
@@ -865,7 +869,7 @@ async def get_medical_document(document_id: int, db: psycopg2.extensions.connect
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.delete("/documents/{document_id}")
-async def delete_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def delete_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Elimina un documento medico.
     
@@ -897,14 +901,14 @@ async def delete_medical_document(document_id: int, db: psycopg2.extensions.conn
         raise HTTPException(status_code=500, detail=f"Errore del database: {str(e)}")
 
 @router.post("/upload-document")
-async def upload_medical_document(
+def upload_medical_document(
     patient_id: int = Form(...),
     doctor_id: int = Form(...),
     document_type: str = Form(...),
     title: str = Form(...),
     description: str = Form(''),
     file: UploadFile = File(...),
-    db: psycopg2.extensions.connection = Depends(connect_to_postgres)
+    db: psycopg2.extensions.connection = Depends(get_db_session)
 ):
     """
     Carica un file di documento medico e crea il record del documento.
@@ -932,7 +936,7 @@ async def upload_medical_document(
         filename = f"{patient_id}_{doctor_id}_{int(datetime.now().timestamp())}_{file.filename}"
         file_path = os.path.join(UPLOAD_DIR, filename)
         with open(file_path, "wb") as f:
-            content = await file.read()
+            content = file.file.read()
             f.write(content)
         rel_path = file_path.replace('./', '/', 1) if file_path.startswith('./') else file_path
         # Creazione del record del documento
@@ -981,7 +985,7 @@ async def upload_medical_document(
         raise HTTPException(status_code=500, detail=f"Errore di caricamento documento: {str(e)}")
 
 @router.get("/download-document/{document_id}")
-async def download_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(connect_to_postgres)):
+def download_medical_document(document_id: int, db: psycopg2.extensions.connection = Depends(get_db_session)):
     """
     Scarica un documento medico specifico.
     
@@ -16,7 +16,8 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from typing import List, Optional
 import json
 from datetime import datetime
-from backend.connection import execute_query
+from backend.connection import execute_query_async
+from backend.router_patient.location_index import location_index
 from passlib.context import CryptContext
 
 # Router per la registrazione dei dottori
@@ -67,14 +68,14 @@ async def submit_registration_request(
     try:
         # Verifica se l'email esiste già in un account attivo
         check_query = "SELECT id FROM account WHERE email = %s"
-        existing = execute_query(check_query, (email,))
+        existing = await execute_query_async(check_query, (email,))
         
         if existing:
             raise HTTPException(status_code=400, detail="Email già registrata nel sistema")
         
         # Verifica se esiste già una richiesta pendente per la stessa email
         check_request_query = "SELECT id FROM doctor_registration_request WHERE email = %s AND status = 'pending'"
-        existing_request = execute_query(check_request_query, (email,))
+        existing_request = await execute_query_async(check_request_query, (email,))
         
         if existing_request:
             raise HTTPException(status_code=400, detail="Hai già una richiesta di registrazione in attesa di approvazione")
@@ -100,7 +101,7 @@ async def submit_registration_request(
             raise HTTPException(status_code=400, detail="Formato delle sedi non valido. Invia un JSON valido")
         
         # Esecuzione dell'inserimento della richiesta
-        result = execute_query(
+        result = await execute_query_async(
             insert_query, 
             (name, surname, email, password, sex, parsed_date, specialization, phone, json.dumps(locations_data),),
             commit=True
@@ -144,7 +145,7 @@ async def submit_registration_request(
                 VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                 """
                 
-                execute_query(
+                await execute_query_async(
                     doc_query,
                     (request_id, doc.filename, doc.content_type, file_content, 'altro', len(file_content)),
                     commit=True
@@ -175,7 +176,7 @@ async def check_registration_status(email: str):
         LIMIT 1
         """
         
-        result = execute_query(query, (email,))
+        result = await execute_query_async(query, (email,))
         
         if not result:
             raise HTTPException(status_code=404, detail="Nessuna richiesta trovata per questa email")
@@ -206,7 +207,7 @@ async def get_pending_requests():
         ORDER BY created_at ASC
         """
         
-        results = execute_query(query)
+        results = await execute_query_async(query)
         
         requests = []
         for row in results:
@@ -252,7 +253,7 @@ async def review_registration_request(
         FROM doctor_registration_request 
         WHERE id = %s AND status = 'pending'
         """
-        request_data = execute_query(check_query, (request_id,))
+        request_data = await execute_query_async(check_query, (request_id,))
         
         if not request_data:
             raise HTTPException(status_code=404, detail="Richiesta non trovata o già processata")
@@ -270,7 +271,7 @@ async def review_registration_request(
             RETURNING id
             """
             
-            account_result = execute_query(account_query, (
+            account_result = await execute_query_async(account_query, (
                 request[1], request[2], request[3], hashed_password, request[5], request[6], request[7]
             ), commit=True)
             
@@ -284,7 +285,7 @@ async def review_registration_request(
             INSERT INTO doctor (id, specialization, is_verified, verification_date)
             VALUES (%s, %s, TRUE, CURRENT_TIMESTAMP)
             """
-            execute_query(doctor_query, (doctor_id, request[8]), commit=True)
+            await execute_query_async(doctor_query, (doctor_id, request[8]), commit=True)
             
             # Inserisci le locations - versione semplificata
             try:
@@ -314,7 +315,7 @@ async def review_registration_request(
                                 INSERT INTO location (doctor_id, address, latitude, longitude)
                                 VALUES (%s, %s, %s, %s)
                                 """
-                                execute_query(location_query, (
+                                await execute_query_async(location_query, (
                                     doctor_id, 
                                     location.get('address', ''), 
                                     location.get('latitude'), 
@@ -328,6 +329,9 @@ async def review_registration_request(
                 print(f"Errore nel parsing delle locations: {e}")
                 print(f"Raw data that caused error: {request[9]}")
                 # Continua anche se le locations non sono valide
+
+            # Le nuove sedi devono comparire nelle ricerche per vicinanza
+            location_index.invalidate()
             
             # Aggiorna status richiesta
             update_query = """
@@ -335,7 +339,7 @@ async def review_registration_request(
             SET status = 'approved', admin_notes = %s, reviewed_at = CURRENT_TIMESTAMP
             WHERE id = %s
             """
-            execute_query(update_query, (admin_notes, request_id), commit=True)
+            await execute_query_async(update_query, (admin_notes, request_id), commit=True)
             
             return {
                 "message": "Dottore approvato con successo",
@@ -350,7 +354,7 @@ async def review_registration_request(
             SET status = 'rejected', admin_notes = %s, reviewed_at = CURRENT_TIMESTAMP
             WHERE id = %s
             """
-            execute_query(update_query, (admin_notes, request_id), commit=True)
+            await execute_query_async(update_query, (admin_notes, request_id), commit=True)
             
             return {
                 "message": "Richiesta rifiutata",
@@ -18,7 +18,7 @@ da 'waiting' a 'booked' e viceversa, con controlli di sicurezza.
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from typing import Optional, List
 from datetime import datetime
-from backend.connection import execute_query
+from backend.connection import execute_query_async
 from backend.router_patient.pydantic.schemas import Appointment, BookAppointmentRequest, CancelAppointmentRequest, PatientInfoRequest, DoctorSlotsRequest
 
 # Router per la gestione degli appuntamenti dei pazienti
@@ -48,7 +48,7 @@ async def book_appointment(data: BookAppointmentRequest):
         FROM appointment
         WHERE id = %s
         """
-        check_result = execute_query(check_query, (data.appointment_id,))
+        check_result = await execute_query_async(check_query, (data.appointment_id,))
 
         if not check_result:
             raise HTTPException(status_code=404, detail="Appointment not found")
@@ -64,7 +64,7 @@ async def book_appointment(data: BookAppointmentRequest):
         WHERE id = %s AND status = 'waiting' AND patient_id IS NULL
         RETURNING id
         """
-        result = execute_query(update_query, (data.patient_id, data.appointment_id), commit=True)
+        result = await execute_query_async(update_query, (data.patient_id, data.appointment_id), commit=True)
 
         if not result:
             raise HTTPException(status_code=400, detail="Failed to book appointment - it may have been booked by someone else")
@@ -107,7 +107,7 @@ async def cancel_appointment(data: CancelAppointmentRequest):
         FROM appointment 
         WHERE id = %s
         """
-        check_result = execute_query(check_query, (data.appointment_id,))
+        check_result = await execute_query_async(check_query, (data.appointment_id,))
 
         if not check_result:
             raise HTTPException(status_code=404, detail="Appointment not found")
@@ -123,7 +123,7 @@ async def cancel_appointment(data: CancelAppointmentRequest):
         WHERE id = %s AND patient_id = %s AND status = 'booked'
         RETURNING id
         """
-        result = execute_query(update_query, (data.appointment_id, data.patient_id), commit=True)
+        result = await execute_query_async(update_query, (data.appointment_id, data.patient_id), commit=True)
 
         if not result:
             raise HTTPException(status_code=400, detail="Failed to cancel appointment")
@@ -182,7 +182,7 @@ async def get_upcoming_appointments(data: PatientInfoRequest = Depends()):
             ORDER BY a.date_time ASC
         """
         
-        raw_result = execute_query(query, (data.patient_id,))
+        raw_result = await execute_query_async(query, (data.patient_id,))
         
         appointments = [
             {
@@ -250,7 +250,7 @@ async def get_past_appointments(data: PatientInfoRequest = Depends()):
             ORDER BY a.date_time DESC
         """
 
-        raw_result = execute_query(query, (data.patient_id,))
+        raw_result = await execute_query_async(query, (data.patient_id,))
 
         appointments = [
             {
@@ -309,7 +309,7 @@ async def get_patient_health_profile(data: PatientInfoRequest = Depends()):
         WHERE a.id = %s
         """
 
-        result = execute_query(query_basic, (data.patient_id,))
+        result = await execute_query_async(query_basic, (data.patient_id,))
         if not result:
             raise HTTPException(status_code=404, detail="Paziente non trovato")
         
@@ -339,7 +339,7 @@ async def get_patient_health_profile(data: PatientInfoRequest = Depends()):
         LIMIT 5
         """
 
-        history_result = execute_query(query_history, (data.patient_id,))
+        history_result = await execute_query_async(query_history, (data.patient_id,))
         if not history_result:
             raise HTTPException(status_code=404, detail="Cronologia medica non trovata")
 
@@ -419,7 +419,7 @@ async def get_free_slots(data: DoctorSlotsRequest = Depends()):
         """
         params.append(data.limit)
 
-        raw_result = execute_query(query, tuple(params))
+        raw_result = await execute_query_async(query, tuple(params))
         columns = ["appointment_id", "date_time", "price", "address", "city"]
         result = [dict(zip(columns, row)) for row in raw_result]
 
@@ -474,7 +474,7 @@ async def history(data: PatientInfoRequest = Depends()):
                         ORDER BY a.date_time ASC;
                 '''
         #esecuzione query
-        raw_result = execute_query(query, (data.patient_id,))
+        raw_result = await execute_query_async(query, (data.patient_id,))
         
         appointments: List[Appointment] = [
             Appointment(
@@ -531,7 +531,7 @@ async def get_booked_appointment(data: PatientInfoRequest = Depends()):
             WHERE a.status = 'booked' AND a.patient_id = %s
             ORDER BY a.date_time ASC
         """
-        raw_result = execute_query(query, (data.patient_id,))
+        raw_result = await execute_query_async(query, (data.patient_id,))
         
         appointments: List[Appointment] = [
             Appointment(
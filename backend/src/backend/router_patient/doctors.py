@@ -17,14 +17,21 @@ Il sistema implementa un algoritmo di ranking complessivo che considera:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from typing import List
-from backend.connection import execute_query
+from backend.connection import execute_query_async
+from backend.router_patient.location_index import location_index, haversine_km, MAX_DISTANCE_KM
+from backend.router_patient.proximity import proximity_filter, distance_sql
+from backend.router_patient.ranking import resolve_weights, rank_doctors
 
 from backend.router_patient.pydantic.schemas import DoctorQueryRequest, LimitInfo, PatientInfoRequest
 
 # Router per la visualizzazione e ranking dei dottori
 router_show_doctors = APIRouter()
 
+# Raggio iniziale (km) della ricerca SQL dei dottori più vicini, quando non è indicato
+PROXIMITY_START_KM = 10.0
+
 @router_show_doctors.get("/get_all_doctors")
 async def get_all_doctors(data: LimitInfo = Depends()) -> List[dict]:
     """
@@ -68,7 +75,7 @@ async def get_all_doctors(data: LimitInfo = Depends()) -> List[dict]:
         LIMIT %s;
         """
 
-        raw_result = execute_query(query, (data.limit,))
+        raw_result = await execute_query_async(query, (data.limit,))
 
         # Mappatura delle colonne del database ai nomi dei campi
         columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "price"]
@@ -85,115 +92,209 @@ async def get_ranked_doctors(data: DoctorQueryRequest = Depends()) -> List[dict]
     
     Questa funzione implementa un sistema di ranking avanzato che considera:
     - Distanza dalla posizione del paziente
-    - Rating medio dalle recensioni
+    - Rating medio dalle recensioni (aggregato in doctor_rating, vedi ratings.py)
     - Anni di esperienza (basati sulla data di creazione account)
     - Prezzo delle visite
     - Disponibilità di appuntamenti
+
+    Con un sort_by specifico l'ordinamento avviene in SQL; altrimenti i
+    candidati vengono ordinati per punteggio complessivo (vedi ranking.py),
+    con i pesi indicati nella richiesta o quelli predefiniti.
+
+    Prezzo e disponibilità si riferiscono agli slot liberi del dottore
+    (nell'intervallo di prezzo, se indicato) e sono aggregati per dottore
+    prima dell'unione con le sedi: ogni dottore compare una volta per sede.
     
     Args:
         latitude: Latitudine del paziente per il calcolo della distanza
         longitude: Longitudine del paziente per il calcolo della distanza
         specialization: Filtro opzionale per specializzazione medica
-        min_price: Prezzo minimo per il filtro
-        max_price: Prezzo massimo per il filtro
+        min_price: Prezzo minimo degli slot liberi
+        max_price: Prezzo massimo degli slot liberi
         sort_by: Criteri di ordinamento disponibili
         limit: Numero massimo di risultati da restituire
+        weight_*: Pesi opzionali dei criteri del ranking complessivo
         
     Returns:
         list: Lista di dottori ordinati secondo i criteri specificati
+              (con il punteggio "score" nel ranking complessivo)
         
     Raises:
         HTTPException: In caso di errori nei parametri o del database
     """
 
+    has_position = data.latitude is not None and data.longitude is not None
+    by_distance = data.sort_by == "distance" and has_position
+    # Senza un criterio singolo i candidati sono ordinati per punteggio complessivo (NumPy)
+    composite = not by_distance and data.sort_by not in ("rating", "experience", "price", "availability")
+
     try:
+        weights = resolve_weights({
+            "distance": data.weight_distance,
+            "rating": data.weight_rating,
+            "experience": data.weight_experience,
+            "price": data.weight_price,
+            "availability": data.weight_availability
+        })
+
+        # Con l'indice geografico in memoria le distanze non vengono calcolate in SQL;
+        # senza indice si usa il filtro con riquadro di coordinate (proximity_filter)
+        use_index = has_position and await location_index.available()
+
+        params = {}
+
+        # Slot liberi di ogni dottore: prezzo minimo e numero di slot, nell'intervallo
+        # di prezzo richiesto. Le statistiche sono aggregate per dottore prima del join,
+        # così ogni dottore compare una volta per sede senza moltiplicare le righe.
+        slot_conditions = ["a.status = 'waiting'"]
+
+        if data.min_price is not None:
+            slot_conditions.append("a.price >= %(min_price)s")
+            params["min_price"] = data.min_price
+
+        if data.max_price is not None:
+            slot_conditions.append("a.price <= %(max_price)s")
+            params["max_price"] = data.max_price
+
+        # Aggregazione limitata ai dottori che possono comparire nel risultato
+        if data.specialization:
+            slot_conditions.append("a.doctor_id IN (SELECT id FROM doctor WHERE specialization = %(specialization)s)")
+            params["specialization"] = data.specialization
+        if by_distance and use_index:
+            slot_conditions.append("a.doctor_id IN (SELECT doctor_id FROM location WHERE id = ANY(%(location_ids)s))")
+        elif by_distance:
+            slot_conditions.append("a.doctor_id IN (SELECT l.doctor_id FROM location l WHERE {proximity})")
+
+        slot_filter = " AND ".join(slot_conditions)
+
         # Query base con tutti i fattori di ranking
-        base_query = """
-        SELECT DISTINCT 
+        base_query = f"""
+        WITH slot_stats AS (
+            SELECT a.doctor_id, MIN(a.price) AS min_price, COUNT(*) AS available_slots
+            FROM appointment a
+            WHERE {slot_filter}
+            GROUP BY a.doctor_id
+        )
+        SELECT
             d.id AS doctor_id,
             u.name,
             u.surname,
             d.specialization,
             d.rank,
             u.profile_img,
-            l.latitude,
-            l.longitude,
+            l.latitude::float8,
+            l.longitude::float8,
             l.address,
             l.city,
-            COALESCE(MIN(a.price), 50) as price,
-            EXTRACT(YEAR FROM AGE(CURRENT_DATE, u.created_at)) as years_experience,
-            COALESCE(AVG(r.stars), 0) as avg_rating,
-            COUNT(r.id) as review_count,
-            COUNT(CASE WHEN a.status = 'waiting' THEN 1 END) as available_slots
+            COALESCE(s.min_price, 50)::float8 as price,
+            EXTRACT(YEAR FROM AGE(CURRENT_DATE, u.created_at))::float8 as years_experience,
+            COALESCE(dr.avg_rating, 0)::float8 as avg_rating,
+            COALESCE(dr.review_count, 0) as review_count,
+            COALESCE(s.available_slots, 0) as available_slots,
+            l.id AS location_id
         """
         
-        # Calcolo della distanza se le coordinate sono fornite
-        if data.latitude is not None and data.longitude is not None:
-            base_query += f""",
-            (6371 * acos(cos(radians({data.latitude})) * cos(radians(l.latitude)) * cos(radians(l.longitude) - radians({data.longitude})) + sin(radians({data.latitude})) * sin(radians(l.latitude)))) AS distance_km
-            """
+        # Distanza delle sedi candidate: fornita dall'indice insieme ai loro id, oppure calcolata in SQL
+        if by_distance and use_index:
+            base_query += ", n.distance_km"
+        elif by_distance:
+            base_query += f", {distance_sql('l')} AS distance_km"
         else:
             base_query += ", NULL as distance_km"
         
+        # Valutazioni già aggregate in doctor_rating (vedi ratings.py)
         base_query += """
         FROM doctor d
         JOIN account u ON d.id = u.id
+        LEFT JOIN doctor_rating dr ON dr.doctor_id = d.id
         LEFT JOIN location l ON l.doctor_id = d.id
-        LEFT JOIN appointment a ON a.doctor_id = d.id
-        LEFT JOIN review r ON r.appointment_id = a.id
         """
+
+        # Ordinando per distanza si considerano solo le sedi più vicine
+        if by_distance and use_index:
+            base_query += """
+        JOIN unnest(%(location_ids)s::int[], %(distances)s::float8[]) AS n(location_id, distance_km) ON n.location_id = l.id
+        """
+
+        # Con un filtro di prezzo restano solo i dottori con slot liberi nell'intervallo
+        if data.min_price is not None or data.max_price is not None:
+            base_query += " JOIN slot_stats s ON s.doctor_id = d.id"
+        else:
+            base_query += " LEFT JOIN slot_stats s ON s.doctor_id = d.id"
         
         # Condizioni WHERE per i filtri applicati
         where_conditions = []
-        params = []
 
         if data.specialization:
-            where_conditions.append("d.specialization = %s")
-            params.append(data.specialization)
+            where_conditions.append("d.specialization = %(specialization)s")
 
-        if data.min_price is not None:
-            where_conditions.append("a.price >= %s")
-            params.append(data.min_price)
-
-        if data.max_price is not None:
-            where_conditions.append("a.price <= %s")
-            params.append(data.max_price)
+        if by_distance and not use_index:
+            where_conditions.append("{proximity}")
+            # Come con l'indice, le sedi senza coordinate non hanno una distanza da ordinare
+            where_conditions.append("l.latitude IS NOT NULL AND l.longitude IS NOT NULL")
 
         if where_conditions:
             base_query += " WHERE " + " AND ".join(where_conditions)
         
-        base_query += """
-        GROUP BY d.id, u.name, u.surname, d.specialization, d.rank, u.profile_img, l.latitude, l.longitude, l.address, l.city, u.created_at
-        """
-        
-        # Ordinamento basato sui criteri specificati
-        if data.sort_by == "distance" and data.latitude is not None and data.longitude is not None:
-            base_query += " ORDER BY distance_km ASC"
+        # Ordinamento basato sui criteri specificati (a parità, per dottore e sede)
+        if by_distance:
+            base_query += " ORDER BY distance_km ASC, d.id, l.id"
         elif data.sort_by == "rating":
-            base_query += " ORDER BY avg_rating DESC, review_count DESC"
+            base_query += " ORDER BY avg_rating DESC, review_count DESC, d.id, l.id"
         elif data.sort_by == "experience":
-            base_query += " ORDER BY years_experience DESC"
+            base_query += " ORDER BY years_experience DESC, d.id, l.id"
         elif data.sort_by == "price":
-            base_query += " ORDER BY price ASC"
+            base_query += " ORDER BY price ASC, d.id, l.id"
         elif data.sort_by == "availability":
-            base_query += " ORDER BY available_slots DESC"
-        else:  # ranking complessivo - ordinamento semplice
-            base_query += " ORDER BY avg_rating DESC, years_experience DESC, available_slots DESC"
+            base_query += " ORDER BY available_slots DESC, d.id, l.id"
+
+        # Il ranking complessivo ha bisogno di tutti i candidati: ordinamento e limite in NumPy
+        if not composite:
+            base_query += " LIMIT %(limit)s"
+            params["limit"] = data.limit
         
-        base_query += " LIMIT %s"
-        params.append(data.limit)
+        if by_distance and use_index:
+            # Le k sedi più vicine; se i filtri escludono troppi dottori la ricerca si allarga.
+            # Le sedi escluse sono tutte più lontane delle candidate, quindi l'ordine resta esatto.
+            # I dottori senza sedi geolocalizzate non compaiono nell'ordinamento per distanza.
+            k = max(data.limit * 4, 64)
+            while True:
+                nearest = await run_in_threadpool(location_index.nearest, data.latitude, data.longitude, k)
+                params["location_ids"] = [location_id for location_id, _ in nearest]
+                params["distances"] = [distance for _, distance in nearest]
+                raw_result = await execute_query_async(base_query, params)
+                if len(raw_result) >= data.limit or len(nearest) < k:
+                    break
+                k *= 4
+        elif by_distance:
+            # Stessa strategia in SQL: il raggio si allarga finché i risultati non bastano;
+            # l'ultimo tentativo è senza limite di distanza. Anche qui i dottori senza sedi
+            # geolocalizzate non compaiono, così i due percorsi restituiscono gli stessi dottori
+            radius = data.radius_km or PROXIMITY_START_KM
+            while True:
+                proximity, proximity_params = proximity_filter(data.latitude, data.longitude, radius)
+                raw_result = await execute_query_async(base_query.format(proximity=proximity), {**params, **proximity_params})
+                if len(raw_result) >= data.limit or radius is None:
+                    break
+                radius = radius * 4 if radius * 4 < MAX_DISTANCE_KM else None
+        else:
+            raw_result = await execute_query_async(base_query, params)
         
-        raw_result = execute_query(base_query, tuple(params))
+        columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "price", "years_experience", "avg_rating", "review_count", "available_slots", "location_id", "distance_km"]
         
-        # Definizione delle colonne basate sulla presenza della distanza
-        if data.latitude is not None and data.longitude is not None:
-            columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "price", "years_experience", "avg_rating", "review_count", "available_slots", "distance_km"]
+        if composite:
+            # Distanze e punteggi di tutti i candidati in un unico passaggio vettoriale
+            doctors = rank_doctors(raw_result, columns, data.latitude, data.longitude, weights, data.limit)
         else:
-            columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "price", "years_experience", "avg_rating", "review_count", "available_slots", "distance_km"]
+            doctors = [dict(zip(columns, row)) for row in raw_result]
         
         result = []
-        for row in raw_result:
-            doctor = dict(zip(columns, row))
+        for doctor in doctors:
+            doctor.pop("location_id")
+            # Distanza della sede per gli altri ordinamenti, calcolata solo per le righe restituite
+            if has_position and doctor["distance_km"] is None and doctor["latitude"] is not None:
+                doctor["distance_km"] = haversine_km(data.latitude, data.longitude,
+                                                     float(doctor["latitude"]), float(doctor["longitude"]))
             # Arrotondamento dei valori numerici per una migliore visualizzazione
             if doctor.get("avg_rating") is not None:
                 doctor["avg_rating"] = round(float(doctor["avg_rating"]), 1)
@@ -247,7 +348,7 @@ async def get_free_doctors(data: LimitInfo = Depends()) -> List[dict]:
         LIMIT %s;
         """
 
-        raw_result = execute_query(query, (data.limit,))
+        raw_result = await execute_query_async(query, (data.limit,))
 
         columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude"]
         result = [dict(zip(columns, row)) for row in raw_result]
@@ -296,7 +397,7 @@ async def get_doctors_by_specialization(data: DoctorQueryRequest = Depends()) ->
         ORDER BY d.rank DESC
         LIMIT %s;
         """
-        raw_result = execute_query(query, (data.specialization, data.limit))
+        raw_result = await execute_query_async(query, (data.specialization, data.limit))
 
         columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude"]
         result = [dict(zip(columns, row)) for row in raw_result]
@@ -361,7 +462,7 @@ async def get_doctors_by_priceASC(data: DoctorQueryRequest = Depends()) -> List[
         """
         params.append(data.limit)
 
-        raw_result = execute_query(query, tuple(params))
+        raw_result = await execute_query_async(query, tuple(params))
         columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "min_price", "latitude", "longitude"]
         result = [dict(zip(columns, row)) for row in raw_result]
         return result
@@ -425,7 +526,7 @@ async def get_doctors_by_priceDESC(data: DoctorQueryRequest = Depends()) -> List
         """
         params.append(data.limit)
 
-        raw_result = execute_query(query, tuple(params))
+        raw_result = await execute_query_async(query, tuple(params))
         columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "max_price", "latitude", "longitude"]
         result = [dict(zip(columns, row)) for row in raw_result]
         return result
@@ -439,9 +540,11 @@ async def get_doctors_by_location(data: DoctorQueryRequest = Depends()) -> list:
     """
     Recupera dottori entro un raggio specificato dalle coordinate.
     
-    Questa funzione utilizza la formula di Haversine per trovare
+    Questa funzione utilizza l'indice geografico delle sedi per trovare
     i dottori che si trovano entro un raggio specificato dalle coordinate
-    di latitudine e longitudine del paziente.
+    di latitudine e longitudine del paziente, visitando solo le sedi vicine.
+    Se l'indice non è disponibile, la query filtra prima le sedi con un
+    riquadro di coordinate, che usa l'indice idx_location_coordinates.
     
     Args:
         latitude: Coordinate di latitudine
@@ -456,8 +559,47 @@ async def get_doctors_by_location(data: DoctorQueryRequest = Depends()) -> list:
         HTTPException: In caso di errori nei parametri o del database
     """
 
+    if data.latitude is None or data.longitude is None:
+        raise HTTPException(status_code=400, detail="Latitudine e longitudine sono obbligatorie")
+
     try:
-        # Formula di Haversine per calcolare la distanza
+        columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "distance_km"]
+
+        if not await location_index.available():
+            # Senza indice in memoria: riquadro di coordinate sull'indice del database, poi distanza esatta
+            proximity, params = proximity_filter(data.latitude, data.longitude, data.radius_km)
+            query = f"""
+            SELECT DISTINCT 
+                d.id AS doctor_id,
+                u.name,
+                u.surname,
+                d.specialization,
+                d.rank,
+                u.profile_img,
+                l.latitude,
+                l.longitude,
+                l.address,
+                l.city,
+                {distance_sql('l')} AS distance_km
+            FROM location l
+            JOIN appointment a ON a.location_id = l.id
+            JOIN doctor d ON d.id = a.doctor_id
+            JOIN account u ON d.id = u.id
+            WHERE a.status = 'waiting'
+              AND {proximity}
+            ORDER BY distance_km ASC
+            LIMIT %(limit)s;
+            """
+            raw_result = await execute_query_async(query, {**params, "limit": data.limit})
+            return [dict(zip(columns, row)) for row in raw_result]
+
+        # Sedi entro il raggio dall'indice geografico in memoria, già ordinate per distanza
+        # (la scansione avviene nel threadpool, per non bloccare l'event loop con raggi ampi)
+        nearby = await run_in_threadpool(location_index.within, data.latitude, data.longitude, data.radius_km)
+        if not nearby:
+            return []
+
+        # Solo le sedi vicine vengono unite agli appuntamenti liberi
         query = """
         SELECT DISTINCT 
             d.id AS doctor_id,
@@ -470,20 +612,21 @@ async def get_doctors_by_location(data: DoctorQueryRequest = Depends()) -> list:
             l.longitude,
             l.address,
             l.city,
-            (6371 * acos(cos(radians(%s)) * cos(radians(l.latitude)) * cos(radians(l.longitude) - radians(%s)) + sin(radians(%s)) * sin(radians(l.latitude)))) AS distance_km
-        FROM doctor d
+            n.distance_km
+        FROM unnest(%s::int[], %s::float8[]) AS n(location_id, distance_km)
+        JOIN location l ON l.id = n.location_id
+        JOIN appointment a ON a.location_id = l.id
+        JOIN doctor d ON d.id = a.doctor_id
         JOIN account u ON d.id = u.id
-        JOIN appointment a ON a.doctor_id = d.id
-        JOIN location l ON l.id = a.location_id
         WHERE a.status = 'waiting'
-        HAVING distance_km <= %s
-        ORDER BY distance_km ASC
+        ORDER BY n.distance_km ASC
         LIMIT %s;
         """
 
-        raw_result = execute_query(query, (data.latitude, data.longitude, data.latitude, data.radius_km, data.limit))
+        location_ids = [location_id for location_id, _ in nearby]
+        distances = [distance for _, distance in nearby]
+        raw_result = await execute_query_async(query, (location_ids, distances, data.limit))
 
-        columns = ["id", "name", "surname", "specialization", "rank", "profile_img", "latitude", "longitude", "address", "city", "distance_km"]
         result = [dict(zip(columns, row)) for row in raw_result]
         return result
 
@@ -535,7 +678,7 @@ async def get_patient_doctors(data: PatientInfoRequest = Depends()):
         ORDER BY u.name, u.surname;
         """
 
-        raw_result = execute_query(query, (data.patient_id, data.patient_id))
+        raw_result = await execute_query_async(query, (data.patient_id, data.patient_id))
 
         columns = ["id", "name", "surname", "specialization", "email"]
         result = []
@@ -548,3 +691,14 @@ async def get_patient_doctors(data: PatientInfoRequest = Depends()):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Errore nel recupero dei dottori del paziente: {str(e)}")
 
+
+
+@router_show_doctors.get("/location_index/stats")
+async def location_index_stats():
+    """
+    Restituisce lo stato dell'indice geografico delle sedi.
+
+    Returns:
+        dict: Sedi indicizzate, età dell'indice e costo medio delle ricerche
+    """
+    return location_index.stats()
@@ -0,0 +1,289 @@
+"""
+Indice geografico in memoria delle sedi dei dottori.
+
+Le ricerche per vicinanza calcolavano in SQL la distanza di ogni sede
+(per ogni appuntamento collegato) dalla posizione del paziente. Questo
+modulo mantiene nel processo del backend una griglia di celle di
+latitudine/longitudine con le sedi della tabella location:
+- Le ricerche entro un raggio visitano solo le celle che intersecano il
+  riquadro del cerchio di ricerca; se il riquadro comprende più celle di
+  quelle occupate da sedi, si scorrono solo le celle occupate
+- Le ricerche dei k più vicini allargano il raggio finché non trovano
+  abbastanza sedi; quando il riquadro supera le celle occupate si passa
+  direttamente a un'unica scansione di tutte le sedi
+- Se l'indice è disattivato o non caricabile, le ricerche usano il filtro
+  SQL con riquadro di coordinate (vedi proximity.py)
+- L'indice viene ricaricato quando le sedi cambiano (invalidate) e
+  comunque dopo LOCATION_INDEX_TTL secondi, per recepire le modifiche
+  fatte da altri processi
+"""
+
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from backend.connection import execute_query_async
+
+logger = logging.getLogger("backend.router_patient.location_index")
+
+# Configurazione tramite variabili d'ambiente
+LOCATION_INDEX_ENABLED = os.getenv("LOCATION_INDEX_ENABLED", "true").lower() == "true"  # Ricerche per vicinanza in memoria
+LOCATION_INDEX_CELL_DEGREES = float(os.getenv("LOCATION_INDEX_CELL_DEGREES", "0.1"))    # Lato delle celle (circa 11 km di latitudine)
+LOCATION_INDEX_TTL = float(os.getenv("LOCATION_INDEX_TTL", "300"))                     # Secondi prima di un ricaricamento completo
+
+# Raggio medio terrestre e massima distanza possibile sulla superficie (km)
+EARTH_RADIUS_KM = 6371.0
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+# Chilometri per grado di latitudine
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+LOCATIONS_QUERY = """
+SELECT id, doctor_id, latitude, longitude
+FROM location
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+"""
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Distanza tra due punti sulla superficie terrestre (formula dell'emisenoverso).
+
+    Args:
+        lat1, lon1: Coordinate del primo punto in gradi
+        lat2, lon2: Coordinate del secondo punto in gradi
+
+    Returns:
+        float: Distanza in chilometri
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LocationIndex:
+    """
+    Griglia di celle con le sedi dei dottori.
+
+    Ogni sede è conservata come (location_id, doctor_id, latitudine,
+    longitudine) nella cella che la contiene; le longitudini delle celle
+    sono cicliche, così le ricerche attraversano correttamente l'antimeridiano.
+    """
+
+    def __init__(self, enabled: bool, cell_degrees: float, ttl: float):
+        self.enabled = enabled
+        self.cell_degrees = cell_degrees
+        self.ttl = ttl
+        self._lon_cells = max(1, math.ceil(360 / cell_degrees))
+
+        self._cells: Dict[Tuple[int, int], List[tuple]] = {}
+        self._by_id: Dict[int, tuple] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+        # Contatori per le statistiche
+        self._reloads = 0
+        self._queries = 0
+        self._cells_visited = 0
+        self._locations_checked = 0
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Cella che contiene il punto."""
+        return (
+            math.floor((latitude + 90) / self.cell_degrees),
+            math.floor((longitude + 180) / self.cell_degrees) % self._lon_cells
+        )
+
+    def _build(self, rows: list):
+        """Costruisce la griglia dalle righe (id, doctor_id, latitudine, longitudine)."""
+        cells, by_id = {}, {}
+        for location_id, doctor_id, latitude, longitude in rows:
+            entry = (location_id, doctor_id, float(latitude), float(longitude))
+            cells.setdefault(self._cell(entry[2], entry[3]), []).append(entry)
+            by_id[location_id] = entry
+        # Sostituzione in un solo passo: le ricerche in corso vedono la griglia precedente o la nuova
+        self._cells, self._by_id = cells, by_id
+
+    def invalidate(self):
+        """Segnala che le sedi sono cambiate: l'indice sarà ricaricato alla prossima ricerca."""
+        self._stale = True
+
+    def _needs_reload(self) -> bool:
+        return self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def ensure_fresh(self):
+        """
+        Ricarica le sedi dal database se l'indice è scaduto o invalidato.
+
+        Raises:
+            Exception: Errori del database durante il caricamento
+        """
+        if not self._needs_reload():
+            return
+        async with self._lock:
+            # Un'altra richiesta potrebbe aver già ricaricato l'indice durante l'attesa
+            if not self._needs_reload():
+                return
+            self._stale = False
+            try:
+                rows = await execute_query_async(LOCATIONS_QUERY)
+            except Exception:
+                self._stale = True
+                raise
+            self._build(rows or [])
+            self._loaded_at = time.monotonic()
+            self._reloads += 1
+
+    async def available(self) -> bool:
+        """
+        Prepara l'indice per una ricerca.
+
+        Returns:
+            bool: True se l'indice è attivo e aggiornato, False se la ricerca
+                  deve ripiegare sulla query SQL
+        """
+        if not self.enabled:
+            return False
+        try:
+            await self.ensure_fresh()
+            return True
+        except Exception as e:
+            logger.warning("⚠️  Indice delle sedi non disponibile, uso la ricerca SQL: %s", e)
+            return False
+
+    def _box(self, latitude: float, longitude: float, radius_km: float) -> Tuple[range, Optional[set]]:
+        """
+        Righe e colonne della griglia che intersecano il riquadro del cerchio di ricerca.
+
+        Returns:
+            tuple: (righe, insieme delle colonne); None al posto delle colonne
+                   se il riquadro comprende tutte le longitudini
+        """
+        lat_delta = radius_km / KM_PER_DEGREE
+        min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+        rows = range(self._cell(min_lat, 0)[0], self._cell(max_lat, 0)[0] + 1)
+
+        # Ampiezza in longitudine del riquadro, alla latitudine più lontana dall'equatore
+        widest = max(abs(min_lat), abs(max_lat))
+        if widest >= 90 or radius_km >= MAX_DISTANCE_KM:
+            return rows, None
+        lon_delta = lat_delta / math.cos(math.radians(widest))
+        if lon_delta >= 180:
+            return rows, None
+        first_column = math.floor((longitude - lon_delta + 180) / self.cell_degrees)
+        last_column = math.floor((longitude + lon_delta + 180) / self.cell_degrees)
+        if last_column - first_column + 1 >= self._lon_cells:
+            return rows, None
+        return rows, {column % self._lon_cells for column in range(first_column, last_column + 1)}
+
+    def _box_cells(self, rows: range, columns: Optional[set]) -> int:
+        """Numero di celle del riquadro (occupate o no)."""
+        return len(rows) * (self._lon_cells if columns is None else len(columns))
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, float]]:
+        """
+        Sedi entro il raggio indicato.
+
+        Il costo è limitato dal numero di celle occupate: con un riquadro
+        più grande (raggio ampio, posizione lontana dalle sedi) si
+        scorrono le celle occupate invece di tutte quelle del riquadro.
+
+        Args:
+            latitude: Latitudine del centro della ricerca
+            longitude: Longitudine del centro della ricerca
+            radius_km: Raggio di ricerca in chilometri
+
+        Returns:
+            list: Coppie (location_id, distanza in km) ordinate per distanza crescente
+        """
+        self._queries += 1
+        rows, columns = self._box(latitude, longitude, radius_km)
+        cells = self._cells
+        if self._box_cells(rows, columns) > len(cells):
+            candidates = [entries for (row, column), entries in cells.items()
+                          if row in rows and (columns is None or column in columns)]
+        else:
+            candidates = [cells[(row, column)]
+                          for row in rows for column in (columns if columns is not None else range(self._lon_cells))
+                          if (row, column) in cells]
+
+        found = []
+        for entries in candidates:
+            self._cells_visited += 1
+            self._locations_checked += len(entries)
+            for location_id, _, entry_lat, entry_lon in entries:
+                distance = haversine_km(latitude, longitude, entry_lat, entry_lon)
+                if distance <= radius_km:
+                    found.append((location_id, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> List[Tuple[int, float]]:
+        """
+        Le k sedi più vicine.
+
+        Il raggio parte da una cella e raddoppia finché non contiene
+        almeno k sedi: tutte le sedi escluse sono più lontane del raggio,
+        quindi le prime k trovate sono esattamente le più vicine. Quando
+        il riquadro comprende più celle di quelle occupate (posizione
+        lontana da tutte le sedi), le distanze di tutte le sedi vengono
+        calcolate una sola volta invece di ripetere le scansioni.
+
+        Args:
+            latitude: Latitudine del centro della ricerca
+            longitude: Longitudine del centro della ricerca
+            k: Numero di sedi richieste
+
+        Returns:
+            list: Al più k coppie (location_id, distanza in km) ordinate per distanza crescente
+        """
+        k = min(k, len(self._by_id))
+        if k <= 0:
+            return []
+        radius = self.cell_degrees * KM_PER_DEGREE
+        while radius < MAX_DISTANCE_KM and self._box_cells(*self._box(latitude, longitude, radius)) <= len(self._cells):
+            found = self.within(latitude, longitude, radius)
+            if len(found) >= k:
+                return found[:k]
+            radius *= 2
+
+        # Scansione unica di tutte le sedi
+        self._queries += 1
+        self._cells_visited += len(self._cells)
+        self._locations_checked += len(self._by_id)
+        distances = ((location_id, haversine_km(latitude, longitude, entry_lat, entry_lon))
+                     for location_id, _, entry_lat, entry_lon in self._by_id.values())
+        return heapq.nsmallest(k, distances, key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def stats(self) -> dict:
+        """
+        Restituisce lo stato corrente dell'indice.
+
+        Returns:
+            dict: Sedi e celle indicizzate, ricaricamenti e costo medio delle ricerche
+        """
+        return {
+            "enabled": self.enabled,
+            "locations": len(self._by_id),
+            "cells": len(self._cells),
+            "cell_degrees": self.cell_degrees,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+            "stale": self._stale,
+            "reloads": self._reloads,
+            "queries": self._queries,
+            "avg_locations_checked": round(self._locations_checked / self._queries, 1) if self._queries else 0,
+            "avg_cells_visited": round(self._cells_visited / self._queries, 1) if self._queries else 0
+        }
+
+
+# Indice condiviso dal processo
+location_index = LocationIndex(LOCATION_INDEX_ENABLED, LOCATION_INDEX_CELL_DEGREES, LOCATION_INDEX_TTL)
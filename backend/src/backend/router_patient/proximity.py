@@ -0,0 +1,115 @@
+"""
+Costruzione dei filtri di vicinanza per le query SQL.
+
+Un'espressione di distanza che avvolge le colonne (acos, radians, ...)
+costringe il database a calcolarla per ogni sede. Il filtro prodotto
+qui precede il calcolo esatto con un riquadro di latitudine/longitudine
+attorno al cerchio di ricerca:
+
+    l.latitude BETWEEN ... AND ... AND l.longitude BETWEEN ... AND ...
+
+Il confronto diretto sulle colonne può usare l'indice composto
+idx_location_coordinates (latitude, longitude); la distanza con la
+formula dell'emisenoverso viene poi calcolata solo per le sedi nel
+riquadro. I parametri sono nominali (%(nome)s), così il filtro si
+combina con gli altri parametri della query.
+"""
+
+import math
+from typing import Optional, Tuple
+
+from backend.router_patient.location_index import EARTH_RADIUS_KM, KM_PER_DEGREE, MAX_DISTANCE_KM
+
+# Distanza (km) tra la posizione del paziente e una sede, formula dell'emisenoverso
+DISTANCE_SQL = """
+    {earth_radius} * 2 * ASIN(LEAST(1, SQRT(
+        POWER(SIN(RADIANS({alias}.latitude - %(latitude)s) / 2), 2)
+        + COS(RADIANS(%(latitude)s)) * COS(RADIANS({alias}.latitude))
+        * POWER(SIN(RADIANS({alias}.longitude - %(longitude)s) / 2), 2)
+    )))
+"""
+
+
+def distance_sql(alias: str = "l") -> str:
+    """
+    Espressione SQL della distanza in km di una sede dal paziente.
+
+    Args:
+        alias: Alias della tabella location nella query
+
+    Returns:
+        str: Espressione con i parametri %(latitude)s e %(longitude)s
+    """
+    return DISTANCE_SQL.format(earth_radius=EARTH_RADIUS_KM, alias=alias)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Optional[Tuple[float, float, list]]:
+    """
+    Riquadro di latitudine/longitudine che contiene il cerchio di ricerca.
+
+    Args:
+        latitude: Latitudine del centro della ricerca
+        longitude: Longitudine del centro della ricerca
+        radius_km: Raggio di ricerca in chilometri
+
+    Returns:
+        tuple: (latitudine minima, latitudine massima, intervalli di longitudine);
+               gli intervalli sono due se il riquadro attraversa l'antimeridiano,
+               nessuno se comprende tutte le longitudini. None se il cerchio copre
+               l'intera superficie.
+    """
+    if radius_km >= MAX_DISTANCE_KM:
+        return None
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+
+    # Ampiezza in longitudine alla latitudine più lontana dall'equatore
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 90:
+        return min_lat, max_lat, []
+    lon_delta = lat_delta / math.cos(math.radians(widest))
+    if lon_delta >= 180:
+        return min_lat, max_lat, []
+
+    min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def proximity_filter(latitude: float, longitude: float, radius_km: Optional[float],
+                     alias: str = "l") -> Tuple[str, dict]:
+    """
+    Condizione WHERE per le sedi entro il raggio indicato.
+
+    Args:
+        latitude: Latitudine del paziente
+        longitude: Longitudine del paziente
+        radius_km: Raggio di ricerca in km (None = nessun limite)
+        alias: Alias della tabella location nella query
+
+    Returns:
+        tuple: (condizione SQL, parametri nominali); i parametri comprendono
+               sempre latitude e longitude, usati anche da distance_sql()
+    """
+    params = {"latitude": latitude, "longitude": longitude}
+    box = bounding_box(latitude, longitude, radius_km) if radius_km is not None else None
+    if box is None:
+        return "TRUE", params
+
+    min_lat, max_lat, lon_ranges = box
+    params.update({"min_latitude": min_lat, "max_latitude": max_lat, "radius_km": radius_km})
+    conditions = [f"{alias}.latitude BETWEEN %(min_latitude)s AND %(max_latitude)s"]
+    if lon_ranges:
+        ranges = []
+        for index, (min_lon, max_lon) in enumerate(lon_ranges):
+            params[f"min_longitude_{index}"] = min_lon
+            params[f"max_longitude_{index}"] = max_lon
+            ranges.append(f"{alias}.longitude BETWEEN %(min_longitude_{index})s AND %(max_longitude_{index})s")
+        conditions.append(ranges[0] if len(ranges) == 1 else "(" + " OR ".join(ranges) + ")")
+
+    # Distanza esatta solo per le sedi nel riquadro
+    conditions.append(f"{distance_sql(alias).strip()} <= %(radius_km)s")
+    return " AND ".join(conditions), params
@@ -133,3 +133,8 @@ class DoctorQueryRequest(BaseModel):
     max_price: Optional[float] = None      # Prezzo massimo
     sort_by: Optional[str] = None          # Campo di ordinamento
     limit: Optional[int] = 50              # Numero massimo di risultati
+    weight_distance: Optional[float] = None      # Peso della distanza nel ranking complessivo
+    weight_rating: Optional[float] = None        # Peso della valutazione media
+    weight_experience: Optional[float] = None    # Peso degli anni di esperienza
+    weight_price: Optional[float] = None         # Peso del prezzo
+    weight_availability: Optional[float] = None  # Peso degli slot liberi
@@ -0,0 +1,242 @@
+"""
+Ranking complessivo dei dottori con NumPy.
+
+I dottori candidati (già filtrati per specializzazione e prezzo) vengono
+letti una sola volta dal database; distanze e punteggio sono poi calcolati
+in un unico passaggio vettoriale:
+- Distanza dal paziente con la formula dell'emisenoverso su array
+- Ogni criterio normalizzato tra 0 e 1 (1 = migliore) sui candidati:
+  distanza e prezzo più bassi, valutazione (media bayesiana sulle
+  recensioni), esperienza e disponibilità più alte
+- Punteggio = media pesata dei criteri, con pesi configurabili per
+  richiesta (weight_distance, weight_rating, ...) o da variabili d'ambiente
+
+Benchmark: python -m backend.router_patient.ranking
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.router_patient.location_index import EARTH_RADIUS_KM
+
+# Criteri del ranking complessivo
+CRITERIA = ("distance", "rating", "experience", "price", "availability")
+
+# Pesi predefiniti dei criteri
+DEFAULT_WEIGHTS = {
+    "distance": float(os.getenv("RANKING_WEIGHT_DISTANCE", "0.3")),           # Vicinanza al paziente
+    "rating": float(os.getenv("RANKING_WEIGHT_RATING", "0.3")),               # Valutazione media
+    "experience": float(os.getenv("RANKING_WEIGHT_EXPERIENCE", "0.15")),      # Anni di esperienza
+    "price": float(os.getenv("RANKING_WEIGHT_PRICE", "0.15")),                # Prezzo più basso
+    "availability": float(os.getenv("RANKING_WEIGHT_AVAILABILITY", "0.1")),   # Slot liberi
+}
+
+# Recensioni "virtuali" alla media generale: poche recensioni pesano meno di molte
+RANKING_RATING_PRIOR = float(os.getenv("RANKING_RATING_PRIOR", "3"))
+
+
+def resolve_weights(overrides: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, float]:
+    """
+    Combina i pesi predefiniti con quelli indicati nella richiesta.
+
+    Args:
+        overrides: Pesi per criterio (None = valore predefinito)
+
+    Returns:
+        dict: Peso di ogni criterio
+
+    Raises:
+        ValueError: Se un peso è negativo o sono tutti nulli
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for criterion, value in (overrides or {}).items():
+        if value is not None:
+            weights[criterion] = float(value)
+    if any(value < 0 for value in weights.values()):
+        raise ValueError("I pesi del ranking non possono essere negativi")
+    if not any(weights.values()):
+        raise ValueError("Almeno un peso del ranking deve essere positivo")
+    return weights
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Distanze in km da un punto a un insieme di punti (formula dell'emisenoverso).
+
+    Args:
+        latitude: Latitudine del punto di partenza
+        longitude: Longitudine del punto di partenza
+        latitudes: Latitudini dei punti (NaN se mancanti)
+        longitudes: Longitudini dei punti (NaN se mancanti)
+
+    Returns:
+        np.ndarray: Distanze in km (NaN per i punti senza coordinate)
+    """
+    phi1 = np.radians(latitude)
+    phi2 = np.radians(latitudes)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(longitudes - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _normalize(values: np.ndarray, higher_is_better: bool) -> np.ndarray:
+    """
+    Porta i valori tra 0 e 1, dove 1 è il migliore tra i candidati.
+
+    I valori mancanti (NaN) valgono 0; se tutti i valori sono uguali
+    il criterio non distingue i candidati e vale 1 per tutti.
+    """
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.zeros_like(values)
+    low, high = values[valid].min(), values[valid].max()
+    if high == low:
+        normalized = np.ones_like(values)
+    else:
+        normalized = (values - low) / (high - low)
+        if not higher_is_better:
+            normalized = 1 - normalized
+    normalized[~valid] = 0.0
+    return normalized
+
+
+def composite_scores(distance_km: np.ndarray, avg_rating: np.ndarray, review_count: np.ndarray,
+                     years_experience: np.ndarray, price: np.ndarray, available_slots: np.ndarray,
+                     weights: Dict[str, float]) -> np.ndarray:
+    """
+    Punteggio complessivo tra 0 e 1 di ogni candidato.
+
+    Args:
+        distance_km: Distanze dal paziente (NaN se sconosciute)
+        avg_rating: Valutazioni medie
+        review_count: Numero di recensioni
+        years_experience: Anni di esperienza
+        price: Prezzi delle visite
+        available_slots: Slot liberi
+        weights: Peso di ogni criterio (vedi resolve_weights)
+
+    Returns:
+        np.ndarray: Punteggi, uno per candidato
+    """
+    # Media bayesiana: con poche recensioni la valutazione si avvicina alla media generale
+    reviewed = review_count > 0
+    prior = (avg_rating[reviewed] * review_count[reviewed]).sum() / review_count[reviewed].sum() if reviewed.any() else 0.0
+    rating = (avg_rating * review_count + prior * RANKING_RATING_PRIOR) / (review_count + RANKING_RATING_PRIOR)
+
+    criteria = {
+        "distance": _normalize(distance_km, higher_is_better=False),
+        "rating": _normalize(rating, higher_is_better=True),
+        "experience": _normalize(years_experience, higher_is_better=True),
+        "price": _normalize(price, higher_is_better=False),
+        "availability": _normalize(np.log1p(available_slots), higher_is_better=True),
+    }
+    # Senza distanze (posizione del paziente assente) il criterio non partecipa
+    active = {name: weight for name, weight in weights.items() if not (name == "distance" and np.isnan(distance_km).all())}
+    total = sum(active.values()) or 1.0
+    scores = np.zeros(len(distance_km))
+    for name, weight in active.items():
+        if weight:
+            scores += weight * criteria[name]
+    return scores / total
+
+
+def rank_doctors(rows: List[tuple], columns: Sequence[str], latitude: Optional[float], longitude: Optional[float],
+                 weights: Dict[str, float], limit: int) -> List[dict]:
+    """
+    Ordina i candidati per punteggio complessivo.
+
+    Le colonne numeriche vengono convertite in array una sola volta; i
+    dizionari del risultato sono costruiti solo per i candidati restituiti.
+
+    Args:
+        rows: Righe dei candidati, con le colonne latitude, longitude, avg_rating,
+              review_count, years_experience, price e available_slots (float o None)
+        columns: Nomi delle colonne delle righe
+        latitude: Latitudine del paziente (opzionale)
+        longitude: Longitudine del paziente (opzionale)
+        weights: Peso di ogni criterio (vedi resolve_weights)
+        limit: Numero massimo di risultati
+
+    Returns:
+        list: I migliori candidati come dizionari, con distance_km e score,
+              in ordine di punteggio decrescente
+    """
+    if not rows:
+        return []
+
+    def column(name: str) -> np.ndarray:
+        # None diventa NaN nella conversione a float
+        index = columns.index(name)
+        return np.array([row[index] for row in rows], dtype=float)
+
+    if latitude is not None and longitude is not None:
+        distance = haversine_km(latitude, longitude, column("latitude"), column("longitude"))
+    else:
+        distance = np.full(len(rows), np.nan)
+
+    scores = composite_scores(
+        distance, np.nan_to_num(column("avg_rating")), np.nan_to_num(column("review_count")),
+        column("years_experience"), column("price"), np.nan_to_num(column("available_slots")), weights
+    )
+
+    # Selezione dei migliori senza ordinare tutti i candidati
+    if limit < len(scores):
+        top = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+
+    ranked = []
+    for index in top:
+        doctor = dict(zip(columns, rows[index]))
+        doctor["distance_km"] = None if np.isnan(distance[index]) else float(distance[index])
+        doctor["score"] = round(float(scores[index]), 4)
+        ranked.append(doctor)
+    return ranked
+
+
+if __name__ == "__main__":
+    # Benchmark del ranking su candidati sintetici
+    import time
+    from backend.router_patient.location_index import haversine_km as haversine
+
+    rng = np.random.default_rng(42)
+    weights = resolve_weights()
+    columns = ["id", "latitude", "longitude", "avg_rating", "review_count", "years_experience", "price", "available_slots"]
+    for count in (1_000, 10_000, 50_000, 100_000):
+        # Righe come restituite dal database (float, None per le sedi senza coordinate)
+        rows = list(zip(
+            range(count),
+            *(values.tolist() for values in (
+                rng.uniform(36, 47, count), rng.uniform(6, 19, count), rng.uniform(1, 5, count),
+                rng.integers(0, 200, count).astype(float), rng.integers(0, 40, count).astype(float),
+                rng.uniform(30, 200, count), rng.integers(0, 50, count).astype(float)
+            ))
+        ))
+        arrays = {name: np.array([row[i] for row in rows], dtype=float) for i, name in enumerate(columns)}
+
+        runs = 20
+        started = time.perf_counter()
+        for _ in range(runs):
+            distance = haversine_km(45.07, 7.68, arrays["latitude"], arrays["longitude"])
+            composite_scores(distance, arrays["avg_rating"], arrays["review_count"], arrays["years_experience"],
+                             arrays["price"], arrays["available_slots"], weights)
+        vectorized = (time.perf_counter() - started) / runs
+
+        started = time.perf_counter()
+        for _ in range(runs):
+            rank_doctors(rows, columns, 45.07, 7.68, weights, 50)
+        complete = (time.perf_counter() - started) / runs
+
+        # Confronto con lo stesso calcolo riga per riga in Python puro
+        started = time.perf_counter()
+        python_scores = []
+        for row in rows:
+            python_scores.append(haversine(45.07, 7.68, row[1], row[2]))
+        loop = time.perf_counter() - started
+
+        print(f"{count:>7} candidati: distanze e punteggi {vectorized * 1e3:6.2f} ms, "
+              f"ranking dalle righe {complete * 1e3:6.2f} ms "
+              f"(solo distanze riga per riga in Python: {loop * 1e3:6.2f} ms)")
@@ -0,0 +1,242 @@
+"""
+Benchmark ed equivalenza della ricerca dei dottori con ranking (get_ranked_doctors).
+
+Con --seed crea (o ricrea) un database di prova dallo schema
+(database/init.sql) con 10k dottori, 1-2 sedi ciascuno e 5M appuntamenti
+(20% liberi, 10% prenotati, 60% completati, 10% cancellati, recensioni sul
+30% dei completati). Confronta poi i risultati di get_ranked_doctors con un
+riferimento calcolato direttamente dalle tabelle (prezzo minimo e numero
+degli slot liberi, recensioni per dottore) e riporta la mediana dei tempi
+per ciascun caso:
+
+    python -m backend.router_patient.ranking_benchmark --host localhost --port 5433 --seed
+    python -m backend.router_patient.ranking_benchmark --host localhost --port 5433 --runs 10
+"""
+
+import os
+import time
+import asyncio
+import pathlib
+import argparse
+import statistics
+
+import numpy as np
+import psycopg2
+
+# Senza modello non servono preriscaldamento ed embedding all'avvio
+os.environ.setdefault("LLM_WARMUP", "false")
+os.environ.setdefault("LLM_EMBEDDING_ROUTER", "false")
+
+from backend import connection
+from backend.router_patient.doctors import get_ranked_doctors
+from backend.router_patient.pydantic.schemas import DoctorQueryRequest
+
+# Schema del database, cercato risalendo dalla cartella del modulo
+SCHEMA_FILE = next((parent / "database" / "init.sql" for parent in pathlib.Path(__file__).resolve().parents
+                    if (parent / "database" / "init.sql").exists()), None)
+
+# Casi misurati: (descrizione, parametri della richiesta)
+CASES = [
+    ("complessivo, tutti (con posizione)", dict(latitude=45.07, longitude=7.68)),
+    ("complessivo, specializzazione", dict(latitude=45.07, longitude=7.68, specialization="Spec3")),
+    ("complessivo, specializzazione + prezzo 40-60",
+     dict(latitude=45.07, longitude=7.68, specialization="Spec3", min_price=40, max_price=60)),
+    ("rating", dict(sort_by="rating")),
+    ("prezzo 40-60, ordinamento per prezzo", dict(sort_by="price", min_price=40, max_price=60)),
+    ("disponibilità, specializzazione", dict(sort_by="availability", specialization="Spec7")),
+    ("distanza", dict(latitude=45.07, longitude=7.68, sort_by="distance")),
+]
+
+# Passi di popolamento del database di prova
+SEED_STEPS = [
+    # Dottori e pazienti
+    """INSERT INTO account (name, surname, email, password, sex, role, created_at)
+       SELECT 'Nome' || g, 'Cognome' || g, 'u' || g || '@bench.it', 'Password1', 'M',
+              CASE WHEN g <= %(doctors)s THEN 'doctor' ELSE 'patient' END,
+              NOW() - (random() * 30 || ' years')::interval
+       FROM generate_series(1, %(doctors)s * 3) g""",
+    "INSERT INTO doctor (id, specialization) SELECT g, 'Spec' || (g %% 20) FROM generate_series(1, %(doctors)s) g",
+    "INSERT INTO patient (id) SELECT g FROM generate_series(%(doctors)s + 1, %(doctors)s * 3) g",
+    # 1-2 sedi per dottore in Italia
+    """INSERT INTO location (doctor_id, address, city, latitude, longitude)
+       SELECT d, 'Via ' || d || '/' || k, 'Città', 36 + random() * 11, 6 + random() * 13
+       FROM generate_series(1, %(doctors)s) d, generate_series(1, 2) k WHERE k = 1 OR d %% 2 = 0""",
+    "CREATE TEMP TABLE first_location AS SELECT doctor_id, MIN(id) AS location_id FROM location GROUP BY doctor_id",
+    "ALTER TABLE first_location ADD PRIMARY KEY (doctor_id)",
+    # Appuntamenti: 20% liberi, 10% prenotati, 60% completati, 10% cancellati
+    """INSERT INTO appointment (doctor_id, patient_id, location_id, date_time, price, status)
+       SELECT doctor_id, CASE WHEN status = 'waiting' THEN NULL ELSE %(doctors)s + 1 + (g %% (%(doctors)s * 2)) END,
+              location_id,
+              NOW() + ((CASE WHEN status IN ('waiting', 'booked') THEN 1 ELSE -1 END) * (1 + g %% 300) || ' days')::interval,
+              round((30 + random() * 170)::numeric, 2), status
+       FROM (
+           SELECT g, 1 + (g::bigint * 7919) %% %(doctors)s AS doctor_id,
+                  CASE WHEN r < 0.2 THEN 'waiting' WHEN r < 0.3 THEN 'booked'
+                       WHEN r < 0.9 THEN 'completed' ELSE 'cancelled' END AS status
+           FROM (SELECT g, random() AS r FROM generate_series(1, %(appointments)s) g) numbers
+       ) slots
+       JOIN first_location USING (doctor_id)""",
+    # Recensioni per il 30% degli appuntamenti completati
+    """INSERT INTO review (appointment_id, stars, report)
+       SELECT id, 1 + (random() * 4)::int, 'ok' FROM appointment WHERE status = 'completed' AND random() < 0.3""",
+    """INSERT INTO doctor_rating (doctor_id, review_count, star_sum, avg_rating, last_review_at)
+       SELECT a.doctor_id, COUNT(r.stars), SUM(r.stars), AVG(r.stars), MAX(r.reviewed_at)
+       FROM review r JOIN appointment a ON a.id = r.appointment_id
+       WHERE r.stars IS NOT NULL GROUP BY a.doctor_id""",
+    "UPDATE doctor d SET rank = dr.avg_rating / 5 FROM doctor_rating dr WHERE dr.doctor_id = d.id",
+]
+
+
+def seed_database(doctors: int, appointments: int):
+    """
+    Ricrea il database di prova (connection.DB_CONFIG) e lo popola.
+
+    Args:
+        doctors: Numero di dottori
+        appointments: Numero di appuntamenti
+    """
+    server = {key: value for key, value in connection.DB_CONFIG.items() if key != "dbname"}
+    dbname = connection.DB_CONFIG["dbname"]
+
+    admin = psycopg2.connect(dbname="postgres", **server)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+        cursor.execute(f'CREATE DATABASE "{dbname}"')
+    admin.close()
+
+    conn = psycopg2.connect(**connection.DB_CONFIG)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        schema = SCHEMA_FILE.read_text()
+        cursor.execute(schema[schema.index("-- Tabella account"):])
+        for step in SEED_STEPS:
+            started = time.perf_counter()
+            cursor.execute(step, {"doctors": doctors, "appointments": appointments})
+            print(f"   {time.perf_counter() - started:6.1f}s {' '.join(step.split()[:3])}")
+        cursor.execute("VACUUM ANALYZE")
+    conn.close()
+
+
+def load_reference() -> dict:
+    """
+    Dati per il riferimento, letti direttamente dalle tabelle.
+
+    Returns:
+        dict: Slot liberi e recensioni per dottore, specializzazioni, sedi
+    """
+    query = connection.execute_query
+    slots, reviews = {}, {}
+    for doctor_id, price in query("SELECT doctor_id, price::float8 FROM appointment WHERE status = 'waiting'"):
+        slots.setdefault(doctor_id, []).append(price)
+    for doctor_id, stars in query("""
+        SELECT a.doctor_id, r.stars FROM review r JOIN appointment a ON a.id = r.appointment_id
+        WHERE r.stars IS NOT NULL
+    """):
+        reviews.setdefault(doctor_id, []).append(stars)
+    return {
+        "slots": slots,
+        "reviews": reviews,
+        "specializations": dict(query("SELECT id, specialization FROM doctor")),
+        "locations": query("SELECT id, doctor_id, latitude::float8, longitude::float8 FROM location"),
+    }
+
+
+def expected_rows(reference: dict, params: dict) -> dict:
+    """
+    Righe attese per una richiesta: (dottore, sede) -> (prezzo, slot, recensioni, media).
+    """
+    min_price, max_price = params.get("min_price"), params.get("max_price")
+    specialization = params.get("specialization")
+    rows = {}
+    for location_id, doctor_id, _, _ in reference["locations"]:
+        if specialization and reference["specializations"][doctor_id] != specialization:
+            continue
+        prices = [price for price in reference["slots"].get(doctor_id, [])
+                  if (min_price is None or price >= min_price) and (max_price is None or price <= max_price)]
+        if (min_price is not None or max_price is not None) and not prices:
+            continue
+        stars = reference["reviews"].get(doctor_id, [])
+        # La media è memorizzata come REAL in doctor_rating: stesso arrotondamento della risposta
+        average = round(float(np.float32(sum(stars) / len(stars))), 1) if stars else 0.0
+        rows[(doctor_id, location_id)] = (min(prices) if prices else 50.0, len(prices), len(stars), average)
+    return rows
+
+
+def returned_rows(reference: dict, doctors: list) -> dict:
+    """Righe restituite da get_ranked_doctors, con la sede riconosciuta dalle coordinate."""
+    locations = {(latitude, longitude): location_id for location_id, _, latitude, longitude in reference["locations"]}
+    return {
+        (doctor["id"], locations.get((doctor["latitude"], doctor["longitude"]))):
+            (doctor["price"], doctor["available_slots"], doctor["review_count"], doctor["avg_rating"])
+        for doctor in doctors
+    }
+
+
+async def timed(params: dict, runs: int):
+    """Esegue la richiesta runs volte; restituisce l'ultimo risultato e la mediana in ms."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await get_ranked_doctors(DoctorQueryRequest(**params))
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times) * 1e3
+
+
+async def run_benchmark(runs: int) -> bool:
+    """
+    Verifica l'equivalenza con il riferimento e misura i tempi dei casi.
+
+    Args:
+        runs: Ripetizioni per caso (viene riportata la mediana)
+
+    Returns:
+        bool: True se tutti i risultati coincidono con il riferimento
+    """
+    reference = load_reference()
+    print(f"📊 {len(reference['specializations'])} dottori, {len(reference['locations'])} sedi, "
+          f"{sum(map(len, reference['slots'].values()))} slot liberi")
+
+    equivalent = True
+    print(f"\n{'caso':47s} {'righe':>7s} {'esito':>8s} {'ms':>9s}  (mediana di {runs}, limit predefinito)")
+    for name, params in CASES:
+        full, _ = await timed(dict(params, limit=100000), 1)
+        got = returned_rows(reference, full)
+        expected = expected_rows(reference, params)
+        if params.get("sort_by") == "distance":
+            # Per distanza vengono restituite solo le sedi entro il raggio di ricerca
+            expected = {key: value for key, value in expected.items() if key in got}
+
+        # Con un limite si ottiene un prefisso del risultato completo
+        limited, elapsed = await timed(params, runs)
+        prefix = [doctor["id"] for doctor in limited] == [doctor["id"] for doctor in full[:len(limited)]]
+
+        same = got == expected and len(got) == len(full) and prefix
+        equivalent &= same
+        print(f"{name:47s} {len(full):7d} {'OK' if same else 'DIVERSO':>8s} {elapsed:9.1f}")
+        if not same:
+            differences = [(key, got.get(key), expected.get(key)) for key in set(got) | set(expected)
+                           if got.get(key) != expected.get(key)]
+            print(f"   ❌ {len(differences)} righe diverse, ad esempio: {differences[:3]}")
+    return equivalent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark di get_ranked_doctors su un database di prova")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5433)
+    parser.add_argument("--database", default="healthbench")
+    parser.add_argument("--seed", action="store_true", help="Ricrea e popola il database di prova")
+    parser.add_argument("--doctors", type=int, default=10_000)
+    parser.add_argument("--appointments", type=int, default=5_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    connection.DB_CONFIG.update(host=args.host, port=args.port, dbname=args.database)
+    if args.seed:
+        print(f"🌱 Creazione di {args.database}: {args.doctors} dottori, {args.appointments} appuntamenti")
+        seed_database(args.doctors, args.appointments)
+
+    ok = asyncio.run(run_benchmark(args.runs))
+    print(f"\n{'✅ Risultati equivalenti al riferimento' if ok else '❌ Risultati diversi dal riferimento'}")
+    raise SystemExit(0 if ok else 1)
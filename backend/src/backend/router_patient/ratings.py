@@ -0,0 +1,101 @@
+"""
+Valutazioni aggregate dei dottori.
+
+Le ricerche dei dottori calcolavano AVG(stars) e COUNT(*) unendo
+appuntamenti e recensioni a ogni richiesta. La tabella doctor_rating
+conserva per ogni dottore numero di recensioni, somma delle stelle,
+media e data dell'ultima recensione:
+- review_appointment aggiorna l'aggregato in modo incrementale, nella
+  stessa transazione della recensione (apply_review)
+- doctor.rank viene mantenuto uguale a media / 5, così anche gli
+  endpoint ordinati per rank riflettono le recensioni
+- rebuild_ratings() ricalcola tutto dalle recensioni, ad esempio dopo
+  un'importazione di dati:
+
+    python -m backend.router_patient.ratings
+"""
+
+from typing import Optional
+
+from backend.connection import transaction_async
+
+# Aggiornamento incrementale: le variazioni vengono sommate ai valori esistenti
+APPLY_REVIEW_QUERY = """
+INSERT INTO doctor_rating (doctor_id, review_count, star_sum, avg_rating, last_review_at)
+VALUES (%(doctor_id)s, %(count_delta)s, %(stars_delta)s,
+        %(stars_delta)s::real / NULLIF(%(count_delta)s, 0), CURRENT_TIMESTAMP)
+ON CONFLICT (doctor_id) DO UPDATE SET
+    review_count = doctor_rating.review_count + EXCLUDED.review_count,
+    star_sum = doctor_rating.star_sum + EXCLUDED.star_sum,
+    avg_rating = (doctor_rating.star_sum + EXCLUDED.star_sum)::real
+                 / NULLIF(doctor_rating.review_count + EXCLUDED.review_count, 0),
+    last_review_at = CURRENT_TIMESTAMP
+RETURNING avg_rating
+"""
+
+UPDATE_RANK_QUERY = """
+UPDATE doctor SET rank = %(avg_rating)s / 5 WHERE id = %(doctor_id)s
+"""
+
+# Ricalcolo completo dalle recensioni (solo quelle con stelle)
+REBUILD_QUERIES = (
+    "DELETE FROM doctor_rating",
+    """
+    INSERT INTO doctor_rating (doctor_id, review_count, star_sum, avg_rating, last_review_at)
+    SELECT a.doctor_id, COUNT(r.stars), SUM(r.stars), AVG(r.stars), MAX(r.reviewed_at)
+    FROM review r
+    JOIN appointment a ON a.id = r.appointment_id
+    WHERE r.stars IS NOT NULL
+    GROUP BY a.doctor_id
+    """,
+    """
+    UPDATE doctor d
+    SET rank = dr.avg_rating / 5
+    FROM doctor_rating dr
+    WHERE dr.doctor_id = d.id
+    """,
+)
+
+
+async def apply_review(tx, doctor_id: int, old_stars: Optional[int], new_stars: Optional[int]):
+    """
+    Aggiorna l'aggregato di un dottore dopo l'inserimento o la modifica di una recensione.
+
+    Va chiamata nella stessa transazione che scrive la recensione, così
+    recensione e aggregato vengono confermati o annullati insieme.
+
+    Args:
+        tx: Transazione aperta con transaction_async()
+        doctor_id: ID del dottore recensito
+        old_stars: Stelle della recensione precedente (None se nuova o senza stelle)
+        new_stars: Stelle della recensione salvata (None se senza stelle)
+    """
+    count_delta = (new_stars is not None) - (old_stars is not None)
+    stars_delta = (new_stars or 0) - (old_stars or 0)
+    rows = await tx.execute(APPLY_REVIEW_QUERY, {
+        "doctor_id": doctor_id, "count_delta": count_delta, "stars_delta": stars_delta
+    })
+    avg_rating = rows[0][0] if rows else None
+    if avg_rating is not None:
+        await tx.execute(UPDATE_RANK_QUERY, {"doctor_id": doctor_id, "avg_rating": avg_rating})
+
+
+async def rebuild_ratings() -> int:
+    """
+    Ricalcola gli aggregati di tutti i dottori dalle recensioni.
+
+    Returns:
+        int: Numero di dottori con almeno una recensione
+    """
+    async with transaction_async() as tx:
+        for query in REBUILD_QUERIES:
+            await tx.execute(query)
+        rows = await tx.execute("SELECT COUNT(*) FROM doctor_rating")
+    return rows[0][0]
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    count = asyncio.run(rebuild_ratings())
+    print(f"✅ Valutazioni ricalcolate per {count} dottori")
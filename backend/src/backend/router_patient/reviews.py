@@ -13,7 +13,8 @@ gli appuntamenti completati, contribuendo al sistema di ranking.
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List
-from backend.connection import execute_query
+from backend.connection import execute_query_async, transaction_async
+from backend.router_patient.ratings import apply_review
 from backend.router_patient.pydantic.schemas import Appointment, ReviewRequest, PatientInfoRequest
 
 # Router per la gestione delle recensioni dei pazienti
@@ -65,7 +66,7 @@ async def appointments_to_rank(data: PatientInfoRequest = Depends()):
                 '''
         
         # Esecuzione della query per recuperare gli appuntamenti
-        raw_result = execute_query(query, (data.patient_id,), commit = True)
+        raw_result = await execute_query_async(query, (data.patient_id,), commit = True)
         
         # Formattazione dei risultati in oggetti Appointment
         appointments: List[Appointment] = [
@@ -98,7 +99,8 @@ async def review_appointment(data: ReviewRequest):
     
     Questa funzione permette ai pazienti di valutare i dottori dopo
     gli appuntamenti completati. Se una recensione esiste già,
-    viene aggiornata; altrimenti ne viene creata una nuova.
+    viene aggiornata; altrimenti ne viene creata una nuova. Nella stessa
+    transazione viene aggiornata la valutazione aggregata del dottore.
     
     Args:
         data: Oggetto contenente i dati della recensione (ID appuntamento, stelle, commento)
@@ -110,39 +112,50 @@ async def review_appointment(data: ReviewRequest):
         HTTPException: In caso di appuntamento non trovato, non completato o errori
     """
     try:
-        # Verifica che l'appuntamento esista e sia completato
-        query = """
-            SELECT id FROM appointment WHERE id = %s AND status = 'completed'
-        """
-        raw_result = execute_query(query, (data.appointment_id,))
-        
-        if not raw_result:
-            raise HTTPException(status_code=404, detail="Appuntamento non trovato o non completato.")
-
-        # Verifica se esiste già una recensione per questo appuntamento
-        check_review_query = """
-            SELECT id FROM review WHERE appointment_id = %s
-        """
-        review_result = execute_query(check_review_query, (data.appointment_id,))
-        
-        if review_result:
-            # Aggiornamento della recensione esistente
-            update_query = """
-                UPDATE review
-                SET stars = %s, report = %s
-                WHERE appointment_id = %s
+        # Recensione e valutazione aggregata del dottore vengono salvate insieme
+        async with transaction_async() as tx:
+            # Verifica che l'appuntamento esista e sia completato; il lock serializza
+            # le recensioni concorrenti dello stesso appuntamento
+            query = """
+                SELECT doctor_id FROM appointment WHERE id = %s AND status = 'completed' FOR UPDATE
             """
-            execute_query(update_query, (data.stars, data.report, data.appointment_id), commit=True)
-        else:
-            # Creazione di una nuova recensione
-            insert_query = """
-                INSERT INTO review (appointment_id, stars, report)
-                VALUES (%s, %s, %s)
+            raw_result = await tx.execute(query, (data.appointment_id,))
+            
+            if not raw_result:
+                raise HTTPException(status_code=404, detail="Appuntamento non trovato o non completato.")
+            doctor_id = raw_result[0][0]
+
+            # Verifica se esiste già una recensione per questo appuntamento
+            check_review_query = """
+                SELECT id, stars FROM review WHERE appointment_id = %s
             """
-            execute_query(insert_query, (data.appointment_id, data.stars, data.report), commit=True)
+            review_result = await tx.execute(check_review_query, (data.appointment_id,))
+            
+            if review_result:
+                # Aggiornamento della recensione esistente
+                update_query = """
+                    UPDATE review
+                    SET stars = %s, report = %s, reviewed_at = CURRENT_TIMESTAMP
+                    WHERE appointment_id = %s
+                """
+                await tx.execute(update_query, (data.stars, data.report, data.appointment_id))
+                old_stars = review_result[0][1]
+            else:
+                # Creazione di una nuova recensione
+                insert_query = """
+                    INSERT INTO review (appointment_id, stars, report)
+                    VALUES (%s, %s, %s)
+                """
+                await tx.execute(insert_query, (data.appointment_id, data.stars, data.report))
+                old_stars = None
+
+            # Aggiornamento incrementale della valutazione del dottore
+            await apply_review(tx, doctor_id, old_stars, data.stars)
 
         return {"message": "Recensione inviata con successo."}
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Errore nell'invio della recensione: {str(e)}")
 
@@ -185,7 +198,7 @@ async def get_patient_reviews(data: PatientInfoRequest = Depends()):
             ORDER BY a.date_time DESC
         """
 
-        raw_result = execute_query(query, (data.patient_id,))
+        raw_result = await execute_query_async(query, (data.patient_id,))
         
         # Formattazione dei risultati con conversione delle date
         reviews = [
@@ -15,7 +15,7 @@ e gestisce l'integrità referenziale durante le operazioni.
 
 from fastapi import APIRouter, HTTPException, Response, Depends, Query
 from datetime import datetime, timedelta
-from backend.connection import execute_query
+from backend.connection import execute_query_async, transaction_async
 from pydantic import EmailStr
 from backend.router_profile.pydantic.schemas import AccountInfo, ChangePasswordRequest, PreResetRequest, ResetPasswordRequest, PreferencesPayload, DeleteRequest
 from backend.router_profile.cookies_login import create_access_token, create_refresh_token, get_current_account
@@ -82,7 +82,7 @@ async def delete_account(data: DeleteRequest):
 
         # Verifica della password per confermare l'identità
         query = """SELECT password FROM "account" WHERE email = %s"""
-        result = execute_query(query, (data.email,))
+        result = await execute_query_async(query, (data.email,))
         
         if not result:
             raise HTTPException(status_code=404, detail="Utente non trovato")
@@ -92,7 +92,7 @@ async def delete_account(data: DeleteRequest):
 
         # Recupero dell'ID dell'account per le operazioni di eliminazione
         select_id_account = """SELECT id FROM "account" WHERE email = %s"""
-        res = execute_query(select_id_account, (data.email,))
+        res = await execute_query_async(select_id_account, (data.email,))
         account_id = res[0][0]
 
         # Eliminazione in ordine corretto per mantenere l'integrità referenziale
@@ -100,9 +100,11 @@ async def delete_account(data: DeleteRequest):
         delete_doctor = "DELETE FROM doctor WHERE id_doctor = %s"
         delete_account = """DELETE FROM "account" WHERE id = %s"""
 
-        execute_query(delete_patient, (account_id,), commit=True)
-        execute_query(delete_doctor, (account_id,), commit=True)
-        execute_query(delete_account, (account_id,), commit=True)
+        # Le tre eliminazioni avvengono in un'unica transazione
+        async with transaction_async() as tx:
+            await tx.execute(delete_patient, (account_id,))
+            await tx.execute(delete_doctor, (account_id,))
+            await tx.execute(delete_account, (account_id,))
 
         return {"message": "Account eliminato con successo"}
 
@@ -173,7 +175,7 @@ async def change_password(data: ChangePasswordRequest):
 
         # Verifica della password attuale
         query = "SELECT password FROM account WHERE email = %s"
-        result = execute_query(query, (data.account_email,))
+        result = await execute_query_async(query, (data.account_email,))
         
         if not result:
             raise HTTPException(status_code=405, detail="Utente non trovato")
@@ -189,7 +191,7 @@ async def change_password(data: ChangePasswordRequest):
             password_changed_at = CURRENT_TIMESTAMP
         WHERE email = %s
         """
-        execute_query(update_query, (hashed_password, data.account_email), commit=True)
+        await execute_query_async(update_query, (hashed_password, data.account_email), commit=True)
 
         return {"message": "Password modificata con successo"}
 
@@ -220,7 +222,7 @@ async def request_password_reset(data: PreResetRequest):
     try:
         # Verifica dell'esistenza dell'account
         query = "SELECT id FROM account WHERE email = %s"
-        result = execute_query(query, (data.email,))
+        result = await execute_query_async(query, (data.email,))
         
         if not result:
             # Non rivelare se l'email esiste o meno per motivi di sicurezza
@@ -275,7 +277,7 @@ async def reset_password(data: ResetPasswordRequest):
 
         # Hash e aggiornamento della nuova password
         hashed = pwd_context.hash(data.new_password)
-        execute_query("UPDATE account SET password = %s WHERE email = %s", (hashed, email), commit=True)
+        await execute_query_async("UPDATE account SET password = %s WHERE email = %s", (hashed, email), commit=True)
         return {"message": "Password reimpostata con successo"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Errore durante il reset password: {str(e)}")
@@ -309,10 +311,10 @@ async def get_preferences(data: AccountInfo = Depends()):
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """
-        execute_query(create_table, commit=True)
+        await execute_query_async(create_table, commit=True)
 
         # Recupero delle preferenze esistenti o restituzione di valori di default
-        res = execute_query("SELECT notifications, privacy FROM account_preferences WHERE account_id = %s", (data.account_id,))
+        res = await execute_query_async("SELECT notifications, privacy FROM account_preferences WHERE account_id = %s", (data.account_id,))
         if not res:
             return {
                 "notifications": {"reminders": True, "testResults": True, "newsletter": False}, 
@@ -351,7 +353,7 @@ async def save_preferences(data: PreferencesPayload = None):
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """
-        execute_query(create_table, commit=True)
+        await execute_query_async(create_table, commit=True)
 
         # Upsert delle preferenze (inserimento o aggiornamento)
         upsert = """
@@ -362,7 +364,7 @@ async def save_preferences(data: PreferencesPayload = None):
                 privacy = EXCLUDED.privacy,
                 updated_at = CURRENT_TIMESTAMP
         """
-        execute_query(upsert, (data.account_id, data.notifications, data.privacy), commit=True)
+        await execute_query_async(upsert, (data.account_id, data.notifications, data.privacy), commit=True)
         return {"message": "Preferenze salvate con successo"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Errore nel salvataggio preferenze: {str(e)}")
\ No newline at end of file
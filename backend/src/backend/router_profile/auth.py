@@ -15,7 +15,7 @@ incluso il blocco temporaneo degli account dopo tentativi falliti.
 
 from fastapi import APIRouter, HTTPException, Response
 from backend.router_profile.pydantic.schemas import LoginRequest
-from backend.connection import execute_query
+from backend.connection import execute_query_async
 from backend.router_profile.cookies_login import create_access_token, create_refresh_token
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
@@ -59,7 +59,7 @@ async def login(data: LoginRequest, response: Response):
         FROM account
         WHERE email = %s
         """
-        results = execute_query(query_account, (data.email,))
+        results = await execute_query_async(query_account, (data.email,))
         if not results:
             raise HTTPException(status_code=404, detail="Account non registrato")
 
@@ -87,14 +87,14 @@ async def login(data: LoginRequest, response: Response):
         # 3) Verifica della password con bcrypt
         if not pwd_context.verify(data.password, db_password):
             # Incrementa i tentativi falliti e aggiorna il timestamp
-            execute_query(
+            await execute_query_async(
                 "UPDATE account SET failed_attempts = failed_attempts + 1, last_login_attempt = CURRENT_TIMESTAMP WHERE email = %s",
                 (data.email,), commit=True
             )
             raise HTTPException(status_code=401, detail="Password errata")
 
         # Reset dei tentativi falliti dopo login riuscito
-        execute_query(
+        await execute_query_async(
             "UPDATE account SET failed_attempts = 0, last_login_attempt = CURRENT_TIMESTAMP WHERE email = %s",
             (data.email,), commit=True
         )
@@ -103,10 +103,10 @@ async def login(data: LoginRequest, response: Response):
         specialization = None
         addresses = []
         if role == "doctor":
-            res_doc = execute_query("SELECT specialization FROM doctor WHERE id = %s", (account_id,))
+            res_doc = await execute_query_async("SELECT specialization FROM doctor WHERE id = %s", (account_id,))
             specialization = res_doc[0][0] if res_doc else None
 
-            res_loc = execute_query("""
+            res_loc = await execute_query_async("""
                 SELECT address, latitude, longitude
                 FROM location
                 WHERE doctor_id = %s
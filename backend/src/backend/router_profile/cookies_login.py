@@ -18,7 +18,7 @@ from fastapi import Depends, Cookie, APIRouter, HTTPException
 import os
 import base64
 from dotenv import load_dotenv
-from backend.connection import execute_query
+from backend.connection import execute_query, execute_query_async
 
 # Carica le variabili d'ambiente dal file .env
 load_dotenv()
@@ -172,7 +172,7 @@ async def get_me(account=Depends(get_current_account)):
     try:
         # Recupero dell'immagine del profilo dal database
         query = "SELECT profile_img FROM account WHERE id = %s"
-        result = execute_query(query, (account["id"],))
+        result = await execute_query_async(query, (account["id"],))
 
         # Conversione dell'immagine in base64 se presente
         profile_img_base64 = None
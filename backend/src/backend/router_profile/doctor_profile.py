@@ -16,7 +16,8 @@ incluso il blocco temporaneo degli account dopo tentativi falliti.
 from fastapi import APIRouter, Depends, HTTPException, Response
 from backend.router_profile.pydantic.schemas import DoctorInfoRequest, RegisterDoctorRequest, LoginRequest, ModifyProfileRequest
 from backend.router_profile.account_profile import validate_password
-from backend.connection import execute_query
+from backend.connection import execute_query_async
+from backend.router_patient.location_index import location_index
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 import base64
@@ -56,7 +57,7 @@ async def register(data: RegisterDoctorRequest):
 
         # Verifica che l'email non sia già registrata
         check_email = """SELECT id FROM account WHERE email = %s"""
-        if execute_query(check_email, (data.email,)):
+        if await execute_query_async(check_email, (data.email,)):
             raise HTTPException(status_code=400, detail="Email già registrata")
 
         # Hash della password per la sicurezza
@@ -72,7 +73,7 @@ async def register(data: RegisterDoctorRequest):
         """
         
         params = (data.name, data.surname, data.email, hashed_password, data.sex, "doctor")
-        result = execute_query(reg_query, params, commit=True)
+        result = await execute_query_async(reg_query, params, commit=True)
 
         if not result or not result[0]:
             raise HTTPException(status_code=500, detail="Errore durante la creazione dell'utente")
@@ -86,7 +87,7 @@ async def register(data: RegisterDoctorRequest):
         """
 
         params = (id_doctor, data.specialization)
-        execute_query(reg_query, params, commit=True)
+        await execute_query_async(reg_query, params, commit=True)
 
         # Inserimento delle sedi di lavoro del dottore
         reg_query = """
@@ -97,7 +98,8 @@ async def register(data: RegisterDoctorRequest):
 
         for loc in data.locations:
             params = (id_doctor, loc.address, loc.latitude, loc.longitude)
-            execute_query(reg_query, params, commit=True)
+            await execute_query_async(reg_query, params, commit=True)
+        location_index.invalidate()
 
         return {
             "message": "Registrazione completata con successo",
@@ -144,7 +146,7 @@ async def login(data: LoginRequest, response: Response):
         JOIN doctor d ON a.id = d.id
         WHERE a.email = %s
         """
-        results = execute_query(query_account, (data.email,))
+        results = await execute_query_async(query_account, (data.email,))
         print(f"Risultati query account: {results}")
         
         if not results:
@@ -178,7 +180,7 @@ async def login(data: LoginRequest, response: Response):
         if not pwd_context.verify(data.password, db_password):
             print(f"Password errata per email: {data.email}")
             # Incrementa i tentativi falliti e aggiorna il timestamp
-            execute_query(
+            await execute_query_async(
                 "UPDATE account SET failed_attempts = failed_attempts + 1, last_login_attempt = CURRENT_TIMESTAMP WHERE email = %s",
                 (data.email,), commit=True
             )
@@ -187,7 +189,7 @@ async def login(data: LoginRequest, response: Response):
         print(f"Password corretta per email: {data.email}")
 
         # Reset dei tentativi falliti dopo login riuscito
-        execute_query(
+        await execute_query_async(
             "UPDATE account SET failed_attempts = 0, last_login_attempt = CURRENT_TIMESTAMP WHERE email = %s",
             (data.email,), commit=True
         )
@@ -199,12 +201,12 @@ async def login(data: LoginRequest, response: Response):
             print(f"Recupero dati dottore per ID: {account_id}")
             
             # Recupero della specializzazione medica
-            res_doc = execute_query("SELECT specialization FROM doctor WHERE id = %s", (account_id,))
+            res_doc = await execute_query_async("SELECT specialization FROM doctor WHERE id = %s", (account_id,))
             specialization = res_doc[0][0] if res_doc else None
             print(f"Specializzazione: {specialization}")
 
             # Recupero delle sedi di lavoro con coordinate geografiche
-            res_loc = execute_query("""
+            res_loc = await execute_query_async("""
                 SELECT address, latitude, longitude
                 FROM location
                 WHERE doctor_id = %s
@@ -322,7 +324,7 @@ async def edit_profile(data: ModifyProfileRequest):
             WHERE email = %s
         """
         params = (data.name, data.surname, data.phone, data.email)
-        execute_query(query, params, commit=True)
+        await execute_query_async(query, params, commit=True)
 
         # Aggiornamento della specializzazione medica
         query = """
@@ -331,18 +333,18 @@ async def edit_profile(data: ModifyProfileRequest):
             WHERE id = (SELECT id FROM account WHERE email = %s)
         """
         params = (data.specialization, data.email)
-        execute_query(query, params, commit=True)
+        await execute_query_async(query, params, commit=True)
 
         # Gestione delle sedi di lavoro (aggiunta di nuove sedi senza rimuovere quelle esistenti)
         if data.addresses is not None and len(data.addresses) > 0:
             # Recupero dell'ID del dottore
-            res = execute_query("SELECT id FROM account WHERE email = %s", (data.email,))
+            res = await execute_query_async("SELECT id FROM account WHERE email = %s", (data.email,))
             if not res:
                 raise HTTPException(status_code=404, detail="Utente non trovato")
             doctor_id = res[0][0]
 
             # Recupero delle sedi di lavoro esistenti per evitare duplicati
-            existing_locations = execute_query(
+            existing_locations = await execute_query_async(
                 "SELECT address, latitude, longitude FROM location WHERE doctor_id = %s",
                 (doctor_id,)
             )
@@ -360,7 +362,7 @@ async def edit_profile(data: ModifyProfileRequest):
                 if (loc.address and loc.address.strip() and 
                     (loc.address, loc.latitude, loc.longitude) not in existing_addresses):
                     try:
-                        execute_query(
+                        await execute_query_async(
                             insert_loc,
                             (doctor_id, loc.address, loc.latitude, loc.longitude),
                             commit=True
@@ -369,6 +371,7 @@ async def edit_profile(data: ModifyProfileRequest):
                         # Se c'è un errore di duplicato, ignoralo
                         print(f"DEBUG: Errore inserimento location (probabilmente duplicato): {e}")
                         pass
+            location_index.invalidate()
 
         # Gestione dell'immagine del profilo se presente
         if data.profile_img:
@@ -376,14 +379,14 @@ async def edit_profile(data: ModifyProfileRequest):
                 # Decodifica dell'immagine da base64 a bytes
                 img_bytes = base64.b64decode(data.profile_img.split(",")[-1])
                 query_img = "UPDATE account SET profile_img = %s WHERE email = %s"
-                execute_query(query_img, (img_bytes, data.email), commit=True)
+                await execute_query_async(query_img, (img_bytes, data.email), commit=True)
             except Exception as img_err:
                 raise HTTPException(status_code=400, detail="Errore durante la decodifica dell'immagine profilo")
         else:
             try:
                 # Rimozione dell'immagine profilo se non fornita
                 query_img = "UPDATE account SET profile_img = NULL WHERE email = %s"
-                execute_query(query_img, (data.email,), commit=True)
+                await execute_query_async(query_img, (data.email,), commit=True)
             except Exception as img_err:
                 raise HTTPException(status_code=400, detail="Errore durante la rimozione dell'immagine profilo")
 
@@ -431,7 +434,7 @@ async def get_doctor_appointments(data: DoctorInfoRequest = Depends()):
         WHERE a.doctor_id = %s
         ORDER BY a.date_time DESC
         """
-        raw_result = execute_query(query, (data.doctor_id,))
+        raw_result = await execute_query_async(query, (data.doctor_id,))
         
         # Mappatura delle colonne del database ai nomi dei campi
         columns = [
@@ -472,7 +475,7 @@ async def get_stats(data: DoctorInfoRequest = Depends()):
             WHERE doctor_id = %s;
 
         """
-        result = execute_query(query, (data.doctor_id,))
+        result = await execute_query_async(query, (data.doctor_id,))
         if not result:
             return {
                 "total_appointments": 0,
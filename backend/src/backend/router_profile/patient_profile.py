@@ -16,7 +16,7 @@ incluso il blocco temporaneo degli account dopo tentativi falliti.
 from fastapi import APIRouter, Depends, HTTPException, Response
 from backend.router_profile.pydantic.schemas import RegisterRequest, LoginRequest, ModifyProfileRequest, HealthDataInput, PatientInfoRequest
 from backend.router_profile.account_profile import validate_password
-from backend.connection import execute_query
+from backend.connection import execute_query_async
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from backend.router_profile.cookies_login import create_access_token, create_refresh_token
@@ -56,7 +56,7 @@ async def register(data: RegisterRequest):
 
         # Verifica che l'email non sia già registrata
         check_email = """SELECT id FROM "account" WHERE email = %s"""
-        if execute_query(check_email, (data.email,)):
+        if await execute_query_async(check_email, (data.email,)):
             raise HTTPException(status_code=400, detail="Email già registrata")
 
         # Hash della password per la sicurezza
@@ -71,7 +71,7 @@ async def register(data: RegisterRequest):
         RETURNING id
         """
         params = (data.name, data.surname, data.email, hashed_password, data.sex, data.birth_date, "patient")
-        result = execute_query(reg_query, params, commit=True)
+        result = await execute_query_async(reg_query, params, commit=True)
 
         if not result or not result[0]:
             raise HTTPException(status_code=500, detail="Errore durante la creazione dell'utente")
@@ -79,7 +79,7 @@ async def register(data: RegisterRequest):
 
         # Creazione del profilo paziente specifico
         reg_query = """INSERT INTO patient (id) VALUES (%s)"""
-        execute_query(reg_query, (id_patient,), commit=True)
+        await execute_query_async(reg_query, (id_patient,), commit=True)
 
         return {
             "message": "Registrazione completata con successo",
@@ -121,7 +121,7 @@ async def login(data: LoginRequest, response: Response):
         FROM account JOIN patient ON account.id = patient.id
         WHERE email = %s
         """
-        results = execute_query(query, (data.email,))
+        results = await execute_query_async(query, (data.email,))
 
         if not results:
             raise HTTPException(status_code=404, detail="Account non registrato")
@@ -149,7 +149,7 @@ async def login(data: LoginRequest, response: Response):
                 last_login_attempt = CURRENT_TIMESTAMP
             WHERE email = %s
             """
-            execute_query(update_attempts, (data.email,), commit=True)
+            await execute_query_async(update_attempts, (data.email,), commit=True)
             raise HTTPException(status_code=401, detail="Password errata")
 
         # Reset dei tentativi falliti dopo login riuscito
@@ -159,7 +159,7 @@ async def login(data: LoginRequest, response: Response):
             last_login_attempt = CURRENT_TIMESTAMP
         WHERE email = %s
         """
-        execute_query(reset_attempts, (data.email,), commit=True)
+        await execute_query_async(reset_attempts, (data.email,), commit=True)
 
         # Conversione dell'immagine profilo in base64 per il frontend
         profile_img = account[5]
@@ -259,7 +259,7 @@ async def edit_profile(data: ModifyProfileRequest):
             WHERE email = %s
         """
         params = (data.name, data.surname, data.phone, data.email)
-        execute_query(query, params, commit=True)
+        await execute_query_async(query, params, commit=True)
 
         # Gestione dell'immagine del profilo se presente
         if data.profile_img:
@@ -267,14 +267,14 @@ async def edit_profile(data: ModifyProfileRequest):
                 # Decodifica dell'immagine da base64 a bytes
                 img_bytes = base64.b64decode(data.profile_img.split(",")[-1])
                 query_img = "UPDATE account SET profile_img = %s WHERE email = %s"
-                execute_query(query_img, (img_bytes, data.email), commit=True)
+                await execute_query_async(query_img, (img_bytes, data.email), commit=True)
             except Exception as img_err:
                 raise HTTPException(status_code=400, detail="Errore durante la decodifica dell'immagine profilo")
         else:
             try:
                 # Rimozione dell'immagine profilo se non fornita
                 query_img = "UPDATE account SET profile_img = NULL WHERE email = %s"
-                execute_query(query_img, (data.email,), commit=True)
+                await execute_query_async(query_img, (data.email,), commit=True)
             except Exception as img_err:
                 raise HTTPException(status_code=400, detail="Errore durante la rimozione dell'immagine profilo")
 
@@ -306,7 +306,7 @@ async def get_last_visit(data: PatientInfoRequest = Depends()):
         SELECT MAX(date_time) FROM appointment
         WHERE patient_id = %s AND status IN ('completed', 'booked', 'cancelled')
         """
-        result = execute_query(query, (data.patient_id,))
+        result = await execute_query_async(query, (data.patient_id,))
         if not result or not result[0][0]:
             return {"last_visit": 'N/A'}
         return {"last_visit": result[0][0]}
@@ -344,7 +344,7 @@ async def update_health_data(data: HealthDataInput):
             allergies = EXCLUDED.allergies,
             chronic_conditions = EXCLUDED.chronic_conditions
         """
-        execute_query(query, (
+        await execute_query_async(query, (
             data.patient_id,
             data.blood_type,
             data.allergies,
@@ -382,7 +382,7 @@ async def get_health_data(data: PatientInfoRequest = Depends()):
         FROM patient
         WHERE id = %s
         """
-        result = execute_query(query, (data.patient_id,))
+        result = await execute_query_async(query, (data.patient_id,))
         if not result:
             raise HTTPException(status_code=404, detail="Dati sanitari non trovati")
         
@@ -426,7 +426,7 @@ async def get_stats(data: PatientInfoRequest = Depends()):
             FROM appointment
             WHERE patient_id = %s;
         """
-        result = execute_query(query, (data.patient_id,))
+        result = await execute_query_async(query, (data.patient_id,))
         if not result:
             return {
                 "total_appointments": 0,
@@ -0,0 +1,125 @@
+"""
+Configurazione comune dei test del backend.
+
+I test che usano il database lavorano su un database temporaneo creato
+dallo schema (database/init.sql) e dai dati di test
+(database/test_data_simple.sql), eliminato al termine della sessione.
+
+Il server PostgreSQL si configura con le variabili d'ambiente TEST_DB_HOST,
+TEST_DB_PORT, TEST_DB_USER e TEST_DB_PASSWORD (default: il servizio
+database del docker-compose, esposto su localhost:5433). Se il server non
+è raggiungibile, i test che usano il database vengono saltati.
+
+Esecuzione: python -m pytest backend/tests
+"""
+
+import sys
+import os
+import uuid
+import pathlib
+
+import psycopg2
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "backend" / "src"))
+
+from backend import connection
+
+# Server PostgreSQL su cui creare il database temporaneo
+TEST_DB_SERVER = {
+    "host": os.getenv("TEST_DB_HOST", "localhost"),
+    "port": int(os.getenv("TEST_DB_PORT", "5433")),
+    "user": os.getenv("TEST_DB_USER", "user"),
+    "password": os.getenv("TEST_DB_PASSWORD", "userpwd"),
+}
+
+
+def _admin_connection():
+    """Connessione al database di manutenzione, in autocommit per CREATE/DROP DATABASE."""
+    conn = psycopg2.connect(dbname="postgres", connect_timeout=3, **TEST_DB_SERVER)
+    conn.autocommit = True
+    return conn
+
+
+def _schema_sql() -> str:
+    """Schema del database, senza la creazione del ruolo (riguarda solo HealthDB)."""
+    sql = (ROOT / "database" / "init.sql").read_text()
+    return sql[sql.index("-- Tabella account"):]
+
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Database temporaneo con schema e dati di test, usato dal pool del backend.
+
+    Yields:
+        dict: Parametri di connessione del database temporaneo
+    """
+    try:
+        admin = _admin_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL non raggiungibile: {e}")
+
+    name = f"healthdb_test_{uuid.uuid4().hex[:8]}"
+    with admin.cursor() as cursor:
+        cursor.execute(f'CREATE DATABASE "{name}"')
+
+    config = {**TEST_DB_SERVER, "dbname": name}
+    conn = psycopg2.connect(**config)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(_schema_sql())
+        cursor.execute((ROOT / "database" / "test_data_simple.sql").read_text())
+    conn.close()
+
+    # Il pool del backend viene ricreato sul database temporaneo
+    original_config = dict(connection.DB_CONFIG)
+    connection.DB_CONFIG.update(config)
+    connection._pool = None
+    try:
+        yield config
+    finally:
+        if connection._pool is not None:
+            connection._pool.closeall()
+        connection._pool = None
+        connection.DB_CONFIG.clear()
+        connection.DB_CONFIG.update(original_config)
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE "{name}" WITH (FORCE)')
+        admin.close()
+
+
+@pytest.fixture
+def index_conditions(database):
+    """
+    Condizioni applicate tramite indice nel piano di esecuzione di una query,
+    con la scansione sequenziale disattivata.
+
+    Con i pochi dati di test il planner sceglierebbe comunque la scansione
+    sequenziale: disattivandola si verifica che i filtri siano utilizzabili
+    dagli indici. Conta solo l'Index Cond: una scansione completa
+    dell'indice, senza condizione, non filtra nulla.
+
+    Returns:
+        callable: index_conditions(query, params) -> {nome indice: [Index Cond, ...]}
+    """
+    conn = psycopg2.connect(**database)
+
+    def collect(node: dict, found: dict):
+        if "Index Name" in node and "Index Cond" in node:
+            found.setdefault(node["Index Name"], []).append(node["Index Cond"])
+        for child in node.get("Plans", []):
+            collect(child, found)
+
+    def conditions(query: str, params=None) -> dict:
+        with conn.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0][0]["Plan"]
+        found = {}
+        collect(plan, found)
+        return found
+
+    yield conditions
+    conn.close()
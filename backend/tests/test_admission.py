@@ -0,0 +1,112 @@
+"""
+Test del controllo di ammissione (admission.py) con le generazioni condivise (coalescing.py).
+"""
+
+import asyncio
+
+from backend.router_LLM.admission import GenerationLimiter
+from backend.router_LLM.coalescing import SingleFlight
+
+
+def test_leader_disconnect_keeps_slot_until_shared_stream_ends():
+    """
+    Se la richiesta che ha avviato uno stream condiviso si disconnette, lo
+    slot resta occupato finché lo stream prosegue per le altre richieste.
+    """
+
+    async def scenario():
+        limiter = GenerationLimiter(max_concurrent=1, max_queue=5, max_queued_per_user=5)
+        flights = SingleFlight()
+        finish = asyncio.Event()
+
+        async def source():
+            yield "primo"
+            await finish.wait()
+            yield "secondo"
+
+        leader_ticket = limiter.enqueue("leader")
+        assert leader_ticket.granted
+        leader, _ = flights.stream("chiave", source,
+                                   on_start=lambda generation: limiter.bind(leader_ticket, generation))
+        follower, shared = flights.stream("chiave", source)
+        assert shared
+
+        # Il leader si disconnette: lo stream prosegue per il follower
+        assert await leader.__anext__() == "primo"
+        await leader.aclose()
+        limiter.release(leader_ticket)
+
+        waiting = limiter.enqueue("altro")
+        assert not waiting.granted
+        assert limiter.stats()["active"] == 1
+
+        # Al termine dello stream condiviso lo slot passa alla richiesta in coda
+        finish.set()
+        assert [item async for item in follower] == ["primo", "secondo"]
+        await follower.aclose()
+        await limiter.wait(waiting, timeout=1)
+        assert waiting.granted
+        limiter.release(waiting)
+        assert limiter.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_only_waiter_cancels_call_and_releases_slot():
+    """
+    Se l'unica richiesta in attesa di una chiamata viene annullata (client
+    disconnesso), la chiamata verso il modello viene interrotta e lo slot liberato.
+    """
+
+    async def scenario():
+        limiter = GenerationLimiter(max_concurrent=1, max_queue=5, max_queued_per_user=5)
+        flights = SingleFlight()
+        started = []
+
+        async def call():
+            await asyncio.sleep(10)
+
+        def on_start(generation):
+            started.append(generation)
+            limiter.bind(ticket, generation)
+
+        ticket = limiter.enqueue("leader")
+        request = asyncio.create_task(flights.run("chiave", call, on_start=on_start))
+        await asyncio.sleep(0)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        limiter.release(ticket)
+        await asyncio.gather(started[0], return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert started[0].cancelled()
+        assert not flights.in_flight("chiave")
+        assert ticket.released
+        assert limiter.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_call_continues_while_another_request_waits():
+    """Annullata la richiesta che ha avviato la chiamata, le altre ricevono comunque il risultato."""
+
+    async def scenario():
+        flights = SingleFlight()
+        finish = asyncio.Event()
+
+        async def call():
+            await finish.wait()
+            return "risposta"
+
+        leader = asyncio.create_task(flights.run("chiave", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run("chiave", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+
+        assert flights.in_flight("chiave")
+        finish.set()
+        return await follower
+
+    assert asyncio.run(scenario()) == ("risposta", True)
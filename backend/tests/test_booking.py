@@ -0,0 +1,62 @@
+"""
+Test dei dottori prenotabili allegati ai suggerimenti della chat (booking.py).
+"""
+
+import asyncio
+
+import psycopg2
+import pytest
+
+from backend.router_LLM import booking
+
+# Posizione del paziente: Milano (sedi dei dottori 1 e 3; il dottore 4 è a Roma)
+MILANO = (45.4642, 9.1900)
+
+
+@pytest.fixture
+def free_slots(database):
+    """Slot liberi futuri per Medicina Generale (1), Cardiologia (3) e Dermatologia (4)."""
+    conn = psycopg2.connect(**database)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO appointment (doctor_id, location_id, date_time, price, status)
+            SELECT d.id, l.id, NOW() + INTERVAL '2 days', 60, 'waiting'
+            FROM doctor d JOIN location l ON l.doctor_id = d.id
+            WHERE d.id IN (1, 3, 4)
+            RETURNING id
+        """)
+        ids = [row[0] for row in cursor.fetchall()]
+    yield ids
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM appointment WHERE id = ANY(%s)", (ids,))
+    conn.close()
+
+
+def test_wider_radius_requeries_only_missing_specializations(free_slots, monkeypatch):
+    """Le specializzazioni già complete non vengono ricercate ad ogni allargamento del raggio."""
+    queried = []
+
+    async def execute_query_async(query, params=(), **kwargs):
+        queried.append(list(params["specializations"]))
+        return await original(query, params, **kwargs)
+
+    original = booking.execute_query_async
+    monkeypatch.setattr(booking, "execute_query_async", execute_query_async)
+
+    suggestions = [{"specialization": name} for name in ("Medicina Generale", "Cardiologia", "Dermatologia")]
+    result = asyncio.run(booking.attach_bookable_doctors(suggestions, *MILANO, per_specialization=1))
+
+    assert queried[0] == ["Medicina Generale", "Cardiologia", "Dermatologia"]
+    assert all(names == ["Dermatologia"] for names in queried[1:])
+    assert [[doctor["id"] for doctor in suggestion["doctors"]] for suggestion in result] == [[1], [3], [4]]
+
+
+def test_bounding_box_uses_coordinates_index(index_conditions):
+    """Il filtro a riquadro è applicabile con l'indice idx_location_coordinates."""
+    proximity, params = booking.proximity_filter(*MILANO, booking.LLM_SUGGESTED_DOCTORS_RADIUS_KM)
+    query = booking.BOOKABLE_DOCTORS_QUERY.format(distance=booking.distance_sql("l"), proximity=proximity)
+    params.update({"specializations": ["Cardiologia"], "per_specialization": 3})
+
+    conditions = index_conditions(query, params).get("idx_location_coordinates", [])
+    assert any("latitude >=" in condition for condition in conditions)
@@ -0,0 +1,93 @@
+"""
+Test del livello asincrono di accesso al database (connection.py).
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import connection
+from backend.connection import (
+    ConnectionPool, connect_to_postgres_async, execute_query_async, release_async,
+    track_request_connections, transaction_async
+)
+
+POOL_SIZE = 2
+
+
+@pytest.fixture
+def small_pool(database, monkeypatch):
+    """Pool ed executor ridotti a POOL_SIZE, per esaurirli facilmente."""
+    pool = ConnectionPool(min_size=0, max_size=POOL_SIZE, idle_timeout=300, max_lifetime=1800,
+                          checkout_timeout=5, ping_after=30, **connection.DB_CONFIG)
+    executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db-test")
+    tx_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db-tx-test")
+    monkeypatch.setattr(connection, "_pool", pool)
+    monkeypatch.setattr(connection, "_db_executor", executor)
+    monkeypatch.setattr(connection, "_tx_executor", tx_executor)
+    yield pool
+    executor.shutdown(wait=True)
+    tx_executor.shutdown(wait=True)
+    pool.closeall()
+
+
+def test_transactions_beyond_pool_size(small_pool):
+    """
+    Più transazioni del numero di connessioni, mentre altre query aspettano
+    una connessione occupando tutti i thread condivisi: le transazioni che
+    tengono le connessioni devono poter completare le loro query, senza
+    un thread in più per ogni transazione.
+    """
+
+    async def transaction(release: asyncio.Event) -> int:
+        async with transaction_async() as tx:
+            await tx.execute("SELECT 1")
+            await release.wait()
+            rows = await tx.execute("SELECT 2")
+            return rows[0][0]
+
+    threads_before = threading.active_count()
+
+    async def scenario():
+        release = asyncio.Event()
+        transactions = [asyncio.create_task(transaction(release)) for _ in range(POOL_SIZE * 2)]
+        await asyncio.sleep(0.3)
+        # Tutte le connessioni sono nelle transazioni: queste query attendono nei thread condivisi
+        queries = [asyncio.create_task(execute_query_async("SELECT 3")) for _ in range(POOL_SIZE * 2)]
+        await asyncio.sleep(0.3)
+        peak_threads.append(threading.active_count())
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(*transactions, *queries), timeout=15)
+
+    peak_threads = []
+    results = asyncio.run(scenario())
+
+    assert results[:POOL_SIZE * 2] == [2] * (POOL_SIZE * 2)
+    assert results[POOL_SIZE * 2:] == [[(3,)]] * (POOL_SIZE * 2)
+    assert small_pool.stats()["timeouts"] == 0
+    assert small_pool.stats()["in_use"] == 0
+    # Al più i thread dei due executor, indipendentemente dal numero di transazioni
+    assert peak_threads[0] - threads_before <= POOL_SIZE * 2
+
+
+def test_leaked_async_checkout_is_reported(small_pool, caplog):
+    """Una connessione presa con connect_to_postgres_async e non restituita viene segnalata."""
+
+    async def request():
+        with track_request_connections("GET /leak"):
+            conn = await connect_to_postgres_async()
+            # Le query asincrone complete non lasciano connessioni in uso
+            await execute_query_async("SELECT 1")
+        await release_async(conn)
+
+    with caplog.at_level(logging.WARNING, logger="backend.connection"):
+        asyncio.run(request())
+
+    leaks = [record for record in caplog.records if "GET /leak" in record.getMessage()]
+    assert len(leaks) == 1
+    assert "test_connection.py" in leaks[0].getMessage()
+    assert small_pool.stats()["held_past_request"] == 1
+    assert small_pool.stats()["in_use"] == 0
@@ -0,0 +1,233 @@
+"""
+Test della ricerca dei dottori con ranking (doctors.py).
+"""
+
+import asyncio
+
+import numpy as np
+import psycopg2
+import pytest
+
+from backend.router_patient import doctors
+from backend.router_patient.doctors import get_doctors_by_location, get_ranked_doctors
+from backend.router_patient.location_index import location_index
+from backend.router_patient.pydantic.schemas import DoctorQueryRequest
+
+# Hash bcrypt di una password valida (come nei dati di test)
+PASSWORD = "$2b$12$wk6BXhTQuTfwNAoT4ofAO.eIdt0tTke6R3/xcpnVX.X/2DWgogvXW"
+
+
+@pytest.fixture
+def doctors_without_coordinates(database):
+    """Un dottore senza sedi e uno con una sede senza coordinate."""
+    conn = psycopg2.connect(**database)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO account (name, surname, email, password, sex, birth_date, role) VALUES
+            ('Senza', 'Sede', 'senza.sede@test.it', %(password)s, 'F', '1980-01-01', 'doctor'),
+            ('Senza', 'Coordinate', 'senza.coordinate@test.it', %(password)s, 'M', '1980-01-01', 'doctor')
+            RETURNING id
+        """, {"password": PASSWORD})
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("INSERT INTO doctor (id, specialization, rank) VALUES (%s, 'Cardiologia', 0.5), (%s, 'Cardiologia', 0.5)",
+                       ids)
+        cursor.execute("INSERT INTO location (doctor_id, address, city) VALUES (%s, 'Via Ignota 1', 'Milano')", (ids[1],))
+    location_index.invalidate()
+    yield ids
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM location WHERE doctor_id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM doctor WHERE id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM account WHERE id = ANY(%s)", (ids,))
+    conn.close()
+    location_index.invalidate()
+
+
+def test_distance_ranking_matches_with_and_without_index(doctors_without_coordinates, monkeypatch):
+    """
+    L'ordinamento per distanza restituisce gli stessi dottori con l'indice in
+    memoria e con la query SQL, anche quando la ricerca si allarga senza
+    limite: i dottori senza sedi geolocalizzate non compaiono in nessuno dei due.
+    """
+    request = DoctorQueryRequest(latitude=45.4642, longitude=9.1900, radius_km=5, sort_by="distance", limit=50)
+
+    monkeypatch.setattr(location_index, "enabled", True)
+    with_index = asyncio.run(get_ranked_doctors(request))
+    monkeypatch.setattr(location_index, "enabled", False)
+    with_sql = asyncio.run(get_ranked_doctors(request))
+
+    assert with_index == with_sql
+    assert len(with_sql) == 5
+    assert not {doctor["id"] for doctor in with_sql} & set(doctors_without_coordinates)
+
+
+@pytest.fixture
+def sql_queries(database, monkeypatch):
+    """Query eseguite dagli endpoint con l'indice in memoria disattivato."""
+    queries = []
+
+    async def execute_query_async(query, params=(), **kwargs):
+        queries.append((query, params))
+        return await original(query, params, **kwargs)
+
+    original = doctors.execute_query_async
+    monkeypatch.setattr(doctors, "execute_query_async", execute_query_async)
+    monkeypatch.setattr(location_index, "enabled", False)
+    return queries
+
+
+def bounded_queries(queries):
+    """Query con il filtro a riquadro (esclusi i tentativi senza limite di distanza)."""
+    return [(query, params) for query, params in queries if "min_latitude" in params]
+
+
+def filters_by_coordinates_index(conditions: dict) -> bool:
+    """True se il riquadro di latitudine è applicato tramite idx_location_coordinates."""
+    return any("latitude >=" in condition for condition in conditions.get("idx_location_coordinates", []))
+
+
+def test_ranked_doctors_fallback_uses_coordinates_index(sql_queries, index_conditions):
+    """La query SQL dell'ordinamento per distanza filtra le sedi con idx_location_coordinates."""
+    request = DoctorQueryRequest(latitude=45.4642, longitude=9.1900, radius_km=5, sort_by="distance", limit=1)
+    asyncio.run(get_ranked_doctors(request))
+
+    queries = bounded_queries(sql_queries)
+    assert queries
+    for query, params in queries:
+        assert filters_by_coordinates_index(index_conditions(query, params))
+
+
+def test_doctors_by_location_fallback_uses_coordinates_index(sql_queries, index_conditions):
+    """La query SQL della ricerca entro un raggio filtra le sedi con idx_location_coordinates."""
+    request = DoctorQueryRequest(latitude=45.4642, longitude=9.1900, radius_km=25)
+    asyncio.run(get_doctors_by_location(request))
+
+    queries = bounded_queries(sql_queries)
+    assert len(queries) == 1
+    assert filters_by_coordinates_index(index_conditions(*queries[0]))
+
+
+# Slot per dottore: (prezzo, stato); solo quelli "waiting" contano come liberi.
+# Prezzi e numero di slot producono pareggi tra i dottori; il dottore 5 non ha slot.
+SLOTS = {
+    1: [(40, "waiting"), (60, "waiting"), (10, "booked"), (5, "cancelled")],
+    3: [(40, "waiting")],
+    4: [(70, "waiting"), (70, "waiting")],
+    6: [(55, "waiting")],
+    "senza coordinate": [(40, "waiting"), (70, "waiting")],
+}
+
+
+@pytest.fixture
+def ranking_data(database, doctors_without_coordinates):
+    """Slot liberi e occupati per i dottori di test, compreso quello con la sede senza coordinate."""
+    without_location, without_coordinates = doctors_without_coordinates
+    conn = psycopg2.connect(**database)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        ids = []
+        for doctor, slots in SLOTS.items():
+            doctor_id = without_coordinates if doctor == "senza coordinate" else doctor
+            for price, status in slots:
+                cursor.execute("""
+                    INSERT INTO appointment (doctor_id, location_id, date_time, price, status)
+                    SELECT %s, MIN(id), NOW() + INTERVAL '3 days', %s, %s FROM location WHERE doctor_id = %s
+                    RETURNING id
+                """, (doctor_id, price, status, doctor_id))
+                ids.append(cursor.fetchone()[0])
+    yield conn
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM appointment WHERE id = ANY(%s)", (ids,))
+    conn.close()
+
+
+def reference_ranking(conn, min_price=None, max_price=None, specialization=None) -> dict:
+    """
+    Valori attesi per dottore, calcolati direttamente da appointment e review.
+
+    Returns:
+        dict: doctor_id -> (prezzo, slot liberi, recensioni, media esatta, anni di esperienza)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT d.id, d.specialization, EXTRACT(YEAR FROM AGE(CURRENT_DATE, u.created_at))::int
+            FROM doctor d JOIN account u ON u.id = d.id
+        """)
+        doctors = cursor.fetchall()
+        cursor.execute("SELECT doctor_id, price::float8 FROM appointment WHERE status = 'waiting'")
+        prices = cursor.fetchall()
+        cursor.execute("""
+            SELECT a.doctor_id, r.stars FROM review r JOIN appointment a ON a.id = r.appointment_id
+            WHERE r.stars IS NOT NULL
+        """)
+        reviews = cursor.fetchall()
+
+    expected = {}
+    price_filter = min_price is not None or max_price is not None
+    for doctor_id, doctor_specialization, years in doctors:
+        if specialization and doctor_specialization != specialization:
+            continue
+        slots = [price for slot_doctor, price in prices if slot_doctor == doctor_id
+                 and (min_price is None or price >= min_price) and (max_price is None or price <= max_price)]
+        if price_filter and not slots:
+            continue
+        stars = [value for review_doctor, value in reviews if review_doctor == doctor_id]
+        average = sum(stars) / len(stars) if stars else 0.0
+        expected[doctor_id] = (min(slots) if slots else 50.0, len(slots), len(stars), average, years)
+    return expected
+
+
+def as_rows(doctors: list) -> list:
+    return [(doctor["id"], doctor["price"], doctor["available_slots"], doctor["review_count"],
+             doctor["avg_rating"], doctor["years_experience"]) for doctor in doctors]
+
+
+def expected_rows(expected: dict, order) -> list:
+    ordered = sorted(expected.items(), key=lambda item: order(item[0], *item[1]))
+    # La media è memorizzata come REAL in doctor_rating: stesso arrotondamento della risposta
+    return [(doctor_id, price, slots, count, round(float(np.float32(average)), 1), years)
+            for doctor_id, (price, slots, count, average, years) in ordered]
+
+
+# Ordinamenti SQL con lo stesso criterio di spareggio (per dottore)
+ORDERS = {
+    "rating": lambda doctor_id, price, slots, count, average, years: (-average, -count, doctor_id),
+    "experience": lambda doctor_id, price, slots, count, average, years: (-years, doctor_id),
+    "price": lambda doctor_id, price, slots, count, average, years: (price, doctor_id),
+    "availability": lambda doctor_id, price, slots, count, average, years: (-slots, doctor_id),
+}
+
+
+@pytest.mark.parametrize("sort_by, filters", [
+    ("rating", {}),
+    ("experience", {}),
+    ("price", {}),
+    ("availability", {}),
+    ("price", {"min_price": 40, "max_price": 60}),
+    ("availability", {"specialization": "Cardiologia"}),
+    ("rating", {"min_price": 45}),
+])
+def test_sorted_ranking_matches_reference_aggregates(ranking_data, sort_by, filters):
+    """
+    Prezzo, slot liberi e recensioni aggregati per dottore (slot_stats e
+    doctor_rating) coincidono con i valori calcolati direttamente dalle
+    tabelle, con l'ordinamento e gli spareggi attesi; i dottori senza slot
+    e quelli senza coordinate compaiono se non c'è un filtro di prezzo.
+    """
+    expected = expected_rows(reference_ranking(ranking_data, **filters), ORDERS[sort_by])
+
+    full = asyncio.run(get_ranked_doctors(DoctorQueryRequest(sort_by=sort_by, limit=100, **filters)))
+    limited = asyncio.run(get_ranked_doctors(DoctorQueryRequest(sort_by=sort_by, limit=3, **filters)))
+
+    assert as_rows(full) == expected
+    assert as_rows(limited) == expected[:3]
+
+
+@pytest.mark.parametrize("filters", [{}, {"min_price": 40, "max_price": 60}, {"specialization": "Cardiologia"}])
+def test_composite_ranking_candidates_match_reference_aggregates(ranking_data, filters):
+    """Il ranking complessivo considera esattamente i dottori e i valori del riferimento."""
+    expected = expected_rows(reference_ranking(ranking_data, **filters), ORDERS["rating"])
+
+    ranked = asyncio.run(get_ranked_doctors(DoctorQueryRequest(latitude=45.4642, longitude=9.1900, limit=100, **filters)))
+
+    assert sorted(as_rows(ranked)) == sorted(expected)
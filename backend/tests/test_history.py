@@ -0,0 +1,29 @@
+"""
+Test della preparazione della cronologia per il modello (conversations.py e history.py).
+"""
+
+import asyncio
+
+from backend.router_LLM.conversations import resolve_history
+from backend.router_LLM.history import compact_history
+
+
+def test_repeated_question_keeps_previous_turn():
+    """
+    Il messaggio corrente inviato in coda alla cronologia viene rimosso una
+    sola volta: la stessa domanda posta nel turno precedente resta nel prompt.
+    """
+    question = "Ho mal di testa, cosa posso fare?"
+    message_history = [
+        {"role": "assistant", "content": "Ciao, come posso aiutarti?"},
+        {"role": "user", "content": question},
+        {"role": "user", "content": question},
+    ]
+
+    _, history = asyncio.run(resolve_history("utente", "conversazione", question, message_history, None))
+    messages, _ = compact_history("Prompt di sistema", history, question)
+
+    assert history == message_history[:-1]
+    assert [m["content"] for m in messages] == [
+        "Prompt di sistema", "Ciao, come posso aiutarti?", question, question
+    ]
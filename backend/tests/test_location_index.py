@@ -0,0 +1,67 @@
+"""
+Test dell'indice geografico in memoria delle sedi (location_index.py).
+"""
+
+import random
+
+import pytest
+
+from backend.router_patient.location_index import LocationIndex, haversine_km
+
+# Sedi concentrate attorno a Milano
+MILANO = (45.4642, 9.1900)
+
+
+class CountingCells(dict):
+    """Griglia che conta le celle cercate una per una."""
+
+    lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.lookups += 1
+        return super().__contains__(key)
+
+
+@pytest.fixture
+def clustered_index():
+    rng = random.Random(1)
+    rows = [(location_id, location_id, MILANO[0] + rng.gauss(0, 0.5), MILANO[1] + rng.gauss(0, 0.5))
+            for location_id in range(1, 5001)]
+    index = LocationIndex(enabled=True, cell_degrees=0.1, ttl=300)
+    index._build(rows)
+    index._cells = CountingCells(index._cells)
+    return index, rows
+
+
+def brute_force(rows, latitude, longitude, k):
+    distances = [(location_id, haversine_km(latitude, longitude, lat, lon)) for location_id, _, lat, lon in rows]
+    return sorted(distances, key=lambda item: item[1])[:k]
+
+
+@pytest.mark.parametrize("point", [(-45.0, -170.0), (-45.4642, -170.81), (89.9, 0.0), MILANO])
+def test_nearest_far_from_all_locations_is_exact_and_bounded(clustered_index, point):
+    """
+    Da una posizione lontana da tutte le sedi (fino agli antipodi) la ricerca
+    resta esatta e cerca al più tante celle quante sono quelle occupate per
+    ogni raddoppio del raggio, invece di tutte le celle del riquadro.
+    """
+    index, rows = clustered_index
+
+    nearest = index.nearest(*point, 200)
+
+    expected = brute_force(rows, *point, 200)
+    assert [distance for _, distance in nearest] == pytest.approx([distance for _, distance in expected])
+    assert index._cells.lookups <= 20 * len(index._cells)
+
+
+def test_within_large_radius_visits_only_populated_cells(clustered_index):
+    index, rows = clustered_index
+
+    found = index.within(-45.0, -170.0, 19000)
+
+    assert sorted(found) == sorted(item for item in brute_force(rows, -45.0, -170.0, len(rows)) if item[1] <= 19000)
+    assert index._cells.lookups <= len(index._cells)
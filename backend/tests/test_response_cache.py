@@ -0,0 +1,64 @@
+"""
+Test della ricerca per similarità nella cache delle risposte (response_cache.py).
+"""
+
+import asyncio
+
+import pytest
+
+from backend.router_LLM import response_cache as module
+from backend.router_LLM.response_cache import ResponseCache
+
+# Embedding fittizi: messaggi simili hanno vettori vicini
+EMBEDDINGS = {
+    "pressione normale": [1.0, 0.0, 0.0],
+    "qual e la pressione normale": [0.95, 0.1, 0.0],
+    "mal di testa": [0.0, 1.0, 0.0],
+    "dolore alla testa": [0.1, 0.9, 0.1],
+    "febbre alta": [0.0, 0.0, 2.0],
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    async def embed_texts(texts):
+        return [EMBEDDINGS[text] for text in texts]
+
+    monkeypatch.setattr(module, "embed_texts", embed_texts)
+
+
+def test_similar_lookup_uses_profile_and_eviction():
+    cache = ResponseCache(enabled=True, max_entries=2, ttl=60, similarity=0.9)
+
+    async def scenario():
+        await cache.store("Pressione normale?", "profilo-a", "120/80")
+        await cache.store("Mal di testa", "profilo-a", "Riposo e idratazione")
+
+        similar = await cache.lookup("Qual è la pressione normale?", "profilo-a")
+        other_profile = await cache.lookup("Qual è la pressione normale?", "profilo-b")
+
+        # "pressione normale" è stata appena usata: viene eliminata "mal di testa"
+        await cache.store("Febbre alta", "profilo-a", "Antipiretico")
+        evicted = await cache.lookup("Dolore alla testa", "profilo-a")
+        kept = await cache.lookup("Qual è la pressione normale?", "profilo-a")
+        return similar, other_profile, evicted, kept
+
+    similar, other_profile, evicted, kept = asyncio.run(scenario())
+
+    assert similar == "120/80"
+    assert other_profile is None
+    assert evicted is None
+    assert kept == "120/80"
+    assert cache.stats()["similar_hits"] == 2
+    assert len(cache._free_rows) == 0
+    assert sorted(key is not None for key in cache._row_keys) == [True, True]
+
+
+def test_expired_entries_are_not_matched():
+    cache = ResponseCache(enabled=True, max_entries=4, ttl=-1, similarity=0.9)
+
+    async def scenario():
+        await cache.store("Pressione normale?", "profilo-a", "120/80")
+        return await cache.lookup("Qual è la pressione normale?", "profilo-a")
+
+    assert asyncio.run(scenario()) is None
@@ -120,7 +120,17 @@ CREATE TABLE review (
     id SERIAL PRIMARY KEY,
     appointment_id INT NOT NULL REFERENCES appointment(id),
     report TEXT,
-    stars INT CHECK (stars IS NULL OR (stars BETWEEN 1 AND 5))
+    stars INT CHECK (stars IS NULL OR (stars BETWEEN 1 AND 5)),
+    reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabella doctor_rating (valutazioni aggregate, aggiornate a ogni recensione)
+CREATE TABLE doctor_rating (
+    doctor_id INT PRIMARY KEY REFERENCES doctor(id) ON DELETE CASCADE,
+    review_count INT NOT NULL DEFAULT 0,
+    star_sum INT NOT NULL DEFAULT 0,
+    avg_rating REAL,
+    last_review_at TIMESTAMP
 );
 
 -- Tabella doctor_registration_request (richieste di registrazione dottori)
@@ -160,6 +170,15 @@ CREATE TABLE doctor_document (
     verified_at TIMESTAMP
 );
 
+-- Tabella chat_conversation (cronologia delle conversazioni con l'assistente AI)
+CREATE TABLE chat_conversation (
+    owner VARCHAR(100) NOT NULL, -- account:<id> oppure ip:<indirizzo>
+    conversation_id VARCHAR(100) NOT NULL,
+    messages JSONB NOT NULL, -- Array di oggetti con role e content
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (owner, conversation_id)
+);
+
 -- =========================================
 -- TRIGGER: forza password forte su account
 -- =========================================
@@ -254,6 +273,8 @@ CREATE INDEX idx_appointment_doctor ON appointment(doctor_id);
 CREATE INDEX idx_appointment_patient ON appointment(patient_id);
 CREATE INDEX idx_appointment_datetime ON appointment(date_time);
 CREATE INDEX idx_appointment_status ON appointment(status);
+CREATE INDEX idx_appointment_location ON appointment(location_id);
+CREATE INDEX idx_appointment_waiting ON appointment(doctor_id, price) WHERE status = 'waiting';
 CREATE INDEX idx_location_coordinates ON location(latitude, longitude);
 
 -- Indici per le cartelle cliniche
@@ -60,6 +60,24 @@ INSERT INTO review (appointment_id, report, stars) VALUES
 (5, 'Visita rapida ma efficace', 3)
 ON CONFLICT DO NOTHING;
 
+-- Valutazioni aggregate e rank dei dottori recensiti (come python -m backend.router_patient.ratings)
+INSERT INTO doctor_rating (doctor_id, review_count, star_sum, avg_rating, last_review_at)
+SELECT a.doctor_id, COUNT(r.stars), SUM(r.stars), AVG(r.stars), MAX(r.reviewed_at)
+FROM review r
+JOIN appointment a ON a.id = r.appointment_id
+WHERE r.stars IS NOT NULL
+GROUP BY a.doctor_id
+ON CONFLICT (doctor_id) DO UPDATE SET
+    review_count = EXCLUDED.review_count,
+    star_sum = EXCLUDED.star_sum,
+    avg_rating = EXCLUDED.avg_rating,
+    last_review_at = EXCLUDED.last_review_at;
+
+UPDATE doctor d
+SET rank = dr.avg_rating / 5
+FROM doctor_rating dr
+WHERE dr.doctor_id = d.id;
+
 -- Cartelle cliniche
 INSERT INTO clinical_folder (patient_id) VALUES 
 (2), (7), (8)
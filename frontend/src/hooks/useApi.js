@@ -39,7 +39,9 @@ const apiCall = async (url, options = {}) => {
 
   if (!response.ok) {
     const errorData = await response.json().catch(() => ({}));
-    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+    const error = new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+    error.status = response.status;
+    throw error;
   }
 
   return response.json();
@@ -1,11 +1,29 @@
 import api from '../../hooks/useApi';
 
+// Conversazioni la cui cronologia è già conservata dal server
+const syncedConversations = new Set();
+
 export async function ask(message, activeConversation, userContext, messageHistory) {
+    // La cronologia include già il messaggio corrente in coda
+    const historyLength = messageHistory.length - 1;
+    const synced = syncedConversations.has(activeConversation);
     const data = { 
         message, 
         conversation_id: activeConversation, 
         user_context: userContext, 
-        message_history: messageHistory
+        message_history: synced ? [] : messageHistory,
+        history_length: historyLength
     };
-    return await api.post('/llm/chat/ask', data);
-}
\ No newline at end of file
+    try {
+        const response = await api.post('/llm/chat/ask', data);
+        syncedConversations.add(activeConversation);
+        return response;
+    } catch (error) {
+        // Il server non conserva più la cronologia (es. dopo un riavvio): la reinviamo
+        if (error.status === 409 && synced) {
+            syncedConversations.delete(activeConversation);
+            return ask(message, activeConversation, userContext, messageHistory);
+        }
+        throw error;
+    }
+}
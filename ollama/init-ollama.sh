@@ -29,6 +29,27 @@ else
     echo "Modello scaricato con successo!"
 fi
 
+# Modello di riserva, più piccolo, usato dal backend quando llama3.2 è sovraccarico
+echo "Verifico se il modello di riserva llama3.2:1b è già presente..."
+if ollama list | grep -q "llama3.2:1b"; then
+    echo "Modello llama3.2:1b già presente!"
+else
+    echo "Scaricamento modello llama3.2:1b..."
+    ollama pull llama3.2:1b
+    echo "Modello di riserva scaricato con successo!"
+fi
+
+# Modello di embedding, usato dal backend per l'instradamento delle specializzazioni e la cache delle risposte
+EMBED_MODEL="${OLLAMA_EMBED_MODEL:-nomic-embed-text}"
+echo "Verifico se il modello di embedding $EMBED_MODEL è già presente..."
+if ollama list | grep -q "$EMBED_MODEL"; then
+    echo "Modello $EMBED_MODEL già presente!"
+else
+    echo "Scaricamento modello $EMBED_MODEL..."
+    ollama pull "$EMBED_MODEL"
+    echo "Modello di embedding scaricato con successo!"
+fi
+
 echo "Ollama è pronto per l'uso!"
 echo "Modelli disponibili:"
 ollama list